@@ -1,20 +1,28 @@
-import json
+import asyncio
 import logging
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
-from elasticsearch import Elasticsearch
-from langchain_ollama import OllamaLLM
+from elasticsearch import AsyncElasticsearch, Elasticsearch
 from langgraph.graph import END, StateGraph
+from langgraph.types import StreamWriter
 
 import config
 from models import *
-from services.text_utils import expand_query
+from services.answer_cache import index_generation
+from services.context_builder import ContextBuilder
+from services.embedding_cache import query_embeddings
+from services.embeddings import embeddings
+from services.es_client import ensure_index
+from services.intent_classifier import IntentClassifier
+from services.llm_gateway import LLMGateway, llm_gateway
+from services.metrics import timed_node
+from services.retriever import DEFAULT_HIT_FIELDS, HybridRetriever
+from services.vector_store import LocalVectorStore
+from services.write_gate import index_writes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-OLLAMA_BASE_URL = 'http://ollama:11434'
-
 class AgentState(TypedDict):
     user_input: str
     retrieved_docs: Optional[list]
@@ -28,85 +36,102 @@ class AgentState(TypedDict):
 
 
 class Agent:
-    def __init__(self, es: Elasticsearch, index_name: str, llm_model: str, use_summarization: bool = False):
-        """Initialize the agent with Elasticsearch and LangChain models."""
+    def __init__(self, es: Elasticsearch, index_name: str, llm_model: str, use_summarization: bool = False,
+                 llm: Optional[LLMGateway] = None, check_index: bool = True,
+                 async_es: Optional[AsyncElasticsearch] = None, async_mode: bool = False,
+                 intent_classifier: Optional[IntentClassifier] = None,
+                 vector_store: Optional[LocalVectorStore] = None):
+        """Initialize the agent with Elasticsearch and LangChain models.
+
+        ``llm`` defaults to the process-wide LLM gateway, and ``check_index=False`` skips the
+        index existence check when the caller has already done it. With ``async_mode``
+        the workflow is built from the async node functions and must be run with
+        ``ainvoke``; this requires ``async_es``. A shared ``intent_classifier`` avoids
+        embedding the intent prototypes once per agent. A ``vector_store`` replaces
+        Elasticsearch for retrieval and removal.
+        """
         self.index_name = index_name
-        self.llm = OllamaLLM(model=llm_model, temperature=0.0, base_url=OLLAMA_BASE_URL)
-        self.embeddings = config.embeddings
+        self.llm = llm or llm_gateway
+        self.embeddings = embeddings
         self.use_summarization = use_summarization
         self.es = es
+        self.async_es = async_es
+        self.async_mode = async_mode
+        self.vector_store = vector_store
+        self.retriever = vector_store or HybridRetriever(es, index_name, query_embeddings, async_es=async_es)
+        # The summarization path reads summaries precomputed at ingest time when they exist.
+        self.hit_fields = DEFAULT_HIT_FIELDS + ("summary",) if use_summarization else DEFAULT_HIT_FIELDS
+        self.context_builder = ContextBuilder()
+        self.intent_classifier = intent_classifier or IntentClassifier(self.llm.json)
 
-        if not self.es.indices.exists(index=index_name):
-            self.es.indices.create(index=index_name)
+        if check_index and vector_store is None:
+            ensure_index(self.es, index_name)
 
         self.workflow = self._build_workflow()
 
     def search_elasticsearch(self, query: str, intent: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Search for documents in Elasticsearch using hybrid retrieval (BM25 + vector search)."""
-        expanded_queries = expand_query(query)
-        query_embedding = self.embeddings.encode(query).tolist()
-        
-        # Build hybrid search query
-        hybrid_query = {
-        "size": k,
-        "query": {
-            "bool": {
-                "should": [
-                    {"match": {"content": query}},
-                    *[{"match": {"content": q}} for q in expanded_queries],
-                    {
-                        "script_score": {
-                            "query": {"match_all": {}},
-                            "script": {
-                                "source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0",
-                                "params": {"query_vector": query_embedding}
-                            }
-                        }
-                    }
-                ]
-            }
-        }
-    }
-        
+        """Search for documents in Elasticsearch using hybrid retrieval (BM25 + kNN fused with RRF)."""
+        try:
+            return self.retriever.search(query, k=k, fields=self.hit_fields)
+        except Exception as e:
+            logger.error(f"Elasticsearch search error: {e}")
+            return []
+
+    async def asearch_elasticsearch(self, query: str, intent: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Async variant of ``search_elasticsearch``."""
         try:
-            response = self.es.search(index=self.index_name, body=hybrid_query)
-            results = []
-            for hit in response["hits"]["hits"]:
-                results.append({
-                    "doc_id": hit["_id"],
-                    "title": hit["_source"].get("title", ""),
-                    "content": hit["_source"].get("content", ""),
-                    "score": hit["_score"]
-                })
+            return await self.retriever.asearch(query, k=k, fields=self.hit_fields)
         except Exception as e:
             logger.error(f"Elasticsearch search error: {e}")
             return []
-        if results:
-            if intent == "search_document":
-                document = self.es.get(index=self.index_name, id=results["doc_id"]) # TODO needs fix
-                return document
-            return results
-        return []
 
     # @tool
     def remove_document_from_elasticsearch(self, doc_id: str) -> Dict[str, Any]:
-        """Remove a document from Elasticsearch by its ID."""
+        """Remove every chunk of a document from Elasticsearch by its document ID."""
         try:
-            # Check if document exists
-            exists = self.es.exists(index=self.index_name, id=doc_id)
-            if not exists:
+            with index_writes.shared():
+                if self.vector_store is not None:
+                    response = {"deleted": self.vector_store.delete_document(doc_id)}
+                else:
+                    response = self.es.delete_by_query(
+                        index=self.index_name,
+                        body={"query": {"term": {"document_id": doc_id}}},
+                        refresh=True
+                    )
+            if not response.get("deleted"):
+                return {
+                    "status": "error",
+                    "message": f"Document {doc_id} not found"
+                }
+            return {
+                "status": "success",
+                "message": f"Document {doc_id} removed successfully",
+                "result": response
+            }
+        except Exception as e:
+            logger.error(f"Failed to remove document: {e}")
+            return {
+                "status": "error",
+                "message": f"Failed to remove document: {str(e)}"
+            }
+
+    async def aremove_document_from_elasticsearch(self, doc_id: str) -> Dict[str, Any]:
+        """Async variant of ``remove_document_from_elasticsearch``."""
+        try:
+            async with index_writes.ashared():
+                if self.vector_store is not None:
+                    response = {"deleted": await asyncio.to_thread(self.vector_store.delete_document, doc_id)}
+                else:
+                    response = await self.async_es.delete_by_query(
+                        index=self.index_name,
+                        body={"query": {"term": {"document_id": doc_id}}},
+                        refresh=True
+                    )
+            if not response.get("deleted"):
                 return {
                     "status": "error",
                     "message": f"Document {doc_id} not found"
                 }
-            
-            # Delete the document
-            response = self.es.delete(
-                index=self.index_name,
-                id=doc_id,
-                refresh=True
-            )
-            
             return {
                 "status": "success",
                 "message": f"Document {doc_id} removed successfully",
@@ -121,12 +146,20 @@ class Agent:
 
     def _build_workflow(self):
         workflow = StateGraph(AgentState)
-        workflow.add_node("classify_intent", self.classify_intent)
-        workflow.add_node("remove_document", self.remove_document)
-        workflow.add_node("search_document", self.search_document)
-        workflow.add_node("summarize_documents", self.summarize_documents)
-        workflow.add_node("merge_summaries", self.merge_summaries)
-        workflow.add_node("answer_question", self.answer_question)
+        if self.async_mode:
+            workflow.add_node("classify_intent", timed_node("classify_intent", self.aclassify_intent))
+            workflow.add_node("remove_document", timed_node("remove_document", self.aremove_document))
+            workflow.add_node("search_document", timed_node("search_document", self.asearch_document))
+            workflow.add_node("summarize_documents", timed_node("summarize_documents", self.asummarize_documents))
+            workflow.add_node("merge_summaries", timed_node("merge_summaries", self.amerge_summaries))
+            workflow.add_node("answer_question", timed_node("answer_question", self.aanswer_question))
+        else:
+            workflow.add_node("classify_intent", timed_node("classify_intent", self.classify_intent))
+            workflow.add_node("remove_document", timed_node("remove_document", self.remove_document))
+            workflow.add_node("search_document", timed_node("search_document", self.search_document))
+            workflow.add_node("summarize_documents", timed_node("summarize_documents", self.summarize_documents))
+            workflow.add_node("merge_summaries", timed_node("merge_summaries", self.merge_summaries))
+            workflow.add_node("answer_question", timed_node("answer_question", self.answer_question))
         
         # Add conditional edges from intent classifier
         workflow.add_conditional_edges(
@@ -168,38 +201,12 @@ class Agent:
         return workflow.compile()
 
     def classify_intent(self, state: AgentState) -> AgentState:
-        """Classify user intent and extract structured information using natural language understanding."""
-        user_input = state["user_input"].strip()
-        prompt = config.CLASSIFY_INTENT_PROMPT.format(query_input=user_input)
-        
-        try:
-            # Get LLM response
-            response = self.llm(prompt).strip()
-            logger.info(f"Intent classification response: {response}")
-            
-            # Parse the JSON response
-            extracted_info = json.loads(response)
-            intent = extracted_info.get("intent", "answer_question")
-            
-            # Log the extracted information
-            logger.info(f"Extracted intent: {intent}")
-            logger.info(f"Extracted doc_id: {extracted_info.get('doc_id', '')}")
-            
-            return {
-                "intent": intent,
-                "doc_id": extracted_info.get("doc_id", ""),
-                "new_title": extracted_info.get("title", ""),
-                "new_content": extracted_info.get("content", ""),
-                "extracted_info": extracted_info
-            }
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from LLM response: {e}")
-            logger.error(f"Raw response: {response}")
-            # Fall back to answer_question on parse error
-            return {"intent": "answer_question"}
-        except Exception as e:
-            logger.error(f"Error in intent classification: {e}")
-            return {"intent": "answer_question"}
+        """Classify user intent and extract structured information, using the LLM only when the fast path is unsure."""
+        return self.intent_classifier.classify(state["user_input"])
+
+    async def aclassify_intent(self, state: AgentState) -> AgentState:
+        """Async variant of ``classify_intent``."""
+        return await self.intent_classifier.aclassify(state["user_input"])
 
     def remove_document(self, state: AgentState) -> AgentState:
         """Handle removing a document using the Elasticsearch tool."""
@@ -211,9 +218,20 @@ class Agent:
         
         # Remove document
         result = self.remove_document_from_elasticsearch(doc_id)
-        
-        # Generate response
+        return self._removal_response(doc_id, result)
+
+    async def aremove_document(self, state: AgentState) -> AgentState:
+        """Async variant of ``remove_document``."""
+        doc_id = state.get("doc_id", "")
+        if not doc_id:
+            return {"response": "Error: Document ID is required to remove a document."}
+
+        result = await self.aremove_document_from_elasticsearch(doc_id)
+        return self._removal_response(doc_id, result)
+
+    def _removal_response(self, doc_id: str, result: Dict[str, Any]) -> AgentState:
         if result.get("status") == "success":
+            index_generation.bump()
             response = f"Successfully removed document '{doc_id}'."
         else:
             response = f"Failed to remove document: {result.get('message', 'Unknown error')}"
@@ -225,7 +243,14 @@ class Agent:
         query = state["user_input"].strip()
         intent = state["intent"]
         docs = self.search_elasticsearch(query=query, intent=intent)
-        
+        return self._search_response(state, docs)
+
+    async def asearch_document(self, state: AgentState) -> AgentState:
+        """Async variant of ``search_document``."""
+        docs = await self.asearch_elasticsearch(query=state["user_input"].strip(), intent=state["intent"])
+        return self._search_response(state, docs)
+
+    def _search_response(self, state: AgentState, docs: List[Dict[str, Any]]) -> AgentState:
         if not docs:
             logger.info("No matching documents found.")
             return {"retrieved_docs": [], "response": "No matching documents found."}
@@ -234,12 +259,15 @@ class Agent:
         return {"retrieved_docs": [doc for doc in docs], "intent": state["intent"], "response": [doc["title"] for doc in docs]}
 
     def summarize_documents(self, state: AgentState) -> AgentState:
-        """Generates summaries for each retrieved document."""
+        """Generates summaries for each retrieved document, reusing stored chunk summaries."""
         logger.info(f"Generate summaries.")
         docs = state.get("retrieved_docs", [])
         summaries = []
         
-        for doc in docs[:2]:
+        for doc in docs[:config.SUMMARY_MAX_DOCS]:
+            if doc.get("summary"):
+                summaries.append(doc["summary"])
+                continue
             prompt = config.PROMPT_FOR_SUMMARY.format(document=doc)
             summary = self.llm.invoke(prompt).strip()
             summaries.append(summary)
@@ -247,6 +275,23 @@ class Agent:
         logger.info(f"Generated {len(summaries)} summaries.")
         return {"summaries": summaries}
 
+    async def asummarize_documents(self, state: AgentState) -> AgentState:
+        """Summarizes the retrieved documents concurrently, at most SUMMARY_CONCURRENCY at a time."""
+        logger.info("Generate summaries.")
+        docs = state.get("retrieved_docs", [])
+        semaphore = asyncio.Semaphore(config.SUMMARY_CONCURRENCY)
+
+        async def summarize(doc):
+            if doc.get("summary"):
+                return doc["summary"]
+            async with semaphore:
+                prompt = config.PROMPT_FOR_SUMMARY.format(document=doc)
+                return (await self.llm.ainvoke(prompt)).strip()
+
+        summaries = await asyncio.gather(*(summarize(doc) for doc in docs[:config.SUMMARY_MAX_DOCS]))
+        logger.info(f"Generated {len(summaries)} summaries.")
+        return {"summaries": list(summaries)}
+
     def merge_summaries(self, state: AgentState) -> AgentState:
         """Merges individual summaries into a coherent final response."""
         logger.info("Merging summaries")
@@ -259,41 +304,88 @@ class Agent:
         final_response = self.llm.invoke(merged_prompt).strip()
         logger.info("Final response generated.")
         return {"summarized_docs": final_response}
+
+    async def amerge_summaries(self, state: AgentState) -> AgentState:
+        """Async variant of ``merge_summaries``."""
+        logger.info("Merging summaries")
+        summaries = state.get("summaries", [])
+        if not summaries:
+            return {"response": "No relevant information found to answer your question."}
+
+        merged_prompt = config.PROMPT_FOR_MERGING_SUMMARIES.format(summaries="\n".join(summaries))
+        final_response = (await self.llm.ainvoke(merged_prompt)).strip()
+        logger.info("Final response generated.")
+        return {"summarized_docs": final_response}
     
 
-    def answer_question(self, state: AgentState):
-        """Answers a question using RAG from retrieved documents."""
-        logger.info("Answering question with retrieved documents.")
-        
+    def _qa_prompt(self, state: AgentState) -> Optional[str]:
+        """Build the QA prompt from the state, or return None when there is no context."""
         if self.use_summarization:
             context = state.get("summarized_docs", "")
             if not context:
-                return {"response": "I couldn't find any relevant information to answer your question."}
+                return None
         else:
             docs = state.get("retrieved_docs", [])
             if not docs:
                 logger.info("No documents found for answering the question.")
-                return {"response": "I couldn't find any documents with information to answer your question."}
-            
-            # Format documents as context
-            context_parts = []
-            for doc in docs:
-                doc_id = doc.get("doc_id", "")
-                title = doc.get("title", "")
-                content = doc.get("content", "")
-                doc_context = f"Document ID: {doc_id}\nTitle: {title}\n\nContent:\n{content}\n"
-                context_parts.append(doc_context)
+                return None
             
-            context = "\n---\n".join(context_parts)
+            context, _ = self.context_builder.build(docs)
         
-        # Generate answer using context and query
         query = state["user_input"].strip()
-        prompt = config.PROMPT_FOR_QA.format(context=context, query=query)
-        response = self.llm(prompt)
+        return config.PROMPT_FOR_QA.format(context=context, query=query)
+
+    def _no_context_response(self) -> AgentState:
+        if self.use_summarization:
+            return {"response": "I couldn't find any relevant information to answer your question."}
+        return {"response": "I couldn't find any documents with information to answer your question."}
+
+    def answer_question(self, state: AgentState):
+        """Answers a question using RAG from retrieved documents."""
+        logger.info("Answering question with retrieved documents.")
+        prompt = self._qa_prompt(state)
+        if prompt is None:
+            return self._no_context_response()
+
+        # Generate answer using context and query
+        response = self.llm.invoke(prompt)
         
         logger.info("Generated response to user query.")
         return {"response": response}
 
+    async def aanswer_question(self, state: AgentState, writer: StreamWriter):
+        """Async variant of ``answer_question``.
+
+        Tokens are emitted through ``writer`` as they are generated, so callers
+        streaming with ``stream_mode="custom"`` see the answer before it completes.
+        """
+        logger.info("Answering question with retrieved documents.")
+        prompt = self._qa_prompt(state)
+        if prompt is None:
+            return self._no_context_response()
+
+        parts = []
+        async for token in self.llm.astream(prompt):
+            parts.append(token)
+            writer({"token": token})
+        logger.info("Generated response to user query.")
+        return {"response": "".join(parts)}
+
+    async def aanswer_with_docs(self, query: str, docs: List[Dict[str, Any]]) -> str:
+        """Run the generation half of the workflow for a query whose documents were already retrieved.
+
+        Used by batch QA, where retrieval for all queries is done up front in one batch.
+        """
+        state: AgentState = {"user_input": query, "intent": "answer_question", "retrieved_docs": docs}
+        if self.use_summarization:
+            state.update(await self.asummarize_documents(state))
+            merged = await self.amerge_summaries(state)
+            if "response" in merged:
+                return merged["response"]
+            state.update(merged)
+        result = await self.aanswer_question(state, writer=lambda chunk: None)
+        return result["response"]
+
     def process_input(self, user_input: str) -> str:
         """Runs the user input through the LangGraph workflow."""
         try:
@@ -301,4 +393,44 @@ class Agent:
             return result.get("response", "I'm sorry, I couldn't process your request.")
         except Exception as e:
             logger.error(f"Error processing input: {e}")
-            return f"I encountered an error while processing your request: {str(e)}"
\ No newline at end of file
+            return f"I encountered an error while processing your request: {str(e)}"
+
+    async def aprocess_input(self, user_input: str) -> str:
+        """Runs the user input through the async LangGraph workflow."""
+        try:
+            result = await self.workflow.ainvoke({"user_input": user_input})
+            return result.get("response", "I'm sorry, I couldn't process your request.")
+        except Exception as e:
+            logger.error(f"Error processing input: {e}")
+            return f"I encountered an error while processing your request: {str(e)}"
+
+    async def astream_process(self, user_input: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Runs the workflow and yields ``(event, data)`` pairs as it progresses.
+
+        Events are ``intent``, ``retrieval``, ``summaries``, ``token`` (answer tokens,
+        async mode only), ``response`` (the final response) and ``error``.
+        """
+        response = None
+        try:
+            async for mode, chunk in self.workflow.astream({"user_input": user_input}, stream_mode=["updates", "custom"]):
+                if mode == "custom":
+                    yield "token", chunk["token"]
+                    continue
+                for node, update in chunk.items():
+                    update = update or {}
+                    if node == "classify_intent":
+                        yield "intent", {"intent": update.get("intent"), "doc_id": update.get("doc_id", "")}
+                    elif node == "search_document":
+                        yield "retrieval", [
+                            {"chunk_id": doc["chunk_id"], "title": doc["title"], "score": doc["score"]}
+                            for doc in update.get("retrieved_docs", [])
+                        ]
+                    elif node == "summarize_documents":
+                        yield "summaries", {"count": len(update.get("summaries", []))}
+                    if "response" in update:
+                        response = update["response"]
+        except Exception as e:
+            logger.error(f"Error processing input: {e}")
+            yield "error", f"I encountered an error while processing your request: {str(e)}"
+            return
+        yield "response", response if response is not None else "I'm sorry, I couldn't process your request."
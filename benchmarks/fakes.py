@@ -0,0 +1,563 @@
+"""In-process stand-ins for Elasticsearch, Ollama and the embedding model.
+
+They implement just enough of each client for the agent, the ingestion
+pipeline and the FastAPI app to run unchanged, with deterministic output
+and configurable latency.
+"""
+import asyncio
+import fnmatch
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+from functools import cmp_to_key
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def _sort_fields(sort: Any) -> List[tuple]:
+    """Normalize a ``sort`` clause to ``(field, order)`` pairs."""
+    fields = []
+    for spec in sort if isinstance(sort, list) else [sort]:
+        field, order = next(iter(spec.items())) if isinstance(spec, dict) else (spec, "asc")
+        fields.append((field, order.get("order", "asc") if isinstance(order, dict) else order))
+    return fields
+
+
+def _compare(left: List[Any], right: List[Any], orders: List[str]) -> int:
+    for a, b, order in zip(left, right, orders):
+        if a != b:
+            return (-1 if a < b else 1) * (-1 if order == "desc" else 1)
+    return 0
+
+
+class HashEmbeddings:
+    """Deterministic bag-of-words hashing embeddings; no model download or GPU needed."""
+
+    def __init__(self, dims: int = 384, latency: float = 0.0):
+        self.dims = dims
+        self.latency = latency
+        self.name = f"hash-{dims}"
+        self.model = self
+        # Tokens are lowercased before hashing.
+        self.lowercases_input = True
+        self.calls = 0
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for token in _tokens(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dims] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(sentences, str):
+            return self._vector(sentences)
+        return np.stack([self._vector(sentence) for sentence in sentences]) if sentences else np.zeros((0, self.dims))
+
+    def warm_up(self) -> None:
+        pass
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dims
+
+
+class FakeLLM:
+    """Ollama stand-in returning canned text after ``latency`` seconds.
+
+    Streaming yields one word every ``token_latency`` seconds. With
+    ``format="json"``, set here or per call, it answers the intent
+    classification prompt.
+    """
+
+    def __init__(self, model: str = "fake", latency: float = 0.05, token_latency: float = 0.0,
+                 answer_words: int = 40, format: str = "", **kwargs):
+        self.model = model
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer_words = answer_words
+        self.format = format
+        self.calls = 0
+
+    def _response(self, prompt: str, format: str = "") -> str:
+        if (format or self.format) == "json":
+            return json.dumps({"intent": "answer_question", "doc_id": "", "title": "", "content": ""})
+        words = _tokens(prompt)[-self.answer_words:] or ["ok"]
+        return " ".join(words)
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._response(prompt, kwargs.get("format", ""))
+
+    async def ainvoke(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._response(prompt, kwargs.get("format", ""))
+
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        self.calls += 1
+        time.sleep(self.latency)
+        for word in self._response(prompt, kwargs.get("format", "")).split():
+            time.sleep(self.token_latency)
+            yield word + " "
+
+    async def astream(self, prompt: str, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for word in self._response(prompt, kwargs.get("format", "")).split():
+            await asyncio.sleep(self.token_latency)
+            yield word + " "
+
+
+class _Serializer:
+    mimetype = "application/json"
+
+    def dumps(self, data: Any) -> str:
+        return data if isinstance(data, str) else json.dumps(data)
+
+    def loads(self, data: Any) -> Any:
+        return json.loads(data)
+
+
+class _Serializers:
+    def get_serializer(self, mimetype: str) -> _Serializer:
+        return _Serializer()
+
+    def dumps(self, data: Any, mimetype: Optional[str] = None) -> str:
+        return _Serializer().dumps(data)
+
+
+class _Response(dict):
+    """Dict that also exposes ``.body`` like the client's ``ObjectApiResponse``."""
+
+    @property
+    def body(self) -> dict:
+        return self
+
+
+class _NoTracing:
+    """Stands in for the client's OpenTelemetry hooks used by ``elasticsearch.helpers``."""
+
+    def helpers_span(self, name: str):
+        return nullcontext()
+
+    def use_span(self, span: Any):
+        return nullcontext()
+
+
+class _Indices:
+    def __init__(self, client: "FakeElasticsearch"):
+        self.client = client
+
+    def exists(self, index: str, **kwargs) -> bool:
+        return index in self.client.indices_data or index in self.client.aliases
+
+    def create(self, index: str, mappings: Optional[dict] = None, aliases: Optional[dict] = None,
+               **kwargs) -> Dict[str, Any]:
+        with self.client._lock:
+            if self.exists(index):
+                raise ValueError(f"resource_already_exists_exception: {index}")
+            self.client.indices_data.setdefault(index, {})
+            self.client.mappings[index] = mappings or {}
+            for alias in aliases or {}:
+                self.client.aliases[alias] = index
+        return {"acknowledged": True, "index": index}
+
+    def delete(self, index: str, **kwargs) -> Dict[str, Any]:
+        with self.client._lock:
+            self.client.indices_data.pop(index, None)
+            for alias in [alias for alias, target in self.client.aliases.items() if target == index]:
+                del self.client.aliases[alias]
+        return {"acknowledged": True}
+
+    def get(self, index: str, **kwargs) -> Dict[str, Any]:
+        return {
+            name: {"aliases": {alias: {} for alias, target in self.client.aliases.items() if target == name},
+                   "mappings": self.client.mappings.get(name, {})}
+            for name in self.client.indices_data if fnmatch.fnmatchcase(name, index)
+        }
+
+    def exists_alias(self, name: str, **kwargs) -> bool:
+        return name in self.client.aliases
+
+    def get_alias(self, name: str, **kwargs) -> Dict[str, Any]:
+        if name not in self.client.aliases:
+            raise KeyError(name)
+        return {self.client.aliases[name]: {"aliases": {name: {}}}}
+
+    def update_aliases(self, actions: List[dict], **kwargs) -> Dict[str, Any]:
+        """Apply alias actions atomically; an alias points at a single index here."""
+        with self.client._lock:
+            for action in actions:
+                (kind, spec), = action.items()
+                if kind == "add":
+                    if spec["alias"] in self.client.indices_data:
+                        raise ValueError(f"invalid_alias_name_exception: an index exists with the name {spec['alias']}")
+                    self.client.aliases[spec["alias"]] = spec["index"]
+                elif kind == "remove":
+                    self.client.aliases.pop(spec["alias"], None)
+                elif kind == "remove_index":
+                    self.delete(spec["index"])
+        return {"acknowledged": True}
+
+    def refresh(self, index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        return {"_shards": {"failed": 0}}
+
+
+class FakeElasticsearch:
+    """Single-node, in-memory Elasticsearch stand-in.
+
+    Supports index, get, exists, delete, bulk, search, msearch, count and
+    delete_by_query with match/term/terms/range/bool/match_all queries,
+    top-level kNN by brute-force cosine, ``_source`` filtering,
+    ``from``/``size``, multi-field ``sort`` with ``search_after``, single-
+    index aliases, point-in-time snapshots with a ``_shard_doc`` tiebreaker,
+    ``composite`` (one terms source) and ``cardinality`` aggregations, and an
+    optional per-request ``latency``. Like Elasticsearch, sort values hold
+    only the requested fields, and ``search_after`` skips every hit whose
+    values equal the given ones.
+    """
+
+    def __init__(self, latency: float = 0.0, shared: Optional["FakeElasticsearch"] = None):
+        self.latency = latency
+        self.indices_data: Dict[str, Dict[str, dict]] = shared.indices_data if shared else {}
+        self.mappings: Dict[str, dict] = shared.mappings if shared else {}
+        self.aliases: Dict[str, str] = shared.aliases if shared else {}
+        self._pits: Dict[str, Dict[str, dict]] = shared._pits if shared else {}
+        self._lock = shared._lock if shared else threading.RLock()
+        self.indices = _Indices(self)
+        self.transport = SimpleNamespace(serializers=_Serializers())
+        self._otel = _NoTracing()
+        self._client_meta = ()
+
+    def options(self, **kwargs) -> "FakeElasticsearch":
+        return self
+
+    def _wait(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _docs(self, index: str) -> Dict[str, dict]:
+        return self.indices_data.setdefault(self.aliases.get(index, index), {})
+
+    def open_point_in_time(self, index: str, keep_alive: str = "1m", **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            pit_id = uuid.uuid4().hex
+            self._pits[pit_id] = dict(self._docs(index))
+        return _Response(id=pit_id)
+
+    def close_point_in_time(self, id: Optional[str] = None, body: Optional[dict] = None, **kwargs) -> Dict[str, Any]:
+        pit_id = id or (body or {}).get("id")
+        return _Response(succeeded=self._pits.pop(pit_id, None) is not None, num_freed=1)
+
+    # Documents
+
+    def index(self, index: str, document: Optional[dict] = None, body: Optional[dict] = None,
+              id: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        self._wait()
+        doc_id = id or uuid.uuid4().hex
+        with self._lock:
+            result = "updated" if doc_id in self._docs(index) else "created"
+            self._docs(index)[doc_id] = dict(document if document is not None else body)
+        return {"_index": index, "_id": doc_id, "result": result}
+
+    def get(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        self._wait()
+        source = self._docs(index).get(id)
+        if source is None:
+            raise KeyError(id)
+        return {"_index": index, "_id": id, "found": True, "_source": source}
+
+    def exists(self, index: str, id: str, **kwargs) -> bool:
+        self._wait()
+        return id in self._docs(index)
+
+    def delete(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        self._wait()
+        with self._lock:
+            existed = self._docs(index).pop(id, None) is not None
+        return {"_index": index, "_id": id, "result": "deleted" if existed else "not_found"}
+
+    def update(self, index: str, id: str, doc: Optional[dict] = None, **kwargs) -> Dict[str, Any]:
+        self._wait()
+        with self._lock:
+            self._docs(index)[id].update(doc or {})
+        return {"_index": index, "_id": id, "result": "updated"}
+
+    def bulk(self, operations: Optional[list] = None, body: Optional[list] = None,
+             index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        self._wait()
+        start = time.perf_counter()
+        lines = [json.loads(line) if isinstance(line, (str, bytes)) else line for line in (operations or body or [])]
+        items = []
+        position = 0
+        with self._lock:
+            while position < len(lines):
+                (action, meta), = lines[position].items()
+                target = meta.get("_index", index)
+                doc_id = meta.get("_id") or uuid.uuid4().hex
+                position += 1
+                if action == "delete":
+                    existed = self._docs(target).pop(doc_id, None) is not None
+                    items.append({"delete": {"_index": target, "_id": doc_id, "status": 200 if existed else 404,
+                                             "result": "deleted" if existed else "not_found"}})
+                    continue
+                source = lines[position]
+                position += 1
+                if action == "update" and doc_id not in self._docs(target) and not source.get("doc_as_upsert"):
+                    items.append({"update": {"_index": target, "_id": doc_id, "status": 404,
+                                             "error": {"type": "document_missing_exception"}}})
+                elif action == "update":
+                    self._docs(target).setdefault(doc_id, {}).update(source.get("doc", {}))
+                    items.append({"update": {"_index": target, "_id": doc_id, "status": 200}})
+                elif action == "create" and doc_id in self._docs(target):
+                    items.append({"create": {"_index": target, "_id": doc_id, "status": 409,
+                                             "error": {"type": "version_conflict_engine_exception"}}})
+                else:
+                    self._docs(target)[doc_id] = source
+                    items.append({action: {"_index": target, "_id": doc_id, "status": 201, "result": "created"}})
+        errors = any(
+            result["status"] >= 400 and not (action == "delete" and result["status"] == 404)
+            for item in items for action, result in item.items()
+        )
+        return _Response(took=int((time.perf_counter() - start) * 1000), errors=errors, items=items)
+
+    # Queries
+
+    def _score(self, query: Optional[dict], source: dict, idf: Dict[str, float],
+               doc_id: Optional[str] = None) -> Optional[float]:
+        """Score a document against a query; None means it does not match."""
+        if not query or "match_all" in query:
+            return 1.0
+        if "ids" in query:
+            return 1.0 if doc_id in query["ids"]["values"] else None
+        if "match" in query:
+            (field, spec), = query["match"].items()
+            text, boost = (spec.get("query", ""), spec.get("boost", 1.0)) if isinstance(spec, dict) else (spec, 1.0)
+            counts = Counter(_tokens(source.get(field, "")))
+            score = sum(idf.get(token, 1.0) * counts[token] / (counts[token] + 1.2) for token in _tokens(text))
+            return score * boost if score > 0 else None
+        if "term" in query:
+            (field, value), = query["term"].items()
+            value = value.get("value") if isinstance(value, dict) else value
+            return 1.0 if source.get(field) == value else None
+        if "terms" in query:
+            (field, values), = query["terms"].items()
+            return 1.0 if source.get(field) in values else None
+        if "range" in query:
+            (field, bounds), = query["range"].items()
+            value = source.get(field)
+            if value is None:
+                return None
+            checks = {"gt": value.__gt__, "gte": value.__ge__, "lt": value.__lt__, "lte": value.__le__}
+            return 1.0 if all(checks[op](bound) for op, bound in bounds.items() if op in checks) else None
+        if "exists" in query:
+            return 1.0 if source.get(query["exists"]["field"]) is not None else None
+        if "bool" in query:
+            clauses = query["bool"]
+            score = 0.0
+            for clause in clauses.get("must", []) + clauses.get("filter", []):
+                clause_score = self._score(clause, source, idf, doc_id)
+                if clause_score is None:
+                    return None
+                score += clause_score if clause in clauses.get("must", []) else 0.0
+            for clause in clauses.get("must_not", []):
+                if self._score(clause, source, idf, doc_id) is not None:
+                    return None
+            should_scores = [s for s in (self._score(clause, source, idf, doc_id) for clause in clauses.get("should", [])) if s is not None]
+            if clauses.get("should") and not should_scores and not (clauses.get("must") or clauses.get("filter")):
+                return None
+            return score + sum(should_scores) or 1.0
+        raise ValueError(f"Unsupported fake query: {query}")
+
+    @staticmethod
+    def _filter_source(source: dict, spec: Any) -> Optional[dict]:
+        if spec is None or spec is True:
+            return dict(source)
+        if spec is False:
+            return None
+        if isinstance(spec, str):
+            spec = [spec]
+        if isinstance(spec, list):
+            return {key: value for key, value in source.items() if key in spec}
+        includes, excludes = spec.get("includes"), spec.get("excludes", [])
+        return {
+            key: value for key, value in source.items()
+            if (not includes or key in includes) and key not in excludes
+        }
+
+    def _aggregate(self, aggs: Dict[str, Any], sources: List[dict]) -> Dict[str, Any]:
+        results = {}
+        for name, spec in aggs.items():
+            if "cardinality" in spec:
+                field = spec["cardinality"]["field"]
+                results[name] = {"value": len({source[field] for source in sources if field in source})}
+            elif "composite" in spec:
+                composite = spec["composite"]
+                (key_name, key_spec), = composite["sources"][0].items()
+                field = key_spec["terms"]["field"]
+                counts = Counter(source[field] for source in sources if field in source)
+                keys = sorted(counts)
+                if composite.get("after"):
+                    keys = [key for key in keys if key > composite["after"][key_name]]
+                keys = keys[:composite.get("size", 10)]
+                buckets = [{"key": {key_name: key}, "doc_count": counts[key]} for key in keys]
+                results[name] = {"buckets": buckets, **({"after_key": buckets[-1]["key"]} if buckets else {})}
+            else:
+                raise ValueError(f"Unsupported fake aggregation: {spec}")
+        return results
+
+    def _search(self, index: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        pit = body.get("pit")
+        docs = list((self._pits[pit["id"]] if pit else self._docs(index)).items())
+        query = body.get("query")
+        if "knn" in body:
+            knn = body["knn"]
+            vector = np.asarray(knn["query_vector"], dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            candidates = [(doc_id, source) for doc_id, source in docs
+                          if source.get(knn["field"]) is not None and self._score(knn.get("filter"), source, {}) is not None]
+            scored = []
+            for doc_id, source in candidates:
+                stored = np.asarray(source[knn["field"]], dtype=np.float32)
+                similarity = float(stored @ vector / (np.linalg.norm(stored) or 1.0))
+                scored.append(((1 + similarity) / 2, doc_id, source))
+            scored.sort(key=lambda item: item[0], reverse=True)
+            scored = scored[:knn["k"]]
+        else:
+            document_frequency = Counter(token for _, source in docs for token in set(_tokens(source.get("content", ""))))
+            idf = {token: math.log(1 + len(docs) / count) for token, count in document_frequency.items()}
+            scored = []
+            for doc_id, source in docs:
+                score = self._score(query, source, idf, doc_id)
+                if score is not None:
+                    scored.append((score, doc_id, source))
+            if body.get("sort"):
+                fields = _sort_fields(body["sort"])
+                if any(field == "_shard_doc" for field, _ in fields) and not pit:
+                    raise ValueError("_shard_doc sort is only supported with a point in time")
+                # Snapshot position stands in for _shard_doc: unique and stable within one point in time.
+                shard_doc = {doc_id: position for position, (doc_id, _) in enumerate(docs)}
+                orders = [order for _, order in fields]
+                scored = [(score, doc_id, source,
+                           [shard_doc[doc_id] if field == "_shard_doc" else score if field == "_score"
+                            else source.get(field, 0) for field, _ in fields])
+                          for score, doc_id, source in scored]
+                scored.sort(key=cmp_to_key(lambda a, b: _compare(a[3], b[3], orders)))
+                if body.get("search_after"):
+                    after = list(body["search_after"])
+                    scored = [item for item in scored if _compare(item[3], after, orders) > 0]
+            else:
+                scored.sort(key=lambda item: item[0], reverse=True)
+
+        offset = body.get("from", 0)
+        size = body.get("size", 10)
+        source_spec = body.get("_source")
+        hits = []
+        for score, doc_id, source, *sort_values in scored[offset:offset + size]:
+            hit = {"_index": index, "_id": doc_id, "_score": score}
+            filtered = self._filter_source(source, source_spec)
+            if filtered is not None:
+                hit["_source"] = filtered
+            if sort_values:
+                hit["sort"] = sort_values[0]
+            if body.get("fields"):
+                hit["fields"] = {field: [source[field]] for field in body["fields"] if field in source}
+            hits.append(hit)
+        response = {
+            "took": int((time.perf_counter() - start) * 1000),
+            "timed_out": False,
+            "hits": {"total": {"value": len(scored), "relation": "eq"}, "max_score": scored[0][0] if scored else None, "hits": hits},
+        }
+        aggs = body.get("aggs") or body.get("aggregations")
+        if aggs:
+            response["aggregations"] = self._aggregate(aggs, [item[2] for item in scored])
+        if pit:
+            response["pit_id"] = pit["id"]
+        return response
+
+    def search(self, index: Optional[str] = None, body: Optional[dict] = None, **kwargs) -> Dict[str, Any]:
+        self._wait()
+        with self._lock:
+            return _Response(self._search(index, {**(body or {}), **kwargs}))
+
+    def msearch(self, searches: Optional[list] = None, body: Optional[list] = None, index: Optional[str] = None,
+                **kwargs) -> Dict[str, Any]:
+        self._wait()
+        start = time.perf_counter()
+        lines = searches or body or []
+        responses = []
+        with self._lock:
+            for header, search_body in zip(lines[::2], lines[1::2]):
+                try:
+                    responses.append({**self._search(header.get("index", index), search_body), "status": 200})
+                except Exception as e:
+                    responses.append({"error": {"type": type(e).__name__, "reason": str(e)}, "status": 400})
+        return _Response(took=int((time.perf_counter() - start) * 1000), responses=responses)
+
+    def count(self, index: str, query: Optional[dict] = None, body: Optional[dict] = None, **kwargs) -> Dict[str, Any]:
+        self._wait()
+        query = query or (body or {}).get("query")
+        with self._lock:
+            return {"count": sum(1 for source in self._docs(index).values() if self._score(query, source, {}) is not None)}
+
+    def delete_by_query(self, index: str, query: Optional[dict] = None, body: Optional[dict] = None, **kwargs) -> Dict[str, Any]:
+        self._wait()
+        start = time.perf_counter()
+        query = query or (body or {}).get("query")
+        with self._lock:
+            docs = self._docs(index)
+            matched = [doc_id for doc_id, source in docs.items() if self._score(query, source, {}, doc_id) is not None]
+            for doc_id in matched:
+                del docs[doc_id]
+        return {"took": int((time.perf_counter() - start) * 1000), "deleted": len(matched), "failures": []}
+
+    def close(self) -> None:
+        pass
+
+
+class FakeAsyncElasticsearch:
+    """Async facade sharing the data of a ``FakeElasticsearch``; latency is awaited, not slept."""
+
+    def __init__(self, sync: FakeElasticsearch):
+        self.latency = sync.latency
+        self._inner = FakeElasticsearch(latency=0.0, shared=sync)
+        self.indices = SimpleNamespace(**{
+            name: self._wrap(getattr(self._inner.indices, name))
+            for name in ("exists", "create", "delete", "refresh", "get", "exists_alias", "get_alias", "update_aliases")
+        })
+
+    def _wrap(self, method):
+        async def call(*args, **kwargs):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return method(*args, **kwargs)
+        return call
+
+    def options(self, **kwargs) -> "FakeAsyncElasticsearch":
+        return self
+
+    def __getattr__(self, name: str):
+        return self._wrap(getattr(self._inner, name))
+
+    async def close(self) -> None:
+        pass
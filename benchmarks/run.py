@@ -0,0 +1,278 @@
+"""Offline latency benchmark for the agent workflow and the FastAPI endpoints.
+
+Runs the real ``Agent`` workflow and ``main.app`` against in-process stand-ins
+for Elasticsearch, Ollama and the embedding model (see ``benchmarks/fakes.py``),
+replays a synthetic or recorded query workload at several concurrency levels,
+and reports p50/p95/p99 latency and throughput per endpoint and per graph node.
+
+    python -m benchmarks.run --concurrency 1 8 32 --requests 200
+    python -m benchmarks.run --workload queries.jsonl --compare benchmarks/results/<previous>.json
+
+A workload file holds one JSON object per line; the query is read from
+``user_input``, ``query`` or ``title``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+_VOCABULARY = (
+    "index vector search latency cluster shard replica query embedding model token context document "
+    "policy refund invoice payroll onboarding security network kernel memory cache throughput "
+    "deployment container gateway schema retrieval summary benchmark replica storage backup"
+).split()
+
+
+def install_fakes(args: argparse.Namespace) -> Dict[str, Any]:
+    """Point the app at the fakes. Must run before anything imports ``main`` or ``agent``."""
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    synonyms_path = os.path.join(workdir, "synonyms.json")
+    with open(synonyms_path, "w") as f:
+        json.dump({}, f)
+    os.environ["SYNONYMS_PATH"] = synonyms_path
+    os.environ["CHUNK_EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "chunk_embeddings.sqlite")
+    os.environ["ANSWER_CACHE_ENABLED"] = "true" if args.answer_cache else "false"
+    os.environ["ASYNC_MODE"] = "true" if args.async_mode else "false"
+    os.environ["EMBEDDING_WARMUP"] = "false"
+    os.environ["LLM_WARMUP"] = "false"
+    os.environ["RETRIEVAL_BACKEND"] = args.backend
+    os.environ["LOCAL_STORE_PATH"] = os.path.join(workdir, "vector_store")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from benchmarks.fakes import FakeAsyncElasticsearch, FakeElasticsearch, FakeLLM, HashEmbeddings
+
+    import services.embeddings as embeddings_module
+    embeddings_module.embeddings = HashEmbeddings(dims=args.dims, latency=args.embedding_latency)
+
+    import services.es_client as es_client
+    es_client.es = FakeElasticsearch(latency=args.es_latency)
+    es_client.async_es = FakeAsyncElasticsearch(es_client.es)
+
+    import services.llm_gateway as llm_gateway_module
+    llm_gateway_module.llm_gateway = llm_gateway_module.LLMGateway(
+        llm_factory=partial(FakeLLM, latency=args.llm_latency, token_latency=args.token_latency))
+
+    import main
+    from config import INDEX_NAME, LLM_MODEL
+    from services.agent_registry import AgentRegistry
+
+    main.agent_registry = AgentRegistry(
+        es=es_client.es,
+        index_name=INDEX_NAME,
+        llm_model=LLM_MODEL,
+        async_es=es_client.async_es,
+        vector_store=main.local_store,
+        async_mode=args.async_mode,
+        llm=llm_gateway_module.llm_gateway,
+    )
+    main.agent_registry.build()
+    return {"main": main, "registry": main.agent_registry, "es": es_client.es}
+
+
+def synthetic_documents(count: int, words: int, rng: random.Random) -> List[Dict[str, str]]:
+    return [
+        {
+            "doc_id": f"bench-{i:05d}",
+            "title": f"Benchmark document {i}",
+            "content": " ".join(rng.choice(_VOCABULARY) for _ in range(words)),
+        }
+        for i in range(count)
+    ]
+
+
+def synthetic_queries(count: int, rng: random.Random) -> List[str]:
+    templates = ["What does the {a} policy say about {b}?", "How does {a} affect {b}?", "Explain {a} and {b}"]
+    return [
+        rng.choice(templates).format(a=rng.choice(_VOCABULARY), b=rng.choice(_VOCABULARY))
+        for _ in range(count)
+    ]
+
+
+def load_workload(path: str) -> List[str]:
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                query = record.get("user_input") or record.get("query") or record.get("title")
+                if query:
+                    queries.append(query)
+    return queries
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Latency percentiles in milliseconds plus throughput in requests per second."""
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(percentile(50), 3),
+        "p95_ms": round(percentile(95), 3),
+        "p99_ms": round(percentile(99), 3),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+async def run_concurrently(calls: List[Callable[[], Awaitable[Any]]], concurrency: int) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def timed(call):
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(call) for call in calls))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def bench_endpoints(app, documents, queries, concurrency: int) -> Dict[str, Dict[str, float]]:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def request(method: str, path: str, **kwargs):
+            response = await client.request(method, path, **kwargs)
+            response.raise_for_status()
+
+        return {
+            "/add_document": await run_concurrently(
+                [partial(request, "POST", "/add_document", json=doc) for doc in documents], concurrency),
+            "/search_document": await run_concurrently(
+                [partial(request, "POST", "/search_document", params={"query": q}) for q in queries], concurrency),
+            "/process": await run_concurrently(
+                [partial(request, "POST", "/process", params={"user_input": q}) for q in queries], concurrency),
+            "/process?use_summarization=true": await run_concurrently(
+                [partial(request, "POST", "/process", params={"user_input": q, "use_summarization": "true"})
+                 for q in queries], concurrency),
+        }
+
+
+async def bench_nodes(registry, queries, concurrency: int) -> Dict[str, Dict[str, float]]:
+    """Time each graph node from the gaps between consecutive ``updates`` stream events."""
+    durations: Dict[str, List[float]] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def record(previous: float, update: Dict[str, Any]) -> float:
+        now = time.perf_counter()
+        for node in update:
+            durations.setdefault(node, []).append(now - previous)
+        return now
+
+    async def run(agent, query):
+        async with semaphore:
+            previous = time.perf_counter()
+            if agent.async_mode:
+                async for update in agent.workflow.astream({"user_input": query}, stream_mode="updates"):
+                    previous = record(previous, update)
+            else:
+                def run_sync():
+                    last = time.perf_counter()
+                    for update in agent.workflow.stream({"user_input": query}, stream_mode="updates"):
+                        last = record(last, update)
+                await asyncio.to_thread(run_sync)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(registry.get(use_summarization), query)
+                           for use_summarization in (False, True) for query in queries))
+    elapsed = time.perf_counter() - start
+    return {node: summarize(values, elapsed) for node, values in durations.items()}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print p50/p95 deltas against a previous results file."""
+    print(f"\nComparison against {baseline['started_at']}:")
+    for level, sections in current["results"].items():
+        for section in ("endpoints", "nodes"):
+            for name, stats in sections[section].items():
+                before = baseline["results"].get(level, {}).get(section, {}).get(name)
+                if not before or not stats.get("count") or not before.get("count"):
+                    continue
+                deltas = ", ".join(
+                    f"{key} {stats[key]:.1f} ({(stats[key] - before[key]) / before[key] * 100:+.1f}%)"
+                    for key in ("p50_ms", "p95_ms") if before[key]
+                )
+                print(f"  c={level:<4} {name:<36} {deltas}")
+
+
+def print_results(level: int, results: Dict[str, Dict[str, Dict[str, float]]]) -> None:
+    print(f"\nconcurrency={level}")
+    for section in ("endpoints", "nodes"):
+        for name, stats in results[section].items():
+            if stats.get("count"):
+                print(f"  {name:<36} p50 {stats['p50_ms']:9.2f}ms  p95 {stats['p95_ms']:9.2f}ms  "
+                      f"p99 {stats['p99_ms']:9.2f}ms  {stats['throughput_rps']:8.1f} req/s")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="queries per endpoint per concurrency level")
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--document-words", type=int, default=600)
+    parser.add_argument("--workload", help="JSONL file of recorded queries; synthetic queries are used otherwise")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per streamed fake token")
+    parser.add_argument("--es-latency", type=float, default=0.0, help="seconds per fake Elasticsearch request")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="seconds per fake encode call")
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--sync", dest="async_mode", action="store_false", help="benchmark the sync workflow")
+    parser.add_argument("--backend", choices=["elasticsearch", "local"], default="elasticsearch",
+                        help="retrieve from the fake Elasticsearch or the embedded local vector store")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file, default benchmarks/results/<timestamp>.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    handles = install_fakes(args)
+    rng = random.Random(args.seed)
+    documents = synthetic_documents(args.documents, args.document_words, rng)
+    workload = load_workload(args.workload) if args.workload else synthetic_queries(args.requests, rng)
+    queries = [workload[i % len(workload)] for i in range(args.requests)]
+
+    started_at = datetime.now()
+    results: Dict[str, Any] = {}
+    for level in args.concurrency:
+        results[str(level)] = {
+            "endpoints": asyncio.run(bench_endpoints(handles["main"].app, documents, queries, level)),
+            "nodes": asyncio.run(bench_nodes(handles["registry"], queries, level)),
+        }
+        print_results(level, results[str(level)])
+
+    report = {"started_at": started_at.isoformat(timespec="seconds"), "config": vars(args), "results": results}
+    output = args.output or os.path.join(RESULTS_DIR, f"{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,128 @@
-from sentence_transformers import SentenceTransformer
+import os
 
 ELASTICSEARCH_URL = "http://elasticsearch:9200"
 INDEX_NAME = "chunks"
 LLM_MODEL = "llama3.1:8b"
-EMBEDDINGS_MODEL = "BAAI/bge-large-en"
-
-embeddings = SentenceTransformer(EMBEDDINGS_MODEL, device="cuda")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
+# Concurrent generations allowed through the shared LLM gateway; match Ollama's OLLAMA_NUM_PARALLEL
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# How long Ollama keeps the model loaded after the last request (Ollama duration string, "-1" forever)
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "BAAI/bge-large-en")
+# "auto" picks cuda, then mps, then cpu
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "auto")
+# "torch", or the CPU-only "onnx" (needs sentence-transformers[onnx]) and "int8" (dynamic quantization)
+EMBEDDING_MODE = os.getenv("EMBEDDING_MODE", "torch")
+# 0 keeps the library defaults
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", "0"))
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "0"))
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+# Concurrent query encodes arriving within this window share one forward pass; 0 disables micro-batching
+EMBEDDING_MICROBATCH_WAIT_MS = float(os.getenv("EMBEDDING_MICROBATCH_WAIT_MS", "3"))
+EMBEDDING_MICROBATCH_MAX_SIZE = int(os.getenv("EMBEDDING_MICROBATCH_MAX_SIZE", "32"))
+
+ASYNC_MODE = os.getenv("ASYNC_MODE", "true").lower() == "true"
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_MAX_DOCS = int(os.getenv("SUMMARY_MAX_DOCS", "2"))
+# Summarize chunks once in a background pass after ingestion and reuse the stored summaries at query time
+SUMMARY_PRECOMPUTE = os.getenv("SUMMARY_PRECOMPUTE", "false").lower() == "true"
+SUMMARY_PASS_BATCH_SIZE = int(os.getenv("SUMMARY_PASS_BATCH_SIZE", "32"))
+SUMMARY_PASS_INTERVAL_SECONDS = float(os.getenv("SUMMARY_PASS_INTERVAL_SECONDS", "60"))
+# Chunks whose summarization failed are retried after this long
+SUMMARY_RETRY_SECONDS = float(os.getenv("SUMMARY_RETRY_SECONDS", "3600"))
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2048"))
+# Share of a block's word shingles already present in a kept block above which it counts as a duplicate
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# In characters
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "512"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "51"))
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_THREAD_COUNT = int(os.getenv("BULK_THREAD_COUNT", "2"))
+# Background ingestion: workers share the one embedding model, so a single worker is usually right
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_QUEUE_MAX_JOBS = int(os.getenv("INGEST_QUEUE_MAX_JOBS", "100"))
+# Queued jobs are coalesced into one pipeline run of up to this many documents
+INGEST_MAX_DOCUMENTS_PER_RUN = int(os.getenv("INGEST_MAX_DOCUMENTS_PER_RUN", "64"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "1000"))
+# Bytes read from an uploaded file at a time; bounds the text held in memory while it is chunked
+UPLOAD_READ_SIZE = int(os.getenv("UPLOAD_READ_SIZE", str(1024 * 1024)))
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+CHUNK_EMBEDDING_CACHE_PATH = os.getenv("CHUNK_EMBEDDING_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "chunk_embeddings.sqlite"))
+CHUNK_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("CHUNK_EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_SIZE = int(os.getenv("ANSWER_CACHE_MAX_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+INTENT_PROTOTYPE_MIN_SIMILARITY = float(os.getenv("INTENT_PROTOTYPE_MIN_SIMILARITY", "0.85"))
+INTENT_PROTOTYPE_MIN_MARGIN = float(os.getenv("INTENT_PROTOTYPE_MIN_MARGIN", "0.05"))
+
+# "int8_hnsw" stores int8-quantized vectors in the HNSW graph, "hnsw" keeps full float32
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "int8_hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+KNN_K = int(os.getenv("KNN_K", "50"))
+KNN_NUM_CANDIDATES = int(os.getenv("KNN_NUM_CANDIDATES", "100"))
+# Deepest rank /search_document can page to; Elasticsearch caps search size and kNN k at 10000 by default
+SEARCH_MAX_WINDOW = int(os.getenv("SEARCH_MAX_WINDOW", "10000"))
+BM25_WINDOW_SIZE = int(os.getenv("BM25_WINDOW_SIZE", "50"))
+RRF_RANK_CONSTANT = int(os.getenv("RRF_RANK_CONSTANT", "60"))
+# Queries per msearch request in batch retrieval (two sub-searches each)
+MSEARCH_MAX_QUERIES = int(os.getenv("MSEARCH_MAX_QUERIES", "100"))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "1000"))
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "4"))
+
+SYNONYMS_PATH = os.getenv("SYNONYMS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "synonyms.json"))
+SYNONYMS_PER_WORD = int(os.getenv("SYNONYMS_PER_WORD", "3"))
+MAX_EXPANSION_TERMS = int(os.getenv("MAX_EXPANSION_TERMS", "12"))
+SYNONYM_BOOST = float(os.getenv("SYNONYM_BOOST", "0.3"))
+QUERY_EXPANSION_CACHE_SIZE = int(os.getenv("QUERY_EXPANSION_CACHE_SIZE", "10000"))
+
+# "elasticsearch", or "local" for the embedded memory-mapped store (no cluster needed)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "elasticsearch")
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "vector_store"))
+# "float16" halves the vector file; scores are computed in float32 either way
+LOCAL_STORE_DTYPE = os.getenv("LOCAL_STORE_DTYPE", "float16")
+
+# Reindexing into a new index version behind the INDEX_NAME alias
+REINDEX_WORKERS = int(os.getenv("REINDEX_WORKERS", "4"))
+REINDEX_PAGE_SIZE = int(os.getenv("REINDEX_PAGE_SIZE", "100"))
+REINDEX_PIT_KEEP_ALIVE = os.getenv("REINDEX_PIT_KEEP_ALIVE", "5m")
+REINDEX_CATCHUP_ROUNDS = int(os.getenv("REINDEX_CATCHUP_ROUNDS", "3"))
+REINDEX_CHECKPOINT_PATH = os.getenv("REINDEX_CHECKPOINT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "reindex_checkpoint.json"))
+
+# "dims" for the embedding field is filled in from the embedding model when the index is created
+INDEX_MAPPING = {
+    "properties": {
+        "title": {"type": "text"},
+        "content": {"type": "text"},
+        "document_id": {"type": "keyword"},
+        "chunk_index": {"type": "integer"},
+        "content_hash": {"type": "keyword"},
+        "indexed_at": {"type": "date", "format": "epoch_millis"},
+        "summary": {"type": "text", "index": False},
+        # content_hash the stored summary was generated from
+        "summary_hash": {"type": "keyword"},
+        "embedding": {
+            "type": "dense_vector",
+            "index": True,
+            "similarity": "cosine",
+            "index_options": {
+                "type": VECTOR_INDEX_TYPE,
+                "m": HNSW_M,
+                "ef_construction": HNSW_EF_CONSTRUCTION,
+            },
+        },
+    }
+}
 
 CLASSIFY_INTENT_PROMPT = """You are an intent classification assistant.
 
@@ -39,20 +156,22 @@ Examples of how different requests should be understood:
 User message: {query_input}
 """
 
+# Fixed instructions come before the variable parts of every prompt, so consecutive calls share a
+# prefix that Ollama can reuse from its KV cache instead of evaluating it again.
 PROMPT_FOR_QA = """
 You are a helpful assistant. Use the provided context to answer the question as accurately as possible.
 
+Instructions:
+- If the answer is clearly stated in the context, provide a direct and concise answer.
+- If the question is relevant to the context but the answer is **not fully available**, say so and explain briefly.
+- If the question is **not related** to the context at all, politely state that the context does not contain relevant information.
+
 Context:
 {context}
 
 Question:
 {query}
 
-Instructions:
-- If the answer is clearly stated in the context, provide a direct and concise answer.
-- If the question is relevant to the context but the answer is **not fully available**, say so and explain briefly.
-- If the question is **not related** to the context at all, politely state that the context does not contain relevant information.
-
 Answer:
 """
 
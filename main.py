@@ -1,19 +1,79 @@
+import asyncio
+import json
 import logging
+import queue
+import time
+from contextlib import asynccontextmanager
+from typing import List
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from agent import Agent
-from config import INDEX_NAME, LLM_MODEL
-from models import DocumentRequest
-from services.document_ops import embeddings, hybrid_search
-from services.es_client import es
-from services.text_utils import chunk_text
+from config import (ANSWER_CACHE_ENABLED, BATCH_GENERATION_CONCURRENCY, BATCH_MAX_QUERIES, EMBEDDING_WARMUP,
+                    INDEX_NAME, LLM_MODEL, LLM_WARMUP, SEARCH_MAX_WINDOW, SUMMARY_PRECOMPUTE,
+                    UPLOAD_READ_SIZE)
+from models import BatchQuestionRequest, DocumentRequest
+from services.agent_registry import AgentRegistry
+from services.document_ops import ahybrid_search
+from services.answer_cache import CACHEABLE_INTENTS, answer_cache, index_generation
+from services.chunk_summaries import ChunkSummarizer
+from services.embedding_cache import chunk_embeddings, query_embeddings
+from services.embeddings import embeddings
+from services.es_client import async_es, es
+from services.ingestion import StreamedDocument
+from services.ingestion_jobs import IngestionJob, IngestionJobQueue
+from services.llm_gateway import llm_gateway
+from services.metrics import REQUEST_SECONDS, current_timings, start_trace, trace_id_var
+from services.query_expansion import load_synonym_table
+from services.reindex import Reindexer
+from services.retriever import DEFAULT_HIT_FIELDS, HIT_SOURCE_FIELDS
+from services.text_utils import iter_decoded
+from services.vector_store import local_store
+from services.write_gate import index_writes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+agent_registry = AgentRegistry(es=es, index_name=INDEX_NAME, llm_model=LLM_MODEL, async_es=async_es,
+                               vector_store=local_store)
+chunk_summarizer = ChunkSummarizer(
+    es=es,
+    index_name=INDEX_NAME,
+    llm=llm_gateway,
+    vector_store=local_store,
+)
+
+
+def _after_ingest(report):
+    if SUMMARY_PRECOMPUTE and report["chunks_indexed"]:
+        chunk_summarizer.notify()
+
+
+ingestion_jobs = IngestionJobQueue(on_complete=_after_ingest)
+reindexer = Reindexer(es)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if EMBEDDING_WARMUP:
+        embeddings.warm_up()
+    if LLM_WARMUP:
+        llm_gateway.start_warm_up()
+    load_synonym_table()
+    agent_registry.build()
+    ingestion_jobs.start()
+    if SUMMARY_PRECOMPUTE:
+        chunk_summarizer.start()
+    yield
+    chunk_summarizer.stop()
+    ingestion_jobs.stop()
+    await async_es.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,17 +81,143 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-ID"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Assign a trace ID, collect the per-request timing breakdown and observe request latency."""
+    trace_id = start_trace(request.headers.get("X-Trace-ID"))
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(endpoint=route.path if route else "unmatched").observe(elapsed)
+    response.headers["X-Trace-ID"] = trace_id
+    logger.info(f"[{trace_id}] {request.method} {request.url.path} {response.status_code} "
+                f"in {elapsed * 1000:.1f}ms {current_timings()}")
+    return response
+
 @app.post("/process")
-def process_request(user_input: str, use_summarization: bool = False):
+async def process_request(user_input: str, use_summarization: bool = False, include_timings: bool = False):
     """
     remove_document: 'remove | doc_id'
+
+    With ``include_timings`` the response metadata carries the trace ID and a
+    per-stage timing breakdown in milliseconds.
     """
     logger.info(f"Processing request: {user_input}, use summarization: {use_summarization}")
-    agent = Agent(es=es, index_name=INDEX_NAME, llm_model=LLM_MODEL, use_summarization=use_summarization)
-    result = agent.workflow.invoke({"user_input": user_input})
-    return {"response": result.get("response", "No response")}
+    if ANSWER_CACHE_ENABLED:
+        cached = await run_in_threadpool(answer_cache.lookup, user_input, use_summarization)
+        if cached:
+            logger.info(f"Answer cache hit with similarity {cached.similarity:.3f}")
+            return {"response": cached.response, "metadata": _metadata(_cache_metadata(cached), include_timings)}
+
+    generation = index_generation.value
+    agent = agent_registry.get(use_summarization)
+    if agent.async_mode:
+        result = await agent.workflow.ainvoke({"user_input": user_input})
+    else:
+        result = await run_in_threadpool(agent.workflow.invoke, {"user_input": user_input})
+    response = result.get("response", "No response")
+    if ANSWER_CACHE_ENABLED and result.get("intent") in CACHEABLE_INTENTS and result.get("retrieved_docs"):
+        await run_in_threadpool(answer_cache.store, user_input, response, generation, use_summarization)
+    return {"response": response, "metadata": _metadata({"cache_hit": False}, include_timings)}
+
+def _metadata(metadata, include_timings: bool):
+    if include_timings:
+        metadata = {**metadata, "trace_id": trace_id_var.get(), "timings_ms": current_timings()}
+    return metadata
+
+def _cache_metadata(cached):
+    return {
+        "cache_hit": True,
+        "similarity": round(cached.similarity, 4),
+        "index_generation": cached.generation,
+        "age_seconds": round(cached.age_seconds, 1),
+    }
+
+@app.get("/process/stream")
+async def process_stream_request(user_input: str, use_summarization: bool = False):
+    """Streams the workflow as Server-Sent Events: intent, retrieval, summaries, token, response."""
+    logger.info(f"Streaming request: {user_input}, use summarization: {use_summarization}")
+    agent = agent_registry.get(use_summarization)
+
+    async def events():
+        if ANSWER_CACHE_ENABLED:
+            cached = await run_in_threadpool(answer_cache.lookup, user_input, use_summarization)
+            if cached:
+                yield f"event: response\ndata: {json.dumps(cached.response)}\n\n"
+                yield f"event: done\ndata: {json.dumps(_cache_metadata(cached))}\n\n"
+                return
+
+        generation = index_generation.value
+        intent, retrieved, response = None, False, None
+        async for event, data in agent.astream_process(user_input):
+            if event == "intent":
+                intent = data["intent"]
+            elif event == "retrieval":
+                retrieved = bool(data)
+            elif event == "response":
+                response = data
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        if ANSWER_CACHE_ENABLED and intent in CACHEABLE_INTENTS and retrieved and response is not None:
+            await run_in_threadpool(answer_cache.store, user_input, response, generation, use_summarization)
+        yield f"event: done\ndata: {json.dumps({'cache_hit': False})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/process_batch")
+async def process_batch_request(request: BatchQuestionRequest):
+    """Answers many questions in one call, streamed back as NDJSON lines in completion order.
+
+    Retrieval for all queries is one batched encode plus one ``msearch`` per
+    ``MSEARCH_MAX_QUERIES`` queries; generation then runs with at most
+    ``BATCH_GENERATION_CONCURRENCY`` LLM calls in flight. With ``retrieve_only``
+    the retrieved chunks are returned instead of answers.
+    """
+    logger.info(f"Processing batch of {len(request.queries)} queries, use summarization: {request.use_summarization}")
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries is required")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+
+    agent = agent_registry.get(request.use_summarization)
+    queries = [query.strip() for query in request.queries]
+    if agent.async_mode:
+        retrieved = await agent.retriever.asearch_many(queries, k=request.k, fields=agent.hit_fields)
+    else:
+        retrieved = await run_in_threadpool(agent.retriever.search_many, queries, request.k, agent.hit_fields)
+
+    async def answer(index: int):
+        record = {"index": index, "query": request.queries[index]}
+        try:
+            response = await agent.aanswer_with_docs(queries[index], retrieved[index])
+        except Exception as e:
+            logger.error(f"Batch query {index} failed: {e}")
+            return {**record, "error": str(e)}
+        return {**record, "response": response, "sources": [doc["chunk_id"] for doc in retrieved[index]]}
+
+    async def lines():
+        if request.retrieve_only:
+            for index, docs in enumerate(retrieved):
+                yield json.dumps({"index": index, "query": request.queries[index], "retrieved_docs": docs}) + "\n"
+            return
+        semaphore = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+
+        async def bounded(index: int):
+            async with semaphore:
+                return await answer(index)
+
+        tasks = [asyncio.create_task(bounded(index)) for index in range(len(queries))]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @app.post("/add_document")
 def add_document_api(request: DocumentRequest):
@@ -39,49 +225,157 @@ def add_document_api(request: DocumentRequest):
     if not request.doc_id or not request.content or not request.title:
         raise HTTPException(status_code=400, detail="doc_id, content, and title are required")
 
-    content = request.content.replace('\n', '')
-    content = content.replace('"', '')
-    chunks = chunk_text(content)
-
-    for chunk in chunks:
-        # Create a document dictionary
-        document = {
-            "title": request.title,
-            "content": chunk,
-            "document_id": request.doc_id,
-            "embedding": embeddings.encode(chunk)
-        }
-        logger.info("THE INDEX NAME IS: {INDEX_NAME}")
-        es.index(index=INDEX_NAME, body=document)
+    result = _ingest_and_wait([request]).results[0]
+    if result["status"] != "success":
+        raise HTTPException(status_code=500, detail=result["message"])
     return {"response": f"Document '{request.title}' added with ID '{request.doc_id}'."}
 
+@app.post("/add_documents")
+def add_documents_api(requests: List[DocumentRequest]):
+    logger.info(f"API call: add_documents with {len(requests)} documents")
+    valid = [request for request in requests if request.doc_id and request.content and request.title]
+    invalid = [
+        {"doc_id": request.doc_id, "status": "error", "chunks_indexed": 0,
+         "message": "doc_id, content, and title are required"}
+        for request in requests if not (request.doc_id and request.content and request.title)
+    ]
+    report = {"results": [], "chunks_indexed": 0, "elapsed_seconds": 0.0, "chunks_per_second": 0.0}
+    if valid:
+        job = _ingest_and_wait(valid)
+        status = job.to_dict()
+        report = {"results": list(job.results),
+                  **{key: status[key] for key in ("chunks_indexed", "elapsed_seconds", "chunks_per_second")}}
+    report["results"].extend(invalid)
+    return {"response": report}
+
+@app.post("/upload_document")
+def upload_document_api(doc_id: str = Form(...), title: str = Form(None), file: UploadFile = File(...)):
+    """Index a large UTF-8 text file; it is read, chunked and embedded incrementally instead of loaded whole."""
+    title = title or file.filename
+    logger.info(f"API call: upload_document with title: {title}, id: {doc_id}")
+    if not doc_id or not title:
+        raise HTTPException(status_code=400, detail="doc_id and title are required")
+
+    document = StreamedDocument(doc_id=doc_id, title=title, pieces=iter_decoded(file.file, UPLOAD_READ_SIZE))
+    result = _ingest_and_wait([document]).results[0]
+    if result["status"] != "success":
+        raise HTTPException(status_code=500, detail=result["message"])
+    return {"response": f"Document '{title}' added with ID '{doc_id}'.", "chunks_indexed": result["chunks_indexed"]}
+
+def _submit(documents: List[DocumentRequest]) -> IngestionJob:
+    try:
+        return ingestion_jobs.submit(documents)
+    except queue.Full as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+def _ingest_and_wait(documents: List[DocumentRequest]) -> IngestionJob:
+    """Queue the documents behind any running ingestion and block until they are indexed."""
+    job = _submit(documents)
+    job.done.wait()
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Ingestion failed: {job.error}")
+    return job
+
+@app.post("/ingest_jobs", status_code=202)
+def submit_ingest_job_api(requests: List[DocumentRequest]):
+    """Queue documents for background ingestion and return the job ID right away."""
+    logger.info(f"API call: ingest_jobs with {len(requests)} documents")
+    if not requests:
+        raise HTTPException(status_code=400, detail="at least one document is required")
+    if not all(request.doc_id and request.content and request.title for request in requests):
+        raise HTTPException(status_code=400, detail="doc_id, content, and title are required for every document")
+    job = _submit(requests)
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/ingest_jobs")
+def ingest_jobs_stats_api():
+    return ingestion_jobs.stats()
+
+@app.get("/ingest_jobs/{job_id}")
+def ingest_job_status_api(job_id: str):
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
 @app.post("/remove_document")
 def remove_document_api(request: DocumentRequest):
     logger.info(f"API call: remove_document with {request}")
     if not request.doc_id:
         raise HTTPException(status_code=400, detail="doc_id is required")
-    body = {
-        "query": {
-            "match": {
-                "document_id": request.doc_id
+    with index_writes.shared():
+        if local_store is not None:
+            result = {"deleted": local_store.delete_document(request.doc_id)}
+        else:
+            body = {
+                "query": {
+                    "term": {
+                        "document_id": request.doc_id
+                    }
+                }
             }
-        }
-    }
-    result = es.delete_by_query(index=INDEX_NAME, body=body)
+            result = es.delete_by_query(index=INDEX_NAME, body=body, refresh=True)
+    if result.get("deleted"):
+        index_generation.bump()
     return {"response": result}
 
 @app.post("/search_document")
-def search_document_api(query: str):
-    logger.info(f"API call: search_document for query: {query}")
+async def search_document_api(query: str, page: int = Query(1, ge=1), size: int = Query(5, ge=1, le=50),
+                              fields: List[str] = Query(list(DEFAULT_HIT_FIELDS))):
+    logger.info(f"API call: search_document for query: {query}, page: {page}, size: {size}")
     if not query:
         raise HTTPException(status_code=400, detail="query is required")
-    docs = hybrid_search(query=query)
+    unknown = set(fields) - HIT_SOURCE_FIELDS.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    if page * size > SEARCH_MAX_WINDOW:
+        raise HTTPException(status_code=400, detail=f"page * size may not exceed {SEARCH_MAX_WINDOW}")
+    docs = await ahybrid_search(query=query, k=size, offset=(page - 1) * size, fields=fields)
     if not docs:
         logger.info("No matching documents found.")
-        return {"response": "No matching documents found."}
+        return {"response": "No matching documents found.", "page": page, "size": size}
     logger.info(f"Found {len(docs)} documents.")
-    logger.info(f"Found documents. {docs}")
-    return {"retrieved_docs": docs, "response": "Documents found!"}
+    return {"retrieved_docs": docs, "page": page, "size": size, "response": "Documents found!"}
+
+@app.post("/reload_agents")
+def reload_agents_api():
+    logger.info("API call: reload_agents")
+    agent_registry.rebuild()
+    return {"response": "Agents reloaded."}
+
+@app.post("/reindex", status_code=202)
+def reindex_api(fresh: bool = False):
+    """Rebuild the index with the current chunking and embedding settings, then switch the alias."""
+    logger.info(f"API call: reindex (fresh={fresh})")
+    if local_store is not None:
+        raise HTTPException(status_code=400, detail="Reindexing is not available with the local retrieval backend")
+    if not reindexer.start(resume=not fresh):
+        raise HTTPException(status_code=409, detail="A reindex is already running")
+    return {"response": "Reindex started."}
+
+@app.get("/reindex")
+def reindex_progress_api():
+    return reindexer.report()
+
+@app.get("/embedding_cache_stats")
+def embedding_cache_stats_api():
+    return {"query": query_embeddings.stats(), "chunk": chunk_embeddings.stats()}
+
+@app.get("/answer_cache_stats")
+def answer_cache_stats_api():
+    return answer_cache.stats()
+
+@app.get("/chunk_summary_stats")
+def chunk_summary_stats_api():
+    return chunk_summarizer.stats()
+
+@app.get("/llm_stats")
+def llm_stats_api():
+    return llm_gateway.stats()
+
+@app.get("/metrics")
+def metrics_api():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/")
 def home():
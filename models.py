@@ -1,4 +1,4 @@
-from typing import Optional, TypedDict
+from typing import List, Optional, TypedDict
 
 from pydantic import BaseModel, Field
 
@@ -16,6 +16,17 @@ class AgentState(TypedDict):
     search_result: Optional[dict]
     extracted_info: Optional[dict]
     
+class SearchHit(TypedDict, total=False):
+    """Compact retrieval result; ``chunk_id`` is the chunk's index id, ``chunk_index`` its position in the document."""
+    chunk_id: str
+    doc_id: str  # Deprecated alias of ``chunk_id``, kept for existing API clients.
+    chunk_index: Optional[int]
+    document_id: str
+    title: str
+    content: str
+    score: float
+    embedding: List[float]
+
 class Document(BaseModel):
     doc_id: str = Field(description="Unique identifier for the document")
     title: Optional[str] = Field(default="", description="Document title")
@@ -26,6 +37,12 @@ class DocumentRequest(BaseModel):
     title: Optional[str]
     content: Optional[str]
 
+class BatchQuestionRequest(BaseModel):
+    queries: List[str]
+    use_summarization: bool = False
+    retrieve_only: bool = False
+    k: int = Field(default=5, ge=1, le=50)
+
 class UpdateDocumentRequest(BaseModel):
     doc_id: str
     new_title: str
@@ -1,6 +1,6 @@
 import React, { useState, useRef, useEffect } from "react";
-import axios from "axios";
 import { motion } from "framer-motion";
+import { streamQuery } from "./api";
 import { Send, Bot, User, Loader2, FileText } from "lucide-react";
 
 export default function ChatBox() {
@@ -26,38 +26,49 @@ export default function ChatBox() {
     setInput("");
     setIsLoading(true);
 
-    try {
-      const response = await axios.post("http://localhost:8000/process", null, {
-        params: { 
-          user_input: input,
-          use_summarization: useSummarization
-        },
+    const botId = Date.now() + 1;
+    const source = streamQuery(input, useSummarization);
+
+    const setBotText = (update) =>
+      setMessages((prev) => {
+        const others = prev.filter((msg) => msg.id !== botId);
+        const current = prev.find((msg) => msg.id === botId);
+        const text = update(current ? current.text : "");
+        return [...others, { text, sender: "bot", id: botId }];
       });
 
-      const answer =
-        response.data.answer !== undefined
-          ? response.data.answer
-          : response.data.response || JSON.stringify(response.data);
-
-      const botMessage = { 
-        text: answer, 
-        sender: "bot", 
-        id: Date.now() + 1
-      };
-      setMessages((prev) => [...prev, botMessage]);
-    } catch (error) {
+    source.addEventListener("token", (e) => {
+      setIsLoading(false);
+      const token = JSON.parse(e.data);
+      setBotText((text) => text + token);
+    });
+
+    source.addEventListener("response", (e) => {
+      const answer = JSON.parse(e.data);
+      setBotText(() => (typeof answer === "string" ? answer : JSON.stringify(answer)));
+    });
+
+    source.addEventListener("done", () => {
+      source.close();
+      setIsLoading(false);
+    });
+
+    // Fires both for connection failures and for the server's own "error" event.
+    source.onerror = (e) => {
+      source.close();
       setMessages((prev) => [
-        ...prev,
+        ...prev.filter((msg) => msg.id !== botId),
         { 
-          text: "Sorry, I couldn't connect to the server. Please try again.", 
+          text: e.data
+            ? JSON.parse(e.data)
+            : "Sorry, I couldn't connect to the server. Please try again.", 
           sender: "bot", 
-          id: Date.now() + 1,
+          id: botId,
           isError: true 
         },
       ]);
-    } finally {
       setIsLoading(false);
-    }
+    };
   };
 
   return (
@@ -10,6 +10,12 @@ export const processQuery = async (user_input) => {
   return res.data.response;
 };
 
+// Agent query streamed as Server-Sent Events
+export const streamQuery = (user_input, use_summarization = false) =>
+  new EventSource(
+    `${API.defaults.baseURL}/process/stream?${new URLSearchParams({ user_input, use_summarization })}`
+  );
+
 // Add document
 export const addDocument = async (doc) => {
   const res = await API.post("/add_document", doc);
@@ -0,0 +1,82 @@
+import logging
+import threading
+from typing import Dict, Optional
+
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+
+from agent import Agent
+from config import ASYNC_MODE
+from services.intent_classifier import IntentClassifier
+from services.es_client import ensure_index
+from services.llm_gateway import LLMGateway, llm_gateway
+from services.vector_store import LocalVectorStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AgentRegistry:
+    """Process-wide holder of pre-compiled agents, one per ``use_summarization`` variant.
+
+    All agents share the same Elasticsearch clients and LLM gateway, which defaults
+    to the process-wide one. The index check runs once per build, and ``rebuild``
+    swaps in a fresh set of agents without a restart. With a
+    ``vector_store`` the agents retrieve from it and Elasticsearch is never touched.
+    """
+
+    def __init__(self, es: Elasticsearch, index_name: str, llm_model: str,
+                 async_es: Optional[AsyncElasticsearch] = None, async_mode: bool = ASYNC_MODE,
+                 llm: Optional[LLMGateway] = None, vector_store: Optional[LocalVectorStore] = None):
+        self.es = es
+        self.vector_store = vector_store
+        self.llm = llm or llm_gateway
+        self.async_es = async_es
+        self.async_mode = async_mode and async_es is not None
+        self.index_name = index_name
+        self.llm_model = llm_model
+        self._lock = threading.Lock()
+        self._agents: Optional[Dict[bool, Agent]] = None
+
+    def _build_agents(self) -> Dict[bool, Agent]:
+        if self.vector_store is None:
+            ensure_index(self.es, self.index_name)
+        intent_classifier = IntentClassifier(self.llm.json)
+        return {
+            use_summarization: Agent(
+                es=self.es,
+                index_name=self.index_name,
+                llm_model=self.llm_model,
+                use_summarization=use_summarization,
+                llm=self.llm,
+                check_index=False,
+                async_es=self.async_es,
+                async_mode=self.async_mode,
+                intent_classifier=intent_classifier,
+                vector_store=self.vector_store,
+            )
+            for use_summarization in (False, True)
+        }
+
+    def build(self) -> None:
+        """Build the agents if they have not been built yet."""
+        if self._agents is not None:
+            return
+        with self._lock:
+            if self._agents is None:
+                self._agents = self._build_agents()
+                logger.info("Agent registry built.")
+
+    def rebuild(self) -> None:
+        """Build a fresh set of agents and swap them in atomically."""
+        agents = self._build_agents()
+        with self._lock:
+            self._agents = agents
+        logger.info("Agent registry rebuilt.")
+
+    def get(self, use_summarization: bool = False) -> Agent:
+        """Return the shared agent for the requested workflow variant."""
+        agents = self._agents
+        if agents is None:
+            self.build()
+            agents = self._agents
+        return agents[use_summarization]
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+from config import ANSWER_CACHE_MAX_SIZE, ANSWER_CACHE_SIMILARITY_THRESHOLD, ANSWER_CACHE_TTL_SECONDS
+from services.embedding_cache import query_embeddings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Intents whose responses depend only on the query and the index contents.
+CACHEABLE_INTENTS = ("answer_question", "search_document")
+
+
+class IndexGeneration:
+    """Monotonic counter bumped whenever the index contents change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def bump(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+@dataclass
+class CachedAnswer:
+    response: Any
+    similarity: float
+    generation: int
+    age_seconds: float
+
+
+class SemanticAnswerCache:
+    """Response cache matched by cosine similarity of query embeddings.
+
+    Entries remember the index generation they were produced under and are
+    never served once the generation moves on. Eviction is LRU by size plus
+    a TTL.
+    """
+
+    def __init__(self, generation: IndexGeneration, embeddings=query_embeddings,
+                 threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                 max_size: int = ANSWER_CACHE_MAX_SIZE, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        self.generation = generation
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_key = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _vector(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.encode(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _purge(self, now: float) -> None:
+        current = self.generation.value
+        stale = [
+            key for key, (_, _, _, generation, created) in self._entries.items()
+            if generation != current or now - created > self.ttl_seconds
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    def lookup(self, query: str, variant: Any = None) -> Optional[CachedAnswer]:
+        """Return the closest fresh answer for the same variant above the threshold, if any."""
+        vector = self._vector(query)
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            keys = [key for key, entry in self._entries.items() if entry[1] == variant]
+            if keys:
+                matrix = np.stack([self._entries[key][0] for key in keys])
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    _, _, response, generation, created = self._entries[key]
+                    self.hits += 1
+                    return CachedAnswer(response, float(similarities[best]), generation, now - created)
+            self.misses += 1
+        return None
+
+    def store(self, query: str, response: Any, generation: int, variant: Any = None) -> None:
+        """Cache a response produced under ``generation``; dropped if the index changed meanwhile."""
+        if generation != self.generation.value:
+            return
+        vector = self._vector(query)
+        with self._lock:
+            self._entries[self._next_key] = (vector, variant, response, generation, time.time())
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "generation": self.generation.value,
+            }
+
+
+index_generation = IndexGeneration()
+answer_cache = SemanticAnswerCache(index_generation)
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from elasticsearch import Elasticsearch, helpers
+
+from config import (PROMPT_FOR_SUMMARY, SUMMARY_CONCURRENCY, SUMMARY_PASS_BATCH_SIZE,
+                    SUMMARY_PASS_INTERVAL_SECONDS, SUMMARY_RETRY_SECONDS)
+from services.vector_store import LocalVectorStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ChunkSummarizer:
+    """Background pass that summarizes every indexed chunk once and stores the summary on the chunk.
+
+    A chunk is pending while it has no ``summary_hash``. Chunk ids embed the
+    content hash, so changed content arrives as a new, unsummarized chunk and
+    unchanged chunks keep their summary across re-ingestion. The pass wakes on
+    ``notify`` (after ingestion) and otherwise every ``interval`` seconds.
+    """
+
+    def __init__(self, es: Elasticsearch, index_name: str, llm, vector_store: Optional[LocalVectorStore] = None,
+                 batch_size: int = SUMMARY_PASS_BATCH_SIZE, concurrency: int = SUMMARY_CONCURRENCY,
+                 interval: float = SUMMARY_PASS_INTERVAL_SECONDS, retry_after: float = SUMMARY_RETRY_SECONDS):
+        self.es = es
+        self.index_name = index_name
+        self.llm = llm
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.interval = interval
+        self.retry_after = retry_after
+        # Chunks whose summarization failed, by failure time; skipped until ``retry_after`` instead of retried in a loop.
+        self._failed: Dict[str, float] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.summarized = 0
+
+    def _skipped(self) -> List[str]:
+        """Ids of chunks that failed within ``retry_after``; older failures are forgotten and retried."""
+        expired = time.monotonic() - self.retry_after
+        # Failure times only grow in insertion order, so expired entries are at the front.
+        for chunk_id, failed_at in list(self._failed.items()):
+            if failed_at > expired:
+                break
+            del self._failed[chunk_id]
+        return list(self._failed)
+
+    def _fail(self, chunk_id: str) -> None:
+        self._failed.pop(chunk_id, None)
+        self._failed[chunk_id] = time.monotonic()
+
+    def pending(self, limit: int) -> List[Dict[str, Any]]:
+        """Up to ``limit`` chunks without a stored summary, as ``_id``/``_source`` hits."""
+        skipped = self._skipped()
+        if self.vector_store is not None:
+            return self.vector_store.rows_without("summary_hash", limit, exclude=set(skipped))
+        must_not: List[Dict[str, Any]] = [{"exists": {"field": "summary_hash"}}]
+        if skipped:
+            must_not.append({"ids": {"values": skipped}})
+        body = {
+            "size": limit,
+            "_source": ["title", "content", "content_hash"],
+            "query": {"bool": {"must_not": must_not}},
+        }
+        return self.es.search(index=self.index_name, body=body)["hits"]["hits"]
+
+    def _summarize(self, hit: Dict[str, Any]) -> Optional[str]:
+        try:
+            return self.llm.invoke(PROMPT_FOR_SUMMARY.format(document=hit["_source"]["content"])).strip()
+        except Exception as e:
+            logger.error(f"Failed to summarize chunk {hit['_id']}: {e}")
+            self._fail(hit["_id"])
+            return None
+
+    def summarize_pending(self) -> int:
+        """Summarize pending chunks batch by batch until none are left; returns how many were stored."""
+        stored = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self._stop.is_set():
+                hits = self.pending(self.batch_size)
+                if not hits:
+                    break
+                actions = [
+                    {
+                        "_op_type": "update",
+                        "_index": self.index_name,
+                        "_id": hit["_id"],
+                        "doc": {"summary": summary, "summary_hash": hit["_source"].get("content_hash", "")},
+                    }
+                    for hit, summary in zip(hits, pool.map(self._summarize, hits))
+                    if summary is not None
+                ]
+                if self.vector_store is not None:
+                    results = list(self.vector_store.bulk(actions))
+                else:
+                    # Wait for the summaries to be searchable, or the next pending() would return these chunks again.
+                    results = list(helpers.streaming_bulk(self.es, actions, raise_on_error=False,
+                                                          refresh="wait_for"))
+                for (ok, info), action in zip(results, actions):
+                    if ok:
+                        stored += 1
+                    elif info.get("update", {}).get("status") != 404:
+                        # A 404 means the chunk was replaced or deleted while it was being summarized.
+                        logger.error(f"Failed to store summary for chunk {action['_id']}: {info}")
+                        self._fail(action["_id"])
+        self.summarized += stored
+        if stored:
+            logger.info(f"Stored summaries for {stored} chunks.")
+        return stored
+
+    def notify(self) -> None:
+        """Wake the background pass, e.g. after new chunks were indexed."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.summarize_pending()
+            except Exception as e:
+                logger.error(f"Chunk summary pass failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="chunk-summarizer", daemon=True)
+            self._thread.start()
+            logger.info("Chunk summarizer started.")
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": self._thread is not None, "summarized": self.summarized, "failed": len(self._failed)}
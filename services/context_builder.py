@@ -0,0 +1,140 @@
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+from config import CONTEXT_DEDUP_THRESHOLD, CONTEXT_TOKEN_BUDGET
+from services.metrics import CONTEXT_TOKENS
+from services.text_utils import OVERLAP
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+# Llama-family tokenizers average roughly four characters of English text per token.
+_CHARS_PER_TOKEN = 4
+
+
+def approximate_token_count(text: str) -> int:
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def format_block(document_id: str, title: str, content: str) -> str:
+    return f"Document ID: {document_id}\nTitle: {title}\n\nContent:\n{content}\n"
+
+
+def strip_overlap(previous: str, following: str, max_overlap: int = 2 * OVERLAP) -> str:
+    """Return ``following`` without the prefix it repeats from the end of ``previous``."""
+    for size in range(min(max_overlap, len(previous), len(following)), 0, -1):
+        if previous.endswith(following[:size]):
+            return following[size:]
+    return following
+
+
+def continuation(previous: str, following: str, max_overlap: int = 2 * OVERLAP) -> str:
+    """Text to append to ``previous`` to continue with ``following``: its unrepeated rest, or all of it after a space."""
+    remainder = strip_overlap(previous, following, max_overlap)
+    # The splitter overlaps on word boundaries, so a real overlap always leaves whitespace behind it.
+    return remainder if remainder != following and remainder[:1].isspace() else " " + following
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+@dataclass
+class _Block:
+    document_id: str
+    title: str
+    content: str
+    score: float
+    first_chunk: int
+    last_chunk: int
+
+
+class ContextBuilder:
+    """Packs retrieved chunks into a prompt context under a token budget.
+
+    Adjacent chunks of the same document are merged with their overlap removed,
+    near-duplicate blocks are dropped, and the remaining blocks are added in
+    order of relevance while they fit.
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+                 token_counter: Callable[[str], int] = approximate_token_count):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.count_tokens = token_counter
+
+    def _merge_adjacent(self, docs: List[Dict[str, Any]]) -> List[_Block]:
+        by_document: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in docs:
+            by_document.setdefault(doc.get("document_id") or doc.get("chunk_id", ""), []).append(doc)
+
+        blocks = []
+        for document_id, chunks in by_document.items():
+            chunks.sort(key=lambda chunk: chunk.get("chunk_index") if chunk.get("chunk_index") is not None else -1)
+            block = None
+            for chunk in chunks:
+                index = chunk.get("chunk_index")
+                if block is not None and index is not None and index == block.last_chunk + 1:
+                    block.content += continuation(block.content, chunk.get("content", ""))
+                    block.score = max(block.score, chunk.get("score", 0.0))
+                    block.last_chunk = index
+                    continue
+                block = _Block(document_id, chunk.get("title", ""), chunk.get("content", ""),
+                               chunk.get("score", 0.0), index if index is not None else -2,
+                               index if index is not None else -2)
+                blocks.append(block)
+        return blocks
+
+    def _drop_near_duplicates(self, blocks: List[_Block]) -> List[_Block]:
+        kept: List[Tuple[_Block, set]] = []
+        for block in sorted(blocks, key=lambda block: block.score, reverse=True):
+            shingles = _shingles(block.content)
+            # Containment rather than Jaccard, so a chunk already covered by a merged block is dropped too.
+            if any(len(shingles & other) / len(shingles) >= self.dedup_threshold for _, other in kept):
+                continue
+            kept.append((block, shingles))
+        return [block for block, _ in kept]
+
+    def build(self, docs: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+        """Return the packed context and token statistics against naive concatenation."""
+        naive = "\n---\n".join(
+            format_block(doc.get("document_id") or doc.get("chunk_id", ""), doc.get("title", ""),
+                         doc.get("content", ""))
+            for doc in docs
+        )
+        blocks = self._drop_near_duplicates(self._merge_adjacent(docs))
+
+        parts: List[str] = []
+        used = 0
+        separator_tokens = self.count_tokens("\n---\n")
+        for block in blocks:
+            text = format_block(block.document_id, block.title, block.content)
+            cost = self.count_tokens(text) + (separator_tokens if parts else 0)
+            if used + cost > self.token_budget:
+                if parts:
+                    continue
+                # Never return an empty context: trim the most relevant block to the budget.
+                text = text[:int(len(text) * self.token_budget / cost)]
+                cost = self.count_tokens(text)
+            parts.append(text)
+            used += cost
+
+        context = "\n---\n".join(parts)
+        stats = {
+            "chunks": len(docs),
+            "blocks": len(parts),
+            "naive_tokens": self.count_tokens(naive),
+            "packed_tokens": self.count_tokens(context),
+        }
+        stats["saved_tokens"] = stats["naive_tokens"] - stats["packed_tokens"]
+        CONTEXT_TOKENS.labels(kind="naive").inc(stats["naive_tokens"])
+        CONTEXT_TOKENS.labels(kind="packed").inc(stats["packed_tokens"])
+        logger.info(f"Packed {stats['chunks']} chunks into {stats['blocks']} blocks, "
+                    f"{stats['packed_tokens']} tokens ({stats['saved_tokens']} saved).")
+        return context, stats
@@ -0,0 +1,79 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from config import EMBEDDING_MICROBATCH_MAX_SIZE, EMBEDDING_MICROBATCH_WAIT_MS
+from services.embeddings import embeddings
+from services.metrics import EMBEDDING_BATCH_TEXTS, EMBEDDING_QUEUE_WAIT_SECONDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MicroBatchingEncoder:
+    """Coalesces concurrent single-text ``encode`` calls into batched model calls.
+
+    A dispatcher thread takes the first waiting text, keeps collecting for up
+    to ``max_wait_ms`` or until ``max_batch_size`` texts are queued, runs one
+    forward pass and resolves each caller's future. Lists are already batches
+    and go straight to the model.
+    """
+
+    def __init__(self, model, max_wait_ms: float = EMBEDDING_MICROBATCH_WAIT_MS,
+                 max_batch_size: int = EMBEDDING_MICROBATCH_MAX_SIZE):
+        self.model = model
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def encode(self, sentences, **kwargs):
+        if not isinstance(sentences, str):
+            return self.model.encode(sentences, **kwargs)
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((sentences, future, time.perf_counter()))
+        return future.result()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._dispatch, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self) -> List[Tuple[str, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                EMBEDDING_QUEUE_WAIT_SECONDS.observe(started - enqueued)
+            EMBEDDING_BATCH_TEXTS.observe(len(batch))
+            try:
+                vectors = self.model.encode([text for text, _, _ in batch], batch_size=len(batch))
+            except Exception as e:
+                logger.error(f"Batched query encode of {len(batch)} texts failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+
+# Shared by every query-time encode when micro-batching is enabled (EMBEDDING_MICROBATCH_WAIT_MS > 0).
+query_encoder = MicroBatchingEncoder(embeddings) if EMBEDDING_MICROBATCH_WAIT_MS > 0 else embeddings
@@ -0,0 +1,227 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from config import (CHUNK_EMBEDDING_CACHE_MAX_ENTRIES, CHUNK_EMBEDDING_CACHE_PATH, EMBEDDING_BATCH_SIZE,
+                    QUERY_EMBEDDING_CACHE_SIZE)
+from services.embedding_batcher import query_encoder
+from services.embeddings import embeddings
+from services.metrics import observe_embedding
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str, casefold: bool = False) -> str:
+    """Collapse whitespace, and casefold when the model's tokenizer is uncased anyway."""
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.casefold() if casefold else text
+
+
+def content_hash(text: str, model_name: str = embeddings.name) -> str:
+    """Stable key for a chunk's embedding under a given model."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """In-process LRU of query vectors keyed by model name and normalized query text.
+
+    Queries differing only in case share an entry when ``backend`` reports an
+    uncased tokenizer.
+    """
+
+    def __init__(self, model, model_name: str = embeddings.name, max_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+                 backend=embeddings):
+        self.model = model
+        self.model_name = model_name
+        self.backend = backend
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, text: str) -> tuple:
+        return self.model_name, normalize_query(text, casefold=self.backend.lowercases_input)
+
+    def encode(self, text: str) -> np.ndarray:
+        """Return the query vector, encoding it only on a cache miss."""
+        key = self._key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        start = time.perf_counter()
+        vector = self.model.encode(text)
+        observe_embedding("query", 1, time.perf_counter() - start)
+
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return vector
+
+    def encode_many(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[np.ndarray]:
+        """Return one vector per query; all cache misses are encoded in a single model call."""
+        keys = [self._key(text) for text in texts]
+        found: Dict[tuple, np.ndarray] = {}
+        missing: Dict[tuple, str] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                    self.hits += 1
+                elif key not in missing:
+                    missing[key] = text
+                    self.misses += 1
+
+        if missing:
+            start = time.perf_counter()
+            vectors = self.model.encode(list(missing.values()), batch_size=batch_size)
+            observe_embedding("query", len(missing), time.perf_counter() - start)
+            with self._lock:
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector
+                    self._entries[key] = vector
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return [found[key] for key in keys]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class ChunkEmbeddingStore:
+    """Persistent SQLite store of chunk vectors keyed by a content hash.
+
+    Chunks whose text was embedded before (re-uploads, shared boilerplate) are
+    served from disk and skip the model. The least recently used entries are
+    evicted once the store grows past ``max_entries``.
+    """
+
+    def __init__(self, model, path: str = CHUNK_EMBEDDING_CACHE_PATH, model_name: str = embeddings.name,
+                 max_entries: int = CHUNK_EMBEDDING_CACHE_MAX_ENTRIES):
+        self.model = model
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        # Row count, kept up to date on insert and evict instead of counted per batch.
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON chunk_embeddings (last_used)")
+            (self._size,) = self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()
+        return self._conn
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        conn = self._connection()
+        # SQLite limits the number of bound parameters per statement.
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM chunk_embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        overflow = self._size - self.max_entries
+        if overflow > 0:
+            deleted = conn.execute(
+                "DELETE FROM chunk_embeddings WHERE key IN "
+                "(SELECT key FROM chunk_embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            ).rowcount
+            self._size -= deleted
+            self.evictions += deleted
+
+    def encode_many(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[np.ndarray]:
+        """Return one vector per text, encoding only the texts not already in the store."""
+        keys = [content_hash(text, self.model_name) for text in texts]
+        with self._lock:
+            found = self._lookup(list(set(keys)))
+            missing = {key: text for key, text in zip(keys, texts) if key not in found}
+            # Counted per requested text, so a text repeated within the batch counts every time.
+            missed = sum(1 for key in keys if key in missing)
+            self.hits += len(keys) - missed
+            self.misses += missed
+        if missing:
+            start = time.perf_counter()
+            vectors = self.model.encode(list(missing.values()), batch_size=batch_size)
+            observe_embedding("chunk", len(missing), time.perf_counter() - start)
+            for key, vector in zip(missing, vectors):
+                found[key] = np.asarray(vector, dtype=np.float32)
+
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                unique = set(keys)
+                # Rows another batch stored meanwhile are left alone, so the row count only grows by real inserts.
+                inserted = conn.executemany(
+                    "INSERT INTO chunk_embeddings (key, vector, last_used) VALUES (?, ?, ?) ON CONFLICT(key) DO NOTHING",
+                    [(key, found[key].tobytes(), now) for key in unique],
+                ).rowcount
+                self._size += inserted
+                conn.executemany("UPDATE chunk_embeddings SET last_used = ? WHERE key = ?",
+                                 [(now, key) for key in unique if key not in missing])
+                self._evict(conn)
+        return [found[key] for key in keys]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._connection()
+            return {
+                "size": self._size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+query_embeddings = QueryEmbeddingCache(query_encoder)
+chunk_embeddings = ChunkEmbeddingStore(embeddings)
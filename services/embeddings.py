@@ -0,0 +1,112 @@
+import logging
+import threading
+from typing import Optional
+
+from config import (EMBEDDING_DEVICE, EMBEDDING_MAX_SEQ_LENGTH, EMBEDDING_MODE, EMBEDDING_NUM_THREADS,
+                    EMBEDDINGS_MODEL)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODES = ("torch", "onnx", "int8")
+
+
+def resolve_device(device: str = "auto") -> str:
+    """Pick cuda, then mps, then cpu when ``device`` is "auto"."""
+    if device != "auto":
+        return device
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+class EmbeddingBackend:
+    """Lazily loaded SentenceTransformer.
+
+    The model is loaded on the first ``encode`` (or an explicit ``warm_up``) rather
+    than at import time. ``mode`` selects plain torch inference, an ONNX Runtime
+    session, or int8 dynamic quantization of the linear layers; the last two run
+    on CPU only.
+    """
+
+    def __init__(self, model_name: str = EMBEDDINGS_MODEL, device: str = EMBEDDING_DEVICE,
+                 mode: str = EMBEDDING_MODE, num_threads: int = EMBEDDING_NUM_THREADS,
+                 max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH):
+        if mode not in EMBEDDING_MODES:
+            raise ValueError(f"Unknown embedding mode {mode!r}, expected one of {EMBEDDING_MODES}")
+        self.model_name = model_name
+        self.device = device
+        self.mode = mode
+        self.num_threads = num_threads
+        self.max_seq_length = max_seq_length
+        self._model = None
+        self._lowercases_input: Optional[bool] = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        """Identifies the vectors this backend produces; quantized modes yield slightly different vectors."""
+        return self.model_name if self.mode == "torch" else f"{self.model_name}@{self.mode}"
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        device = resolve_device(self.device) if self.mode == "torch" else "cpu"
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+        logger.info(f"Loading embedding model {self.model_name} on {device} ({self.mode}).")
+
+        if self.mode == "onnx":
+            model_kwargs = {"provider": "CPUExecutionProvider"}
+            if self.num_threads > 0:
+                import onnxruntime
+
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = self.num_threads
+                model_kwargs["session_options"] = session_options
+            model = SentenceTransformer(self.model_name, device=device, backend="onnx", model_kwargs=model_kwargs)
+        else:
+            model = SentenceTransformer(self.model_name, device=device)
+            if self.mode == "int8":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        if self.max_seq_length > 0:
+            model.max_seq_length = self.max_seq_length
+        return model
+
+    @property
+    def lowercases_input(self) -> bool:
+        """Whether the tokenizer ignores case, so casefolding a query cannot change its vector."""
+        if self._lowercases_input is None:
+            tokenizer = getattr(self.model, "tokenizer", None)
+            probe = "Case Probe"
+            self._lowercases_input = tokenizer is not None and (
+                tokenizer(probe)["input_ids"] == tokenizer(probe.lower())["input_ids"]
+            )
+        return self._lowercases_input
+
+    def warm_up(self) -> None:
+        """Load the model and run one encode so the first request does not pay for it."""
+        self.encode("warm up")
+
+    def encode(self, sentences, **kwargs):
+        return self.model.encode(sentences, **kwargs)
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        return self.model.get_sentence_embedding_dimension()
+
+
+embeddings = EmbeddingBackend()
@@ -1,4 +1,39 @@
-from elasticsearch import Elasticsearch
-from config import ELASTICSEARCH_URL
+from typing import Any, Dict
+
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+from config import ELASTICSEARCH_URL, INDEX_MAPPING
+from services.embeddings import embeddings
 
 es = Elasticsearch(ELASTICSEARCH_URL)
+async_es = AsyncElasticsearch(ELASTICSEARCH_URL)
+
+
+def index_mappings() -> Dict[str, Any]:
+    """The chunk mapping, with the vector dimension taken from the configured embedding model."""
+    mappings = {"properties": dict(INDEX_MAPPING["properties"])}
+    mappings["properties"]["embedding"] = {
+        **INDEX_MAPPING["properties"]["embedding"],
+        "dims": embeddings.get_sentence_embedding_dimension(),
+    }
+    return mappings
+
+
+def versioned_index_name(alias: str, version: int) -> str:
+    return f"{alias}-v{version}"
+
+
+def create_versioned_index(client: Elasticsearch, alias: str, version: int, attach_alias: bool = False) -> str:
+    """Create ``<alias>-v<version>`` with the chunk mapping, optionally pointing ``alias`` at it."""
+    name = versioned_index_name(alias, version)
+    client.indices.create(index=name, mappings=index_mappings(), **({"aliases": {alias: {}}} if attach_alias else {}))
+    return name
+
+
+def ensure_index(client: Elasticsearch, index_name: str) -> None:
+    """Create the first versioned index behind the ``index_name`` alias if neither exists yet.
+
+    Indexes created before aliases were introduced keep working as a concrete
+    ``index_name`` until the first reindex swaps in an alias.
+    """
+    if not client.indices.exists(index=index_name):
+        create_versioned_index(client, index_name, 1, attach_alias=True)
@@ -0,0 +1,342 @@
+import hashlib
+import logging
+import queue
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from elasticsearch import helpers
+
+from config import BULK_CHUNK_SIZE, BULK_THREAD_COUNT, EMBEDDING_BATCH_SIZE, INDEX_NAME
+from models import DocumentRequest
+from services.answer_cache import index_generation
+from services.embedding_cache import chunk_embeddings
+from services.es_client import es
+from services.text_utils import chunk_text, iter_chunks, normalize_text
+from services.vector_store import local_store
+from services.write_gate import index_writes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+EXISTING_CHUNKS_PAGE_SIZE = 1000
+EXISTING_CHUNKS_PIT_KEEP_ALIVE = "1m"
+# Chunk ids of one document are kept in memory up to this size, then spill to disk.
+CHUNK_ID_SPOOL_BYTES = 1 << 20
+
+
+@dataclass
+class StreamedDocument:
+    """A document whose content arrives as text pieces and is chunked while it is read.
+
+    Its chunks match those of the same text sent whole, apart from the cases noted in ``iter_chunks``.
+    """
+    doc_id: str
+    title: str
+    pieces: Iterable[str]
+
+
+def document_chunks(document: Union[DocumentRequest, StreamedDocument]) -> Iterable[str]:
+    if isinstance(document, StreamedDocument):
+        return iter_chunks(document.pieces)
+    return chunk_text(normalize_text(document.content))
+
+
+def chunk_content_hash(title: str, content: str) -> str:
+    return hashlib.sha256(f"{title}\0{content}".encode("utf-8")).hexdigest()[:16]
+
+
+def make_chunk_id(doc_id: str, position: int, content_hash: str) -> str:
+    """Deterministic chunk id, so re-ingesting identical content overwrites instead of duplicating."""
+    return f"{doc_id}:{position}:{content_hash}"
+
+
+def iter_chunk_hits(client: Any, index_name: str, doc_id: str, source: Any = False,
+                    pit_id: Optional[str] = None, keep_alive: str = EXISTING_CHUNKS_PIT_KEEP_ALIVE) -> Iterator[dict]:
+    """Yield the document's chunk hits in ``chunk_index`` order.
+
+    ``chunk_index`` is not unique (stale and new chunks can share a position),
+    so pages run under a point in time with ``_shard_doc`` as tiebreaker. A
+    document that fits in one page is read without opening one. Pass
+    ``pit_id`` to read from an existing point in time instead.
+    """
+    query = {"term": {"document_id": doc_id}}
+    owned = pit_id is None
+    if owned:
+        hits = client.search(index=index_name, body={"size": EXISTING_CHUNKS_PAGE_SIZE, "_source": source,
+                                                     "query": query, "sort": [{"chunk_index": "asc"}]})["hits"]["hits"]
+        if len(hits) < EXISTING_CHUNKS_PAGE_SIZE:
+            yield from hits
+            return
+        pit_id = client.open_point_in_time(index=index_name, keep_alive=keep_alive)["id"]
+    try:
+        search_after = None
+        while True:
+            body = {
+                "size": EXISTING_CHUNKS_PAGE_SIZE,
+                "_source": source,
+                "query": query,
+                "sort": [{"chunk_index": "asc"}, {"_shard_doc": "asc"}],
+                "pit": {"id": pit_id, "keep_alive": keep_alive},
+            }
+            if search_after is not None:
+                body["search_after"] = search_after
+            response = client.search(body=body)
+            if owned:
+                pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            yield from hits
+            if len(hits) < EXISTING_CHUNKS_PAGE_SIZE:
+                return
+            search_after = hits[-1]["sort"]
+    finally:
+        if owned:
+            client.close_point_in_time(id=pit_id)
+
+
+def existing_chunks(doc_id: str, index_name: str = INDEX_NAME) -> Iterator[Tuple[Optional[int], str]]:
+    """``(chunk_index, _id)`` of every chunk stored for the document, in chunk_index order."""
+    if local_store is not None:
+        yield from local_store.chunk_positions(doc_id)
+        return
+    for hit in iter_chunk_hits(es, index_name, doc_id, ["chunk_index"]):
+        yield hit["_source"].get("chunk_index"), hit["_id"]
+
+
+def _spooled(spool: IO[str]) -> Iterator[Tuple[int, str]]:
+    spool.seek(0)
+    for line in spool:
+        position, chunk_id = line.rstrip("\n").split("\t", 1)
+        yield int(position), chunk_id
+
+
+def _roll_back(doc_id: str, indexed_at: int, index_name: str) -> int:
+    """Delete the chunks a failed run wrote for a document, leaving its previous version as it was."""
+    if local_store is not None:
+        return local_store.delete_document(doc_id, indexed_at=indexed_at)
+    # delete_by_query only sees searchable chunks.
+    es.indices.refresh(index=index_name)
+    query = {"bool": {"filter": [{"term": {"document_id": doc_id}}, {"term": {"indexed_at": indexed_at}}]}}
+    return es.delete_by_query(index=index_name, body={"query": query}, refresh=True)["deleted"]
+
+
+def _chunk_documents(documents: List[Union[DocumentRequest, StreamedDocument]], index_name: str, out: queue.Queue,
+                     errors: Dict[str, str], counts: Dict[str, Dict[str, int]], rollbacks: Dict[str, int],
+                     stop: threading.Event, carry_over: Dict[str, Dict[str, Any]]) -> None:
+    """Producer: chunk every document, diff it against the stored chunks and push write/delete records.
+
+    Unchanged chunks are skipped entirely: no embedding and no write. The
+    stored chunks are merged with the new ones in chunk_index order and
+    chunk ids are spooled to temporary files, so memory does not grow with
+    the document. The queue is bounded, so a streamed document is only read
+    as fast as its chunks are embedded and written. Stale chunks are deleted
+    only once the whole document was read; if reading fails part-way, the
+    document is recorded in ``rollbacks`` with the ``indexed_at`` of the
+    chunks already written. A run that only deletes chunks stamps one kept
+    chunk with its ``indexed_at``, so a rebuild catching up on ``indexed_at``
+    sees the change. Stops early once ``stop`` is set.
+    """
+    try:
+        for document in documents:
+            if stop.is_set():
+                return
+            indexed_at = int(time.time() * 1000)
+            written = False
+            kept = None
+            with tempfile.SpooledTemporaryFile(max_size=CHUNK_ID_SPOOL_BYTES, mode="w+") as stored, \
+                    tempfile.SpooledTemporaryFile(max_size=CHUNK_ID_SPOOL_BYTES, mode="w+") as stale:
+                try:
+                    for position, chunk_id in existing_chunks(document.doc_id, index_name):
+                        if position is None:
+                            stale.write(f"{chunk_id}\n")
+                        else:
+                            stored.write(f"{position}\t{chunk_id}\n")
+                    previous = _spooled(stored)
+                    pending = next(previous, None)
+                    for chunk_index, chunk in enumerate(document_chunks(document)):
+                        if stop.is_set():
+                            return
+                        content_hash = chunk_content_hash(document.title, chunk)
+                        chunk_id = make_chunk_id(document.doc_id, chunk_index, content_hash)
+                        unchanged = False
+                        while pending is not None and pending[0] <= chunk_index:
+                            if pending[1] == chunk_id:
+                                unchanged = True
+                            else:
+                                stale.write(f"{pending[1]}\n")
+                            pending = next(previous, None)
+                        if unchanged:
+                            counts[document.doc_id]["unchanged"] += 1
+                            kept = chunk_id
+                            continue
+                        out.put(("index", document.doc_id, chunk_id,
+                                 {"title": document.title, "content": chunk, "document_id": document.doc_id,
+                                  "chunk_index": chunk_index, "content_hash": content_hash,
+                                  "indexed_at": indexed_at, **carry_over.get(content_hash, {})}))
+                        written = True
+                    while pending is not None:
+                        stale.write(f"{pending[1]}\n")
+                        pending = next(previous, None)
+                except Exception as e:
+                    # Stale chunks are kept: a partially read document must not lose the rest of its old version.
+                    logger.error(f"Failed to prepare document {document.doc_id}: {e}")
+                    errors[document.doc_id] = f"Failed to prepare document: {e}"
+                    if written:
+                        rollbacks[document.doc_id] = indexed_at
+                    continue
+                stale.seek(0)
+                deleted = False
+                for line in stale:
+                    out.put(("delete", document.doc_id, line.rstrip("\n"), None))
+                    deleted = True
+                if deleted and not written and kept is not None:
+                    out.put(("touch", document.doc_id, kept, {"indexed_at": indexed_at}))
+    finally:
+        out.put(_DONE)
+
+
+def _embedded_batches(records: queue.Queue) -> Iterator[List[Tuple[str, str, str, Optional[dict]]]]:
+    """Group write records across documents into batches and encode each batch in one call.
+
+    Delete and touch records pass through untouched. Chunks already present in the
+    content-hash store skip the model.
+    """
+    batch = []
+    while True:
+        record = records.get()
+        if record is not _DONE:
+            batch.append(record)
+        if batch and (len(batch) >= EMBEDDING_BATCH_SIZE or record is _DONE):
+            writes = [source for op, _, _, source in batch if op == "index"]
+            vectors = iter(chunk_embeddings.encode_many([source["content"] for source in writes]) if writes else [])
+            for op, _, _, source in batch:
+                if op == "index":
+                    source["embedding"] = next(vectors).tolist()
+            yield batch
+            batch = []
+        if record is _DONE:
+            return
+
+
+def ingest_documents(documents: List[Union[DocumentRequest, StreamedDocument]], index_name: str = INDEX_NAME,
+                     progress: Optional[Callable[[str], None]] = None,
+                     carry_over: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Chunk, embed and bulk-index many documents in a single pipeline.
+
+    Chunking runs in a producer thread, embedding is batched across document
+    boundaries, and bulk requests are sent from a thread pool while the next
+    batch is being encoded. Chunk ids are deterministic, so re-ingesting a
+    document only writes changed chunks and deletes stale ones, in the same
+    bulk stream. A doc_id given more than once is ingested once, from its
+    last occurrence. ``progress`` is called with the document id of every
+    chunk written. ``carry_over`` maps a chunk content hash to extra fields
+    stored with that chunk, e.g. summaries kept by a rebuild. Writes to the
+    serving ``INDEX_NAME`` hold the shared write gate and invalidate cached
+    answers. Returns per-document results and throughput.
+    """
+    with index_writes.shared() if index_name == INDEX_NAME else nullcontext():
+        return _ingest_documents(documents, index_name, progress, carry_over or {})
+
+
+def _ingest_documents(documents: List[Union[DocumentRequest, StreamedDocument]], index_name: str,
+                      progress: Optional[Callable[[str], None]], carry_over: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    # Diffing two versions of one document in the same run would orphan the chunks of the first.
+    unique = list({document.doc_id: document for document in documents}.values())
+    if len(unique) < len(documents):
+        logger.info(f"Ingesting {len(unique)} of {len(documents)} documents; duplicate doc_ids keep the last one.")
+        documents = unique
+    errors: Dict[str, str] = {}
+    rollbacks: Dict[str, int] = {}
+    counts = {document.doc_id: {"indexed": 0, "unchanged": 0, "deleted": 0} for document in documents}
+    pending: deque = deque()
+
+    records: queue.Queue = queue.Queue(maxsize=EMBEDDING_BATCH_SIZE * 4)
+    stop = threading.Event()
+    producer = threading.Thread(target=_chunk_documents,
+                                args=(documents, index_name, records, errors, counts, rollbacks, stop, carry_over),
+                                daemon=True)
+    producer.start()
+
+    def actions() -> Iterator[Dict[str, Any]]:
+        for batch in _embedded_batches(records):
+            for op, doc_id, chunk_id, source in batch:
+                pending.append((op, doc_id))
+                if op == "delete":
+                    yield {"_op_type": "delete", "_index": index_name, "_id": chunk_id}
+                elif op == "touch":
+                    yield {"_op_type": "update", "_index": index_name, "_id": chunk_id, "doc": source}
+                else:
+                    yield {"_op_type": "index", "_index": index_name, "_id": chunk_id, "_source": source}
+
+    try:
+        if local_store is not None:
+            bulk_results = local_store.bulk(actions(), batch_size=BULK_CHUNK_SIZE)
+        else:
+            bulk_results = helpers.parallel_bulk(
+                es,
+                actions(),
+                thread_count=BULK_THREAD_COUNT,
+                chunk_size=BULK_CHUNK_SIZE,
+                raise_on_error=False,
+                raise_on_exception=False,
+            )
+        for ok, info in bulk_results:
+            op, doc_id = pending.popleft()
+            if ok:
+                if op != "touch":
+                    counts[doc_id]["indexed" if op == "index" else "deleted"] += 1
+                if progress is not None and op == "index":
+                    progress(doc_id)
+            elif op == "delete" and info.get("delete", {}).get("status") == 404:
+                # Already gone; the end state is what we wanted.
+                counts[doc_id]["deleted"] += 1
+            else:
+                logger.error(f"Failed to {op} chunk of document {doc_id}: {info}")
+                errors.setdefault(doc_id, f"Failed to {op} chunk: {info}")
+        for doc_id, indexed_at in rollbacks.items():
+            rolled_back = _roll_back(doc_id, indexed_at, index_name)
+            counts[doc_id]["indexed"] -= rolled_back
+            logger.info(f"Rolled back {rolled_back} chunks written for document {doc_id} before it failed.")
+    finally:
+        # If the consumer failed, the producer may be blocked on a full queue: stop it and drain until it exits.
+        stop.set()
+        while producer.is_alive():
+            try:
+                records.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        producer.join()
+    total_chunks = sum(count["indexed"] for count in counts.values())
+    if total_chunks or any(count["deleted"] for count in counts.values()):
+        if local_store is None:
+            # Make the writes searchable first, or a request racing the bump would cache an answer without them.
+            es.indices.refresh(index=index_name)
+        if index_name == INDEX_NAME:
+            # Other targets (a rebuild in progress) serve no answers; the rebuild bumps once at its alias switch.
+            index_generation.bump()
+
+    elapsed = time.perf_counter() - start
+    results = [
+        {
+            "doc_id": document.doc_id,
+            "status": "error" if document.doc_id in errors else "success",
+            "chunks_indexed": counts[document.doc_id]["indexed"],
+            "chunks_unchanged": counts[document.doc_id]["unchanged"],
+            "chunks_deleted": counts[document.doc_id]["deleted"],
+            **({"message": errors[document.doc_id]} if document.doc_id in errors else {}),
+        }
+        for document in documents
+    ]
+    logger.info(f"Indexed {total_chunks} chunks from {len(documents)} documents in {elapsed:.2f}s.")
+    return {
+        "results": results,
+        "chunks_indexed": total_chunks,
+        "elapsed_seconds": round(elapsed, 3),
+        "chunks_per_second": round(total_chunks / elapsed, 2) if elapsed > 0 else 0.0,
+    }
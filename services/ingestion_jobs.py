@@ -0,0 +1,200 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from config import INGEST_JOB_HISTORY, INGEST_MAX_DOCUMENTS_PER_RUN, INGEST_QUEUE_MAX_JOBS, INGEST_WORKERS
+from models import DocumentRequest
+from services.ingestion import ingest_documents
+from services.metrics import INGEST_QUEUE_DEPTH, INGEST_RUN_DOCUMENTS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    documents: Optional[List[DocumentRequest]]
+    total_documents: int
+    submitted_at: float
+    status: str = "queued"  # queued, running, completed or failed
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    chunks_indexed: int = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total_documents": self.total_documents,
+            "documents_done": len(self.results),
+            "chunks_indexed": self.chunks_indexed,
+            "queued_seconds": round((self.started_at or end) - self.submitted_at, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(self.chunks_indexed / elapsed, 2) if elapsed > 0 else 0.0,
+            "errors": [result for result in self.results if result["status"] != "success"],
+            **({"error": self.error} if self.error else {}),
+        }
+
+
+class IngestionJobQueue:
+    """Bounded queue of ingestion jobs processed by a small worker pool.
+
+    Each worker takes as many queued jobs as fit in ``max_documents_per_run``
+    and ingests them in one pipeline run, so chunks from several small uploads
+    fill the same embedding batches. Jobs touching a document that is already
+    being ingested wait for the next run, keeping per-document re-indexing
+    consistent. ``submit`` raises ``queue.Full`` once ``max_jobs`` are waiting.
+    """
+
+    def __init__(self, ingest: Callable[..., Dict[str, Any]] = ingest_documents, workers: int = INGEST_WORKERS,
+                 max_jobs: int = INGEST_QUEUE_MAX_JOBS, max_documents_per_run: int = INGEST_MAX_DOCUMENTS_PER_RUN,
+                 history: int = INGEST_JOB_HISTORY, on_complete: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.ingest = ingest
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.max_documents_per_run = max_documents_per_run
+        self.history = history
+        self.on_complete = on_complete
+        self._pending: deque = deque()
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._active_doc_ids: Set[str] = set()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def submit(self, documents: List[DocumentRequest]) -> IngestionJob:
+        self.start()
+        with self._cond:
+            if len(self._pending) >= self.max_jobs:
+                raise queue.Full(f"Ingestion queue is full ({self.max_jobs} jobs waiting)")
+            job = IngestionJob(id=uuid.uuid4().hex, documents=list(documents), total_documents=len(documents),
+                               submitted_at=time.time())
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            self._trim_history()
+            INGEST_QUEUE_DEPTH.set(len(self._pending))
+            self._cond.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def _trim_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set()]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def _next_run(self) -> List[IngestionJob]:
+        """Take the next coalesced run of jobs, blocking until one is eligible."""
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return []
+                run, documents, blocked = [], 0, set(self._active_doc_ids)
+                for job in list(self._pending):
+                    doc_ids = {document.doc_id for document in job.documents}
+                    fits = not run or documents + len(job.documents) <= self.max_documents_per_run
+                    if fits and not doc_ids & blocked:
+                        run.append(job)
+                        documents += len(job.documents)
+                        self._pending.remove(job)
+                    # Later jobs for the same documents must not overtake this one.
+                    blocked |= doc_ids
+                if run:
+                    for job in run:
+                        self._active_doc_ids.update(document.doc_id for document in job.documents)
+                    INGEST_QUEUE_DEPTH.set(len(self._pending))
+                    return run
+                self._cond.wait()
+
+    def _process(self, run: List[IngestionJob]) -> None:
+        started = time.time()
+        job_by_doc_id = {}
+        documents = []
+        for job in run:
+            job.status, job.started_at = "running", started
+            documents.extend(job.documents)
+            job_by_doc_id.update((document.doc_id, job) for document in job.documents)
+        INGEST_RUN_DOCUMENTS.observe(len(documents))
+
+        def progress(doc_id: str) -> None:
+            job_by_doc_id[doc_id].chunks_indexed += 1
+
+        try:
+            report = self.ingest(documents, progress=progress)
+        except Exception as e:
+            logger.error(f"Ingestion run of {len(run)} jobs failed: {e}")
+            report = None
+            for job in run:
+                job.status, job.error = "failed", str(e)
+        else:
+            for result in report["results"]:
+                job_by_doc_id[result["doc_id"]].results.append(result)
+            for job in run:
+                job.status = "completed"
+                job.chunks_indexed = sum(result["chunks_indexed"] for result in job.results)
+        finally:
+            with self._cond:
+                for job in run:
+                    job.finished_at = time.time()
+                    job.documents = None
+                    self._active_doc_ids.difference_update(job_by_doc_id.keys())
+                    job.done.set()
+                self._cond.notify_all()
+        logger.info(f"Ingestion run: {len(run)} jobs, {len(documents)} documents in {time.time() - started:.2f}s.")
+        if report is not None and self.on_complete is not None:
+            self.on_complete(report)
+
+    def _worker(self) -> None:
+        while True:
+            run = self._next_run()
+            if not run:
+                return
+            try:
+                self._process(run)
+            except Exception as e:
+                logger.error(f"Ingestion worker error: {e}")
+
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"ingestion-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self) -> None:
+        """Stop the workers after their current run; queued jobs stay queued."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "workers": len(self._threads),
+                "queued_jobs": len(self._pending),
+                "max_jobs": self.max_jobs,
+                "running_jobs": statuses.count("running"),
+                "completed_jobs": statuses.count("completed"),
+                "failed_jobs": statuses.count("failed"),
+            }
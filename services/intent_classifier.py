@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+import config
+from services.embedding_cache import query_embeddings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INTENTS = ("remove_document", "search_document", "answer_question")
+
+# Labelled example utterances the fast path compares incoming queries against.
+INTENT_PROTOTYPES = {
+    "search_document": [
+        "Find me documents about neural networks",
+        "Search for documents on climate policy",
+        "List all documents",
+        "Show me the documents related to onboarding",
+        "Retrieve files about the quarterly report",
+        "Which documents mention kubernetes?",
+        "Look up documents on data privacy",
+        "Get me the docs about the API",
+    ],
+    "answer_question": [
+        "What's the difference between supervised and unsupervised learning?",
+        "How does the authentication flow work?",
+        "Explain how vacation days are calculated",
+        "Why did revenue drop last quarter?",
+        "What is the refund policy?",
+        "Summarize the main findings of the report",
+        "Can you tell me who approves purchase orders?",
+        "When is the deadline for submitting expenses?",
+    ],
+    # Never returned by the prototype tier; they keep removal-like queries from matching the other intents.
+    "remove_document": [
+        "Remove document DOC123",
+        "Delete the document with id 42",
+        "Please delete file A456 from the index",
+        "Erase document doc-001",
+        "Drop the document #A456",
+    ],
+}
+
+# "remove | doc_id", the shorthand documented on /process.
+_REMOVE_PIPE_RE = re.compile(r"^\s*(?:remove|delete)\s*\|\s*(?P<doc_id>\S+)\s*$", re.IGNORECASE)
+# Identifier-looking tokens: at least one digit, optionally prefixed with '#'.
+_DOC_ID_PATTERN = r"#?(?=[\w-]*\d)[A-Za-z0-9][\w-]*"
+# "delete the document with id DOC123", "remove doc-001 please", ...
+_REMOVE_SENTENCE_RE = re.compile(
+    r"^\s*(?:please\s+)?(?:remove|delete|erase|drop)\s+(?:the\s+)?(?:document|doc|file)?\s*"
+    r"(?:with\s+)?(?:id\s*)?:?\s*(?P<doc_id>" + _DOC_ID_PATTERN + r")\s*(?:please)?\s*[.!]?\s*$",
+    re.IGNORECASE,
+)
+
+
+def parse_intent_response(response: str) -> Dict[str, Any]:
+    """Turn the LLM's JSON output into state updates, falling back to answer_question."""
+    try:
+        extracted_info = json.loads(response)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON from LLM response: {e}")
+        logger.error(f"Raw response: {response}")
+        return {"intent": "answer_question"}
+
+    intent = extracted_info.get("intent", "answer_question")
+    if intent not in INTENTS:
+        logger.warning(f"LLM returned unknown intent {intent!r}, falling back to answer_question")
+        intent = "answer_question"
+    logger.info(f"Extracted intent: {intent}")
+    logger.info(f"Extracted doc_id: {extracted_info.get('doc_id', '')}")
+    return {
+        "intent": intent,
+        "doc_id": extracted_info.get("doc_id", ""),
+        "new_title": extracted_info.get("title", ""),
+        "new_content": extracted_info.get("content", ""),
+        "extracted_info": extracted_info,
+    }
+
+
+class IntentClassifier:
+    """Tiered intent classifier.
+
+    1. ``rule``: regexes for unambiguous removal requests, with doc_id extraction.
+    2. ``prototype``: cosine similarity against embedded example utterances; never ``remove_document``.
+    3. ``llm``: a JSON-constrained LLM call for everything the first two tiers are unsure about.
+    """
+
+    def __init__(self, llm, embeddings=query_embeddings,
+                 min_similarity: float = config.INTENT_PROTOTYPE_MIN_SIMILARITY,
+                 min_margin: float = config.INTENT_PROTOTYPE_MIN_MARGIN):
+        self.llm = llm
+        self.embeddings = embeddings
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self._prototypes: Optional[Tuple[np.ndarray, list]] = None
+        self._lock = threading.Lock()
+        # Separate from ``_lock``, so a rule-tier hit never waits for the prototypes to be encoded.
+        self._counts_lock = threading.Lock()
+        self.tier_counts = {"rule": 0, "prototype": 0, "llm": 0}
+
+    def _prototype_matrix(self) -> Tuple[np.ndarray, list]:
+        if self._prototypes is None:
+            with self._lock:
+                if self._prototypes is None:
+                    labels = [intent for intent, examples in INTENT_PROTOTYPES.items() for _ in examples]
+                    examples = [example for examples in INTENT_PROTOTYPES.values() for example in examples]
+                    matrix = np.asarray(self.embeddings.model.encode(examples), dtype=np.float32)
+                    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+                    self._prototypes = (matrix, labels)
+        return self._prototypes
+
+    def _by_rule(self, user_input: str) -> Optional[Dict[str, Any]]:
+        match = _REMOVE_PIPE_RE.match(user_input) or _REMOVE_SENTENCE_RE.match(user_input)
+        if match:
+            return {"intent": "remove_document", "doc_id": match.group("doc_id")}
+        return None
+
+    def _by_prototype(self, user_input: str) -> Optional[Dict[str, Any]]:
+        matrix, labels = self._prototype_matrix()
+        vector = np.asarray(self.embeddings.encode(user_input), dtype=np.float32)
+        similarities = matrix @ (vector / np.linalg.norm(vector))
+
+        best_by_intent: Dict[str, float] = {}
+        for label, similarity in zip(labels, similarities):
+            best_by_intent[label] = max(best_by_intent.get(label, -1.0), float(similarity))
+        ranked = sorted(best_by_intent.items(), key=lambda item: item[1], reverse=True)
+        (intent, best), (_, runner_up) = ranked[0], ranked[1]
+        if best < self.min_similarity or best - runner_up < self.min_margin:
+            return None
+        if intent == "remove_document":
+            # Removal is destructive: similarity alone is not enough ("How do I remove document DOC7?").
+            # Only the anchored rules or the LLM may choose it.
+            return None
+        return {"intent": intent}
+
+    def _fast_path(self, user_input: str) -> Optional[Dict[str, Any]]:
+        result = self._by_rule(user_input)
+        if result:
+            self._record("rule", result)
+            return result
+        result = self._by_prototype(user_input)
+        if result:
+            self._record("prototype", result)
+        return result
+
+    def _record(self, tier: str, result: Dict[str, Any]) -> None:
+        with self._counts_lock:
+            self.tier_counts[tier] += 1
+            total = sum(self.tier_counts.values())
+            rates = ", ".join(f"{name} {count / total:.0%}" for name, count in self.tier_counts.items())
+        logger.info(f"Intent '{result['intent']}' decided by {tier} tier (hit rates: {rates})")
+
+    def _prompt(self, user_input: str) -> str:
+        return config.CLASSIFY_INTENT_PROMPT.format(query_input=user_input)
+
+    def classify(self, user_input: str) -> Dict[str, Any]:
+        """Return the intent state update for the input."""
+        user_input = user_input.strip()
+        result = self._fast_path(user_input)
+        if result:
+            return result
+        try:
+            response = self.llm.invoke(self._prompt(user_input)).strip()
+            logger.info(f"Intent classification response: {response}")
+            result = parse_intent_response(response)
+        except Exception as e:
+            logger.error(f"Error in intent classification: {e}")
+            result = {"intent": "answer_question"}
+        self._record("llm", result)
+        return result
+
+    async def aclassify(self, user_input: str) -> Dict[str, Any]:
+        """Async variant of ``classify``; the fast path may encode, so it runs in a worker thread."""
+        user_input = user_input.strip()
+        result = await asyncio.to_thread(self._fast_path, user_input)
+        if result:
+            return result
+        try:
+            response = (await self.llm.ainvoke(self._prompt(user_input))).strip()
+            logger.info(f"Intent classification response: {response}")
+            result = parse_intent_response(response)
+        except Exception as e:
+            logger.error(f"Error in intent classification: {e}")
+            result = {"intent": "answer_question"}
+        self._record("llm", result)
+        return result
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Union
+
+import httpx
+from langchain_ollama import OllamaLLM
+
+from config import (LLM_KEEP_ALIVE, LLM_MAX_CONCURRENCY, LLM_MODEL, LLM_TIMEOUT_SECONDS, OLLAMA_BASE_URL,
+                    PROMPT_FOR_QA)
+from services.metrics import LLM_IN_FLIGHT, LLM_QUEUE_WAIT_SECONDS, llm_metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _keep_alive(value: str) -> Union[int, str]:
+    """Ollama takes a duration string or a number of seconds, where -1 keeps the model loaded indefinitely."""
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+class _Waiter:
+    """A caller queued for a slot: a thread waiting on an event, or a coroutine awaiting a future."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        # Set under the gateway lock once a slot has been handed to this waiter.
+        self.granted = False
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMGateway:
+    """Process-wide front for one Ollama client, shared by every LLM call.
+
+    The client keeps one pooled HTTP connection set for sync and async calls
+    and asks Ollama to keep the model loaded for ``keep_alive``. At most
+    ``max_concurrency`` generations run at once; further calls wait for a
+    slot instead of queueing inside Ollama, and their wait time is recorded.
+    Slots are handed over first come, first served, to sync and async
+    callers alike.
+    ``json`` is a view of the same gateway whose calls request JSON output.
+    ``llm_factory`` builds the underlying client and defaults to ``OllamaLLM``.
+    """
+
+    def __init__(self, model: str = LLM_MODEL, base_url: str = OLLAMA_BASE_URL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, keep_alive: str = LLM_KEEP_ALIVE,
+                 llm_factory: Callable[..., Any] = OllamaLLM):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.keep_alive = _keep_alive(keep_alive)
+        self.client = llm_factory(
+            model=model,
+            temperature=0.0,
+            base_url=base_url,
+            keep_alive=self.keep_alive,
+            client_kwargs={
+                "timeout": LLM_TIMEOUT_SECONDS,
+                "limits": httpx.Limits(max_connections=max_concurrency,
+                                       max_keepalive_connections=max_concurrency),
+            },
+            callbacks=[llm_metrics],
+        )
+        self.json = BoundLLM(self, format="json")
+        self._lock = threading.Lock()
+        self._free = max_concurrency
+        self._waiters: Deque[_Waiter] = deque()
+        self._in_flight = 0
+        self._waiting = 0
+        self._wait_seconds = 0.0
+        self.warmed = False
+
+    def _acquired(self, waited: float) -> None:
+        LLM_QUEUE_WAIT_SECONDS.observe(waited)
+        with self._lock:
+            self._waiting -= 1
+            self._in_flight += 1
+            self._wait_seconds += waited
+        LLM_IN_FLIGHT.inc()
+
+    def _enqueue(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Waiter]:
+        """Take a free slot, or queue behind earlier callers and return the waiter to block on."""
+        with self._lock:
+            self._waiting += 1
+            if self._free and not self._waiters:
+                self._free -= 1
+                return None
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _hand_off(self) -> None:
+        # Called with the lock held: the slot goes straight to the longest waiting caller.
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            waiter.wake()
+        else:
+            self._free += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._hand_off()
+        LLM_IN_FLIGHT.dec()
+
+    @contextmanager
+    def _slot(self) -> Iterator[None]:
+        start = time.perf_counter()
+        waiter = self._enqueue()
+        if waiter is not None:
+            waiter.event.wait()
+        self._acquired(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def _aslot(self) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        waiter = self._enqueue(asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await waiter.future
+            except BaseException:
+                # Cancelled while queued: leave the queue, or pass on a slot handed over in the meantime.
+                with self._lock:
+                    self._waiting -= 1
+                    if waiter.granted:
+                        self._hand_off()
+                    else:
+                        self._waiters.remove(waiter)
+                raise
+        self._acquired(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        with self._slot():
+            return self.client.invoke(prompt, **kwargs)
+
+    async def ainvoke(self, prompt: str, **kwargs) -> str:
+        async with self._aslot():
+            return await self.client.ainvoke(prompt, **kwargs)
+
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        with self._slot():
+            yield from self.client.stream(prompt, **kwargs)
+
+    async def astream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        async with self._aslot():
+            async for token in self.client.astream(prompt, **kwargs):
+                yield token
+
+    def warm_up(self) -> None:
+        """Load the model and evaluate the fixed start of the QA prompt; failures are logged, not raised."""
+        start = time.perf_counter()
+        try:
+            self.invoke("")
+            self.invoke(PROMPT_FOR_QA.split("{", 1)[0], options={"temperature": 0.0, "num_predict": 1})
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {e}")
+            return
+        self.warmed = True
+        logger.info(f"LLM {self.model} warmed up in {time.perf_counter() - start:.2f}s.")
+
+    def start_warm_up(self) -> threading.Thread:
+        """Warm up in a background thread, so a slow Ollama start does not hold up the app's startup.
+
+        Requests arriving meanwhile queue for a slot behind the warm-up calls.
+        """
+        thread = threading.Thread(target=self.warm_up, name="llm-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model,
+                "keep_alive": self.keep_alive,
+                "warmed": self.warmed,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "wait_seconds": round(self._wait_seconds, 3),
+                "nodes": llm_metrics.stats(),
+            }
+
+
+class BoundLLM:
+    """A gateway view that adds fixed keyword arguments, such as ``format``, to every call."""
+
+    def __init__(self, gateway: LLMGateway, **call_kwargs):
+        self.gateway = gateway
+        self.call_kwargs = call_kwargs
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        return self.gateway.invoke(prompt, **self.call_kwargs, **kwargs)
+
+    async def ainvoke(self, prompt: str, **kwargs) -> str:
+        return await self.gateway.ainvoke(prompt, **self.call_kwargs, **kwargs)
+
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        return self.gateway.stream(prompt, **self.call_kwargs, **kwargs)
+
+    def astream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        return self.gateway.astream(prompt, **self.call_kwargs, **kwargs)
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,187 @@
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import Counter, Gauge, Histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end HTTP request latency", ["endpoint"],
+                            buckets=_LATENCY_BUCKETS)
+NODE_SECONDS = Histogram("rag_node_seconds", "LangGraph node latency", ["node"], buckets=_LATENCY_BUCKETS)
+EMBEDDING_SECONDS = Histogram("rag_embedding_encode_seconds", "Embedding model encode time", ["kind"],
+                              buckets=_LATENCY_BUCKETS)
+EMBEDDING_TEXTS = Counter("rag_embedding_texts_total", "Texts sent through the embedding model", ["kind"])
+ES_ROUND_TRIP_SECONDS = Histogram("rag_es_round_trip_seconds", "Elasticsearch request round-trip time",
+                                  ["operation"], buckets=_LATENCY_BUCKETS)
+ES_TOOK_SECONDS = Histogram("rag_es_took_seconds", "Elasticsearch server-side 'took' time", ["operation"],
+                            buckets=_LATENCY_BUCKETS)
+LLM_SECONDS = Histogram("rag_llm_call_seconds", "LLM call wall time", ["node"], buckets=_LATENCY_BUCKETS)
+LLM_PROMPT_TOKENS = Histogram("rag_llm_prompt_tokens", "LLM prompt tokens per call", ["node"], buckets=_TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = Histogram("rag_llm_completion_tokens", "LLM completion tokens per call", ["node"],
+                                  buckets=_TOKEN_BUCKETS)
+LLM_QUEUE_WAIT_SECONDS = Histogram("rag_llm_queue_wait_seconds", "Time an LLM call waited for a gateway slot",
+                                   buckets=_LATENCY_BUCKETS)
+LLM_IN_FLIGHT = Gauge("rag_llm_in_flight", "LLM calls currently holding a gateway slot")
+CONTEXT_TOKENS = Counter("rag_context_tokens_total",
+                         "Estimated prompt context tokens, naive concatenation vs packed", ["kind"])
+EMBEDDING_BATCH_TEXTS = Histogram("rag_embedding_microbatch_texts", "Query texts per micro-batched encode call",
+                                  buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+EMBEDDING_QUEUE_WAIT_SECONDS = Histogram("rag_embedding_queue_wait_seconds",
+                                         "Time a query waited for its micro-batch to start", buckets=_LATENCY_BUCKETS)
+INGEST_QUEUE_DEPTH = Gauge("rag_ingest_queue_jobs", "Ingestion jobs waiting for a worker")
+INGEST_RUN_DOCUMENTS = Histogram("rag_ingest_run_documents", "Documents per coalesced ingestion run",
+                                 buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+trace_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_timings_var: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+_node_var: contextvars.ContextVar[str] = contextvars.ContextVar("node", default="none")
+
+
+def start_trace(trace_id: Optional[str] = None) -> str:
+    """Start collecting a per-request timing breakdown and return the request's trace ID."""
+    trace_id = trace_id or uuid.uuid4().hex
+    trace_id_var.set(trace_id)
+    _timings_var.set({})
+    return trace_id
+
+
+def current_timings() -> Dict[str, float]:
+    """Timing breakdown of the current request in milliseconds."""
+    return {stage: round(seconds * 1000, 3) for stage, seconds in (_timings_var.get() or {}).items()}
+
+
+def _add_timing(stage: str, seconds: float) -> None:
+    timings = _timings_var.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(histogram: Histogram, stage: str, **labels):
+    """Observe the block's duration on ``histogram`` and add it to the request breakdown as ``stage``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.labels(**labels).observe(elapsed)
+        _add_timing(stage, elapsed)
+
+
+def observe_embedding(kind: str, count: int, seconds: float) -> None:
+    EMBEDDING_SECONDS.labels(kind=kind).observe(seconds)
+    EMBEDDING_TEXTS.labels(kind=kind).inc(count)
+    _add_timing(f"embedding.{kind}", seconds)
+
+
+def observe_es(operation: str, seconds: float, response: Any = None) -> None:
+    ES_ROUND_TRIP_SECONDS.labels(operation=operation).observe(seconds)
+    _add_timing(f"es.{operation}", seconds)
+    took = response.get("took") if response is not None else None
+    if took is not None:
+        ES_TOOK_SECONDS.labels(operation=operation).observe(took / 1000)
+        _add_timing(f"es.{operation}.took", took / 1000)
+
+
+def timed_node(name: str, func):
+    """Wrap a LangGraph node so its duration is recorded under ``name``.
+
+    ``functools.wraps`` keeps the original signature visible, so LangGraph still
+    injects arguments such as ``writer``.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = _node_var.set(name)
+            try:
+                with timed(NODE_SECONDS, f"node.{name}", node=name):
+                    return await func(*args, **kwargs)
+            finally:
+                _node_var.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _node_var.set(name)
+        try:
+            with timed(NODE_SECONDS, f"node.{name}", node=name):
+                return func(*args, **kwargs)
+        finally:
+            _node_var.reset(token)
+    return wrapper
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records wall time and Ollama prompt/completion token counts for every LLM call.
+
+    Besides the Prometheus histograms, per-node totals are kept for ``stats``.
+    """
+
+    # Cheap enough to run on the event loop instead of an executor thread.
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, float]] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._runs[run_id] = (time.perf_counter(), _node_var.get(), _timings_var.get())
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        start, node, timings = self._runs.pop(run_id, (None, "none", None))
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        LLM_SECONDS.labels(node=node).observe(elapsed)
+        if timings is not None:
+            timings[f"llm.{node}"] = timings.get(f"llm.{node}", 0.0) + elapsed
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                if "prompt_eval_count" in info:
+                    prompt_tokens += info["prompt_eval_count"]
+                    LLM_PROMPT_TOKENS.labels(node=node).observe(info["prompt_eval_count"])
+                if "eval_count" in info:
+                    completion_tokens += info["eval_count"]
+                    LLM_COMPLETION_TOKENS.labels(node=node).observe(info["eval_count"])
+        with self._lock:
+            totals = self._node_totals(node)
+            totals["calls"] += 1
+            totals["seconds"] += elapsed
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        _, node, _ = self._runs.pop(run_id, (None, "none", None))
+        with self._lock:
+            self._node_totals(node)["errors"] += 1
+
+    def _node_totals(self, node: str) -> Dict[str, float]:
+        return self._totals.setdefault(node, {"calls": 0, "seconds": 0.0, "prompt_tokens": 0,
+                                              "completion_tokens": 0, "errors": 0})
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-node call counts, mean latency and token totals since startup."""
+        with self._lock:
+            return {
+                node: {**totals, "seconds": round(totals["seconds"], 3),
+                       "mean_ms": round(totals["seconds"] / totals["calls"] * 1000, 3) if totals["calls"] else 0.0}
+                for node, totals in self._totals.items()
+            }
+
+
+llm_metrics = LLMMetricsCallback()
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from config import (MAX_EXPANSION_TERMS, QUERY_EXPANSION_CACHE_SIZE, SYNONYM_BOOST, SYNONYMS_PATH,
+                    SYNONYMS_PER_WORD)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few find for from further get give had has have
+having he her here hers herself him himself his how i if in into is it its itself just list me more most my
+myself no nor not now of off on once only or other our ours ourselves out over own please same she should
+show so some such tell than that the their theirs them themselves then there these they this those through
+to too under until up very was we were what when where which while who whom why will with would you your
+yours yourself yourselves
+""".split())
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+# Synonyms kept per word in the on-disk table; the per-query limit is applied at lookup time.
+_STORED_SYNONYMS_PER_WORD = 10
+
+
+def build_synonym_table(path: str = SYNONYMS_PATH) -> Dict[str, List[str]]:
+    """Precompute a word -> synonyms table from WordNet and write it to disk as JSON."""
+    import nltk
+    from nltk.corpus import wordnet
+
+    nltk.download("wordnet", quiet=True)
+    nltk.download("omw-1.4", quiet=True)
+
+    table: Dict[str, List[str]] = {}
+    for word in wordnet.all_lemma_names():
+        if "_" in word or word in STOPWORDS:
+            continue
+        synonyms: List[str] = []
+        for syn in wordnet.synsets(word):
+            for lemma in syn.lemmas():
+                name = lemma.name().replace("_", " ").lower()
+                if name != word and name not in synonyms:
+                    synonyms.append(name)
+            if len(synonyms) >= _STORED_SYNONYMS_PER_WORD:
+                break
+        if synonyms:
+            table[word] = synonyms[:_STORED_SYNONYMS_PER_WORD]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(table, f)
+    logger.info(f"Wrote synonym table with {len(table)} entries to {path}.")
+    return table
+
+
+_synonym_table: Optional[Dict[str, List[str]]] = None
+
+
+def load_synonym_table(path: str = SYNONYMS_PATH) -> Dict[str, List[str]]:
+    """Load the synonym table once per process, building it first if it is missing."""
+    global _synonym_table
+    if _synonym_table is None:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                _synonym_table = json.load(f)
+            logger.info(f"Loaded synonym table with {len(_synonym_table)} entries from {path}.")
+        else:
+            logger.info(f"No synonym table at {path}, building it from WordNet.")
+            _synonym_table = build_synonym_table(path)
+    return _synonym_table
+
+
+@lru_cache(maxsize=QUERY_EXPANSION_CACHE_SIZE)
+def _expand_word(word: str) -> tuple:
+    return tuple(load_synonym_table().get(word, ())[:SYNONYMS_PER_WORD])
+
+
+def expand_query(query: str) -> List[str]:
+    """Return the bounded list of synonym terms for the non-stopword words in the query."""
+    words = [word for word in _WORD_RE.findall(query.lower()) if word not in STOPWORDS]
+    seen = set(words)
+    expanded_terms: List[str] = []
+    for word in words:
+        for synonym in _expand_word(word):
+            if synonym not in seen:
+                seen.add(synonym)
+                expanded_terms.append(synonym)
+                if len(expanded_terms) >= MAX_EXPANSION_TERMS:
+                    return expanded_terms
+    return expanded_terms
+
+
+def expansion_clause(query: str) -> Optional[Dict[str, Any]]:
+    """Build a single down-weighted ``match`` clause holding all expansion terms."""
+    expanded_terms = expand_query(query)
+    if not expanded_terms:
+        return None
+    return {"match": {"content": {"query": " ".join(expanded_terms), "boost": SYNONYM_BOOST}}}
+
+
+if __name__ == "__main__":
+    build_synonym_table()
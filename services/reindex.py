@@ -0,0 +1,316 @@
+"""Zero-downtime rebuild of the chunk index behind the ``INDEX_NAME`` alias.
+
+Documents are re-chunked and re-embedded with the current configuration into
+a new ``<alias>-v<n>`` index while searches keep hitting the old one. The alias
+is then switched atomically.
+
+    python -m services.reindex            # resumes an interrupted rebuild if there is one
+    python -m services.reindex --fresh --delete-old
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from elasticsearch import Elasticsearch
+
+from config import (INDEX_NAME, REINDEX_CATCHUP_ROUNDS, REINDEX_CHECKPOINT_PATH, REINDEX_PAGE_SIZE,
+                    REINDEX_PIT_KEEP_ALIVE, REINDEX_WORKERS)
+from models import DocumentRequest
+from services.answer_cache import index_generation
+from services.context_builder import continuation
+from services.es_client import create_versioned_index, es
+from services.ingestion import ingest_documents, iter_chunk_hits
+from services.vector_store import local_store
+from services.write_gate import index_writes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def reassemble(chunks: List[str]) -> str:
+    """Rebuild document text from its ordered chunks, dropping the overlap between neighbours."""
+    text = chunks[0] if chunks else ""
+    for previous, following in zip(chunks, chunks[1:]):
+        text += continuation(previous, following, max_overlap=len(previous))
+    return text
+
+
+class Reindexer:
+    """Rebuilds the index behind ``alias`` into a new version and switches the alias when done.
+
+    Document ids are paged with a ``composite`` aggregation under a point in
+    time, so the rebuild reads a consistent snapshot. Each page's documents are
+    fetched in parallel by ``workers`` threads and fed through the regular
+    ingestion pipeline, which batches embedding and bulk writes. A checkpoint
+    is written after every page, so an interrupted rebuild resumes where it
+    stopped. Documents written or removed after the rebuild started are caught
+    up from the live index; the last round and the switch run with index
+    writes paused, and the switch is refused if the indices still differ.
+    """
+
+    def __init__(self, client: Elasticsearch, alias: str = INDEX_NAME, workers: int = REINDEX_WORKERS,
+                 page_size: int = REINDEX_PAGE_SIZE, checkpoint_path: str = REINDEX_CHECKPOINT_PATH,
+                 delete_old: bool = False):
+        self.es = client
+        self.alias = alias
+        self.workers = workers
+        self.page_size = page_size
+        self.checkpoint_path = checkpoint_path
+        self.delete_old = delete_old
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.progress: Dict[str, Any] = {"status": "idle"}
+
+    # -- checkpoint --------------------------------------------------------
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        with open(f"{self.checkpoint_path}.tmp", "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(f"{self.checkpoint_path}.tmp", self.checkpoint_path)
+
+    # -- reading -----------------------------------------------------------
+
+    def current_index(self) -> str:
+        """The concrete index ``alias`` resolves to; a pre-alias deployment has a concrete index of that name."""
+        if self.es.indices.exists_alias(name=self.alias):
+            return next(iter(self.es.indices.get_alias(name=self.alias)))
+        return self.alias
+
+    def _next_version(self) -> int:
+        versions = [int(name.rsplit("-v", 1)[1]) for name in self.es.indices.get(index=f"{self.alias}-v*")
+                    if name.rsplit("-v", 1)[1].isdigit()]
+        return max(versions, default=0) + 1
+
+    def _search(self, index: str, body: Dict[str, Any], pit_id: Optional[str]) -> Dict[str, Any]:
+        if pit_id is None:
+            return self.es.search(index=index, body=body)
+        return self.es.search(body={**body, "pit": {"id": pit_id, "keep_alive": REINDEX_PIT_KEEP_ALIVE}})
+
+    def document_ids(self, index: str, pit_id: Optional[str] = None, after: Optional[Dict[str, Any]] = None,
+                     query: Optional[Dict[str, Any]] = None) -> Iterator[tuple]:
+        """Yield ``(document ids, after_key)`` pages in document id order."""
+        while True:
+            composite = {"size": self.page_size, "sources": [{"document_id": {"terms": {"field": "document_id"}}}]}
+            if after:
+                composite["after"] = after
+            body = {"size": 0, "aggs": {"documents": {"composite": composite}}}
+            if query:
+                body["query"] = query
+            aggregation = self._search(index, body, pit_id)["aggregations"]["documents"]
+            if not aggregation["buckets"]:
+                return
+            after = aggregation["after_key"]
+            yield [bucket["key"]["document_id"] for bucket in aggregation["buckets"]], after
+
+    def read_document(self, index: str, doc_id: str, pit_id: Optional[str] = None,
+                      summaries: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[DocumentRequest]:
+        """Reassemble a stored document from its chunks, or None if it has none.
+
+        Stored chunk summaries are added to ``summaries`` by content hash.
+        """
+        title, chunks = "", []
+        fields = ["title", "content", "content_hash", "summary", "summary_hash"]
+        for hit in iter_chunk_hits(self.es, index, doc_id, fields, pit_id, REINDEX_PIT_KEEP_ALIVE):
+            source = hit["_source"]
+            title = title or source.get("title", "")
+            chunks.append(source.get("content", ""))
+            if summaries is not None and source.get("summary_hash") and source["summary_hash"] == source.get("content_hash"):
+                summaries[source["summary_hash"]] = {"summary": source["summary"], "summary_hash": source["summary_hash"]}
+        if not chunks:
+            return None
+        return DocumentRequest(doc_id=doc_id, title=title, content=reassemble(chunks))
+
+    # -- writing -----------------------------------------------------------
+
+    def _rebuild(self, pool: ThreadPoolExecutor, source: str, target: str, doc_ids: List[str],
+                 pit_id: Optional[str] = None) -> Dict[str, Any]:
+        # Chunks the new settings leave unchanged keep their summaries instead of being summarized again.
+        summaries: Dict[str, Dict[str, Any]] = {}
+        documents = [document for document in pool.map(
+                         lambda doc_id: self.read_document(source, doc_id, pit_id, summaries=summaries), doc_ids)
+                     if document is not None]
+        report = ingest_documents(documents, index_name=target, carry_over=summaries)
+        for result in report["results"]:
+            if result["status"] != "success":
+                logger.error(f"Reindex of document {result['doc_id']} failed: {result.get('message')}")
+        with self._lock:
+            self.progress["documents_done"] += len(doc_ids)
+            self.progress["chunks_written"] += report["chunks_indexed"]
+            self.progress["errors"] += sum(1 for result in report["results"] if result["status"] != "success")
+        return report
+
+    def _diff(self, source: str, target: str, since_ms: int) -> Tuple[Set[str], Set[str]]:
+        """Documents to rebuild (written to ``source`` since ``since_ms``, or missing from ``target``) and to remove."""
+        changed: Set[str] = set()
+        for doc_ids, _ in self.document_ids(source, query={"range": {"indexed_at": {"gte": since_ms}}}):
+            changed.update(doc_ids)
+        source_ids = {doc_id for doc_ids, _ in self.document_ids(source) for doc_id in doc_ids}
+        target_ids = {doc_id for doc_ids, _ in self.document_ids(target) for doc_id in doc_ids}
+        return changed | (source_ids - target_ids), target_ids - source_ids
+
+    def _apply(self, pool: ThreadPoolExecutor, source: str, target: str, changed: Set[str], removed: Set[str]) -> None:
+        if changed:
+            self._rebuild(pool, source, target, sorted(changed))
+        if removed:
+            self.es.delete_by_query(index=target, body={"query": {"terms": {"document_id": sorted(removed)}}},
+                                    refresh=True)
+
+    def _catch_up(self, pool: ThreadPoolExecutor, source: str, target: str, since_ms: int) -> int:
+        """Apply writes and removals that hit the live index after ``since_ms`` while it keeps serving.
+
+        Stops when a round finds nothing or after ``REINDEX_CATCHUP_ROUNDS``;
+        returns the time the final round has to catch up from.
+        """
+        for round_number in range(1, REINDEX_CATCHUP_ROUNDS + 1):
+            # Writes still in flight may carry an older indexed_at than the round's start.
+            round_started = index_writes.writes_since()
+            changed, removed = self._diff(source, target, since_ms)
+            logger.info(f"Reindex catch-up round {round_number}: {len(changed)} changed, {len(removed)} removed.")
+            if not changed and not removed:
+                return round_started
+            self._apply(pool, source, target, changed, removed)
+            since_ms = round_started
+        return since_ms
+
+    def _final_catch_up(self, pool: ThreadPoolExecutor, source: str, target: str, since_ms: int) -> None:
+        """Apply the remaining writes while index writes are paused, then check both indices hold the same documents.
+
+        Raises instead of letting the alias switch to an index known to differ.
+        """
+        changed, removed = self._diff(source, target, since_ms)
+        logger.info(f"Reindex final catch-up: {len(changed)} changed, {len(removed)} removed.")
+        self._apply(pool, source, target, changed, removed)
+        self.es.indices.refresh(index=target)
+        changed, removed = self._diff(source, target, int(time.time() * 1000))
+        if changed or removed:
+            raise RuntimeError(f"{target} still differs from {source} after the final catch-up "
+                               f"({len(changed)} missing, {len(removed)} extra documents); not switching.")
+
+    def _switch_alias(self, source: str, target: str) -> None:
+        if source == self.alias:
+            # A concrete index cannot share its name with an alias; it is dropped in the same atomic request.
+            actions = [{"remove_index": {"index": source}}, {"add": {"index": target, "alias": self.alias}}]
+        else:
+            actions = [{"remove": {"index": source, "alias": self.alias}}, {"add": {"index": target, "alias": self.alias}}]
+        self.es.indices.update_aliases(actions=actions)
+        if self.delete_old and source != self.alias:
+            self.es.indices.delete(index=source)
+        logger.info(f"Alias {self.alias} now points at {target}.")
+
+    # -- driver ------------------------------------------------------------
+
+    def run(self, resume: bool = True) -> Dict[str, Any]:
+        """Rebuild into a new index version and switch the alias; returns the final progress report."""
+        if local_store is not None:
+            raise RuntimeError("Reindexing applies to the Elasticsearch backend; use `python -m services.vector_store compact`.")
+        source = self.current_index()
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint and (checkpoint["source"] != source or not self.es.indices.exists(index=checkpoint["target"])):
+            logger.info("Ignoring a stale reindex checkpoint.")
+            checkpoint = None
+        if checkpoint is None:
+            target = create_versioned_index(self.es, self.alias, self._next_version())
+            checkpoint = {"source": source, "target": target, "started_at": index_writes.writes_since(), "after": None,
+                          "documents_done": 0, "chunks_written": 0}
+            self._save_checkpoint(checkpoint)
+        else:
+            logger.info(f"Resuming reindex into {checkpoint['target']} after {checkpoint['documents_done']} documents.")
+        target = checkpoint["target"]
+
+        total = self.es.search(index=source, body={"size": 0, "aggs": {"documents": {"cardinality": {"field": "document_id"}}}})
+        started = time.perf_counter()
+        with self._lock:
+            self.progress = {
+                "status": "running", "source": source, "target": target,
+                "documents_total": total["aggregations"]["documents"]["value"],
+                "documents_done": checkpoint["documents_done"], "chunks_written": checkpoint["chunks_written"],
+                "resumed_from": checkpoint["documents_done"], "errors": 0,
+            }
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                pit_id = self.es.open_point_in_time(index=source, keep_alive=REINDEX_PIT_KEEP_ALIVE)["id"]
+                try:
+                    for doc_ids, after in self.document_ids(source, pit_id, after=checkpoint["after"]):
+                        self._rebuild(pool, source, target, doc_ids, pit_id)
+                        checkpoint.update(after=after, documents_done=self.progress["documents_done"],
+                                          chunks_written=self.progress["chunks_written"])
+                        self._save_checkpoint(checkpoint)
+                        logger.info(f"Reindex progress: {self.report(started)}")
+                finally:
+                    self.es.close_point_in_time(id=pit_id)
+
+                with self._lock:
+                    self.progress["status"] = "catching_up"
+                since_ms = self._catch_up(pool, source, target, checkpoint["started_at"])
+
+                with self._lock:
+                    self.progress["status"] = "switching"
+                with index_writes.exclusive():
+                    self._final_catch_up(pool, source, target, since_ms)
+                    self._switch_alias(source, target)
+                    index_generation.bump()
+            os.remove(self.checkpoint_path)
+            with self._lock:
+                self.progress["status"] = "completed"
+        except Exception as e:
+            logger.error(f"Reindex failed, rerun to resume: {e}")
+            with self._lock:
+                self.progress.update(status="failed", error=str(e))
+            raise
+        finally:
+            with self._lock:
+                self.progress["finished"] = True
+        report = self.report(started)
+        logger.info(f"Reindex finished: {report}")
+        return report
+
+    def report(self, started: Optional[float] = None) -> Dict[str, Any]:
+        with self._lock:
+            report = dict(self.progress)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            self.progress["elapsed_seconds"] = report["elapsed_seconds"] = round(elapsed, 3)
+            done = report.get("documents_done", 0) - report.get("resumed_from", 0)
+            report["documents_per_second"] = round(done / elapsed, 2) if elapsed > 0 else 0.0
+            report["chunks_per_second"] = round(report.get("chunks_written", 0) / elapsed, 2) if elapsed > 0 else 0.0
+            self.progress.update(documents_per_second=report["documents_per_second"],
+                                 chunks_per_second=report["chunks_per_second"])
+        return report
+
+    def start(self, resume: bool = True) -> bool:
+        """Run the rebuild in a background thread; returns False if one is already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self.progress = {"status": "starting"}
+            self._thread = threading.Thread(target=self._run_quietly, args=(resume,), name="reindex", daemon=True)
+            self._thread.start()
+        return True
+
+    def _run_quietly(self, resume: bool) -> None:
+        try:
+            self.run(resume=resume)
+        except Exception:
+            pass  # Already logged and recorded in ``progress``.
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the chunk index behind its alias with the current settings.")
+    parser.add_argument("--fresh", action="store_true", help="ignore any checkpoint and start a new index version")
+    parser.add_argument("--workers", type=int, default=REINDEX_WORKERS)
+    parser.add_argument("--delete-old", action="store_true", help="delete the previous index version after the switch")
+    args = parser.parse_args()
+    print(json.dumps(Reindexer(es, workers=args.workers, delete_old=args.delete_old).run(resume=not args.fresh), indent=2))
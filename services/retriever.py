@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+
+from config import BM25_WINDOW_SIZE, KNN_K, KNN_NUM_CANDIDATES, MSEARCH_MAX_QUERIES, RRF_RANK_CONSTANT
+from models import SearchHit
+from services.metrics import observe_es
+from services.query_expansion import expansion_clause
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Hit record field -> stored ``_source`` field.
+HIT_SOURCE_FIELDS = {
+    "document_id": "document_id",
+    "chunk_index": "chunk_index",
+    "title": "title",
+    "content": "content",
+    "embedding": "embedding",
+    "summary": "summary",
+}
+# Vectors are only returned when asked for explicitly.
+DEFAULT_HIT_FIELDS = ("document_id", "chunk_index", "title", "content")
+
+
+def to_hit(hit: Dict[str, Any], fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> SearchHit:
+    source = hit.get("_source", {})
+    record: SearchHit = {"chunk_id": hit["_id"], "doc_id": hit["_id"], "score": hit["_score"]}
+    for field in fields:
+        record[field] = source.get(HIT_SOURCE_FIELDS[field], None if field in ("chunk_index", "embedding") else "")
+    return record
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Dict[str, Any]]], rank_constant: int = RRF_RANK_CONSTANT) -> List[Dict[str, Any]]:
+    """Fuse ranked hit lists by summing 1 / (rank_constant + rank) per hit id."""
+    scores: Dict[str, float] = {}
+    hits: Dict[str, Dict[str, Any]] = {}
+    for ranked in ranked_lists:
+        for rank, hit in enumerate(ranked, start=1):
+            scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + 1.0 / (rank_constant + rank)
+            hits.setdefault(hit["_id"], hit)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return [{**hits[hit_id], "_score": scores[hit_id]} for hit_id in fused]
+
+
+class HybridRetriever:
+    """BM25 + approximate kNN retrieval over the chunk index, fused with RRF.
+
+    Both sub-queries go out in a single ``msearch`` round trip.
+    """
+
+    def __init__(self, es: Elasticsearch, index_name: str, embeddings, async_es: Optional[AsyncElasticsearch] = None):
+        self.es = es
+        self.async_es = async_es
+        self.index_name = index_name
+        self.embeddings = embeddings
+
+    def bm25_body(self, query: str, size: int, fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> Dict[str, Any]:
+        should = [{"match": {"content": query}}]
+        synonyms = expansion_clause(query)
+        if synonyms:
+            should.append(synonyms)
+        return {"size": size, "_source": self.source_fields(fields), "query": {"bool": {"should": should}}}
+
+    def knn_body(self, query_vector: List[float], k: int, fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> Dict[str, Any]:
+        return {
+            "size": k,
+            "_source": self.source_fields(fields),
+            "knn": {
+                "field": "embedding",
+                "query_vector": query_vector,
+                "k": k,
+                "num_candidates": max(KNN_NUM_CANDIDATES, k),
+            },
+        }
+
+    @staticmethod
+    def source_fields(fields: Sequence[str]) -> List[str]:
+        """Stored fields to fetch; anything not listed (notably the embedding) is not serialized."""
+        unknown = set(fields) - HIT_SOURCE_FIELDS.keys()
+        if unknown:
+            raise ValueError(f"Unknown hit fields: {sorted(unknown)}")
+        return [HIT_SOURCE_FIELDS[field] for field in fields]
+
+    def searches(self, query: str, query_vector: List[float], k: int, offset: int = 0,
+                 fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[Dict[str, Any]]:
+        """Header/body pairs for the BM25 and kNN sub-searches of one query."""
+        window = offset + k
+        return [
+            {"index": self.index_name}, self.bm25_body(query, max(BM25_WINDOW_SIZE, window), fields),
+            {"index": self.index_name}, self.knn_body(query_vector, max(KNN_K, window), fields),
+        ]
+
+    def fuse(self, responses: List[Dict[str, Any]], k: int, offset: int = 0,
+             fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[SearchHit]:
+        """Fuse the sub-search responses of one query and return hits ``offset`` to ``offset + k``."""
+        ranked_lists = []
+        for item in responses:
+            if "error" in item:
+                logger.error(f"Elasticsearch sub-search error: {item['error']}")
+                continue
+            ranked_lists.append(item["hits"]["hits"])
+        return [to_hit(hit, fields) for hit in reciprocal_rank_fusion(ranked_lists)[offset:offset + k]]
+
+    def search(self, query: str, k: int = 5, offset: int = 0,
+               fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[SearchHit]:
+        """Return ``k`` chunks for the query starting at rank ``offset``, with only the requested fields."""
+        query_vector = self.embeddings.encode(query).tolist()
+        start = time.perf_counter()
+        response = self.es.msearch(searches=self.searches(query, query_vector, k, offset, fields))
+        observe_es("msearch", time.perf_counter() - start, response)
+        return self.fuse(response["responses"], k, offset, fields)
+
+    def search_many(self, queries: List[str], k: int = 5,
+                    fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[List[SearchHit]]:
+        """Retrieve for many queries with one batched encode and one ``msearch`` per ``MSEARCH_MAX_QUERIES``."""
+        query_vectors = self.embeddings.encode_many(queries)
+        results = []
+        for searches in self._msearch_batches(queries, query_vectors, k, fields):
+            began = time.perf_counter()
+            response = self.es.msearch(searches=searches)
+            observe_es("msearch", time.perf_counter() - began, response)
+            results.extend(self._fuse_each(response["responses"], k, fields))
+        return results
+
+    async def asearch_many(self, queries: List[str], k: int = 5,
+                           fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[List[SearchHit]]:
+        """Async variant of ``search_many``; the batched encode runs in a worker thread."""
+        if self.async_es is None:
+            raise RuntimeError("HybridRetriever was created without an async Elasticsearch client")
+        query_vectors = await asyncio.to_thread(self.embeddings.encode_many, queries)
+        results = []
+        for searches in self._msearch_batches(queries, query_vectors, k, fields):
+            began = time.perf_counter()
+            response = await self.async_es.msearch(searches=searches)
+            observe_es("msearch", time.perf_counter() - began, response)
+            results.extend(self._fuse_each(response["responses"], k, fields))
+        return results
+
+    def _msearch_batches(self, queries: List[str], query_vectors, k: int,
+                         fields: Sequence[str]) -> Iterator[List[Dict[str, Any]]]:
+        for start in range(0, len(queries), MSEARCH_MAX_QUERIES):
+            searches = []
+            for query, query_vector in zip(queries[start:start + MSEARCH_MAX_QUERIES],
+                                           query_vectors[start:start + MSEARCH_MAX_QUERIES]):
+                searches.extend(self.searches(query, query_vector.tolist(), k, 0, fields))
+            yield searches
+
+    def _fuse_each(self, responses: List[Dict[str, Any]], k: int, fields: Sequence[str]) -> List[List[SearchHit]]:
+        # ``searches`` emits two sub-searches per query, in order.
+        return [self.fuse(responses[i:i + 2], k, 0, fields) for i in range(0, len(responses), 2)]
+
+    async def asearch(self, query: str, k: int = 5, offset: int = 0,
+                      fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[SearchHit]:
+        """Async variant of ``search``; the encode runs in a worker thread."""
+        if self.async_es is None:
+            raise RuntimeError("HybridRetriever was created without an async Elasticsearch client")
+        query_vector = (await asyncio.to_thread(self.embeddings.encode, query)).tolist()
+        start = time.perf_counter()
+        response = await self.async_es.msearch(searches=self.searches(query, query_vector, k, offset, fields))
+        observe_es("msearch", time.perf_counter() - start, response)
+        return self.fuse(response["responses"], k, offset, fields)
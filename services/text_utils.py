@@ -1,14 +1,11 @@
-from services.es_client import es
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import codecs
+from typing import BinaryIO, Iterable, Iterator
 
-import nltk
-from nltk.corpus import wordnet
-# Download NLP resources
-nltk.download("wordnet")
-nltk.download("omw-1.4")
+from config import CHUNK_OVERLAP, CHUNK_SIZE
+from services.es_client import es
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-CHUNK_SIZE = 512  # Define chunk size (in characters)
-OVERLAP = 51  # Define overlap size
+OVERLAP = CHUNK_OVERLAP
 
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=CHUNK_SIZE,  # Max tokens per chunk
@@ -16,18 +13,44 @@ text_splitter = RecursiveCharacterTextSplitter(
     # length_function=count_tokens  # Use BAAI tokenizer
 )
 
-def expand_query(query: str) -> list:
-    words = query.split()
-    expanded_terms = set(words)
-    
-    for word in words:
-        synonyms = wordnet.synsets(word)
-        for syn in synonyms:
-            for lemma in syn.lemmas():
-                expanded_terms.add(lemma.name().replace("_", " "))
-
-    return list(expanded_terms)
+def normalize_text(text: str) -> str:
+    """Strip newlines and double quotes before chunking."""
+    return text.replace('\n', '').replace('"', '')
 
 def chunk_text(text: str) -> list[str]:
     chunks = text_splitter.split_text(text)
-    return chunks
\ No newline at end of file
+    return chunks
+
+def iter_chunks(pieces: Iterable[str]) -> Iterator[str]:
+    """Normalize and chunk text that arrives in pieces, holding only one piece plus a tail in memory.
+
+    The last chunk of every split is held back and re-split with the next
+    piece, so chunks never end at a piece boundary and the overlap with the
+    previous chunk is kept. Split points match ``chunk_text`` on the whole
+    text, except around a run of more than ``CHUNK_SIZE`` characters without
+    a space that crosses a piece boundary.
+    """
+    tail = ""
+    for piece in pieces:
+        buffer = tail + normalize_text(piece)
+        chunks = chunk_text(buffer)
+        if len(chunks) < 2:
+            tail = buffer
+            continue
+        yield from chunks[:-1]
+        # Keep the raw text from the held-back chunk on, with the space the splitter stripped in front of it,
+        # so the re-split measures it exactly as a split of the whole text would.
+        start = buffer.rfind(chunks[-1])
+        tail = buffer[start - 1 if start > 0 and buffer[start - 1] == " " else start:]
+    if tail:
+        yield from chunk_text(tail)
+
+def iter_decoded(stream: BinaryIO, block_size: int, encoding: str = "utf-8") -> Iterator[str]:
+    """Read and decode a binary stream block by block; multi-byte characters may span blocks."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
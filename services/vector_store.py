@@ -0,0 +1,414 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from config import (BM25_WINDOW_SIZE, KNN_K, LOCAL_STORE_DTYPE, LOCAL_STORE_PATH, RETRIEVAL_BACKEND,
+                    SYNONYM_BOOST)
+from models import SearchHit
+from services.embedding_cache import query_embeddings
+from services.query_expansion import expand_query
+from services.retriever import DEFAULT_HIT_FIELDS, HybridRetriever, reciprocal_rank_fusion, to_hit
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+# Rows scored per matrix product, so a float16 store is never upcast in full.
+SCORE_BLOCK_ROWS = 65536
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class LocalVectorStore:
+    """Embedded chunk store for running without Elasticsearch.
+
+    Vectors live in one contiguous, L2-normalized float16/float32 file that is
+    memory-mapped rather than read, next to a JSON-lines metadata log holding
+    one line per row plus tombstone and partial-update lines. Retrieval mirrors
+    ``HybridRetriever``: exact cosine top-k via ``argpartition`` and an
+    in-process BM25 inverted index, fused with RRF. Writes append; deletes
+    only tombstone until ``compact`` rewrites the live rows into a new
+    generation of files.
+    """
+
+    def __init__(self, path: str, embeddings, dtype: str = LOCAL_STORE_DTYPE):
+        self.path = path
+        self.embeddings = embeddings
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # -- files -------------------------------------------------------------
+
+    def _file(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.path, f"{name}.{generation}")
+
+    def _write_manifest(self) -> None:
+        manifest = os.path.join(self.path, "store.json")
+        with open(f"{manifest}.tmp", "w") as f:
+            json.dump({"generation": self.generation, "dims": self.dims, "dtype": self.dtype.name}, f)
+        os.replace(f"{manifest}.tmp", manifest)
+
+    def _load(self) -> None:
+        manifest = os.path.join(self.path, "store.json")
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                info = json.load(f)
+            self.generation, self.dims = info["generation"], info["dims"]
+            self.dtype = np.dtype(info["dtype"])
+        else:
+            self.generation, self.dims = 0, None
+
+        self.rows: List[Dict[str, Any]] = []
+        self.deleted: Set[int] = set()
+        meta_path = self._file("meta.jsonl")
+        if os.path.exists(meta_path):
+            complete = 0
+            with open(meta_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    complete += len(line)
+                    record = json.loads(line)
+                    if "tombstone" in record:
+                        self.deleted.add(record["tombstone"])
+                    elif "update" in record:
+                        self.rows[record["update"]].update(record["doc"])
+                    else:
+                        self.rows.append(record)
+            if os.path.getsize(meta_path) > complete:
+                # A torn final write; cut it off so the next append starts on a fresh line.
+                logger.warning(f"Truncating a partial record at the end of {meta_path}.")
+                os.truncate(meta_path, complete)
+
+        missing: List[int] = []
+        vectors_path = self._file("vectors.bin")
+        if self.dims is not None:
+            row_bytes = self.dims * self.dtype.itemsize
+            size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+            # Vectors are written before their metadata, so extra rows are an interrupted append,
+            # even with no rows at all: the first append writes the manifest and vectors before any metadata.
+            if size > len(self.rows) * row_bytes:
+                os.truncate(vectors_path, len(self.rows) * row_bytes)
+            elif size < len(self.rows) * row_bytes:
+                # Metadata reached the disk but its vectors did not; pad with zeros and drop those rows below.
+                missing = [row for row in range(size // row_bytes, len(self.rows)) if row not in self.deleted]
+                with open(vectors_path, "ab") as f:
+                    f.truncate(len(self.rows) * row_bytes)
+        self._remap()
+        self._build_indexes()
+        if missing:
+            logger.warning(f"Dropping {len(missing)} rows of {self.path} whose vectors were never written.")
+            self._tombstone(missing)
+        logger.info(f"Loaded local vector store at {self.path}: {len(self.rows)} rows, {len(self.deleted)} deleted.")
+
+    def _remap(self) -> None:
+        if not self.rows:
+            self.vectors = np.empty((0, self.dims or 0), dtype=self.dtype)
+        else:
+            self.vectors = np.memmap(self._file("vectors.bin"), dtype=self.dtype, mode="r",
+                                     shape=(len(self.rows), self.dims))
+
+    # -- indexes -----------------------------------------------------------
+
+    def _build_indexes(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.by_document: Dict[str, Set[int]] = defaultdict(set)
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.lengths = np.zeros(len(self.rows), dtype=np.float32)
+        self.live = np.ones(len(self.rows), dtype=bool)
+        self.total_length = 0.0
+        for row, record in enumerate(self.rows):
+            if row in self.deleted:
+                self.live[row] = False
+            else:
+                self._index_row(row, record)
+
+    def _index_row(self, row: int, record: Dict[str, Any]) -> None:
+        self.ids[record["_id"]] = row
+        self.by_document[record["document_id"]].add(row)
+        tokens = tokenize(record["content"])
+        for token, count in Counter(tokens).items():
+            self.postings[token][row] = count
+        self.lengths[row] = len(tokens)
+        self.total_length += len(tokens)
+
+    def _unindex_row(self, row: int) -> None:
+        record = self.rows[row]
+        del self.ids[record["_id"]]
+        self.by_document[record["document_id"]].discard(row)
+        if not self.by_document[record["document_id"]]:
+            del self.by_document[record["document_id"]]
+        for token in set(tokenize(record["content"])):
+            self.postings[token].pop(row, None)
+            if not self.postings[token]:
+                del self.postings[token]
+        self.total_length -= self.lengths[row]
+        self.live[row] = False
+
+    # -- writes ------------------------------------------------------------
+
+    def bulk(self, actions: Iterable[Dict[str, Any]], batch_size: int = 500) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+        """Apply ``index``/``delete`` actions shaped like ``helpers.bulk`` input.
+
+        Yields one ``(ok, info)`` per action, like ``helpers.parallel_bulk``.
+        """
+        batch = []
+        for action in actions:
+            batch.append(action)
+            if len(batch) >= batch_size:
+                yield from self._apply(batch)
+                batch = []
+        if batch:
+            yield from self._apply(batch)
+
+    def _apply(self, actions: List[Dict[str, Any]]) -> List[Tuple[bool, Dict[str, Any]]]:
+        results = []
+        with self._lock:
+            # Consecutive actions of the same type are applied together, keeping result order.
+            start = 0
+            while start < len(actions):
+                op = actions[start].get("_op_type", "index")
+                end = start
+                while end < len(actions) and actions[end].get("_op_type", "index") == op:
+                    end += 1
+                run = actions[start:end]
+                if op == "index":
+                    self._append(run)
+                    results.extend((True, {"index": {"_id": action["_id"], "status": 201}}) for action in run)
+                elif op == "delete":
+                    deleted = self._tombstone([self.ids[action["_id"]] for action in run if action["_id"] in self.ids])
+                    results.extend((action["_id"] in deleted,
+                                    {"delete": {"_id": action["_id"], "status": 200 if action["_id"] in deleted else 404}})
+                                   for action in run)
+                elif op == "update":
+                    updated = self._update(run)
+                    results.extend((action["_id"] in updated,
+                                    {"update": {"_id": action["_id"], "status": 200 if action["_id"] in updated else 404}})
+                                   for action in run)
+                else:
+                    results.extend((False, {op: {"_id": action.get("_id"), "status": 400,
+                                                 "error": f"Unsupported operation {op}"}}) for action in run)
+                start = end
+        return results
+
+    def _append(self, actions: List[Dict[str, Any]]) -> None:
+        vectors = np.asarray([action["_source"]["embedding"] for action in actions], dtype=np.float32)
+        if self.dims is None:
+            self.dims = vectors.shape[1]
+            self._write_manifest()
+        if vectors.shape[1] != self.dims:
+            raise ValueError(f"Expected {self.dims}-dimensional vectors, got {vectors.shape[1]}")
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        # Re-indexing an id replaces it, as in Elasticsearch.
+        self._tombstone([self.ids[action["_id"]] for action in actions if action["_id"] in self.ids])
+        with open(self._file("vectors.bin"), "ab") as f:
+            f.write(vectors.astype(self.dtype).tobytes())
+        records = [
+            {"_id": action["_id"], **{key: value for key, value in action["_source"].items() if key != "embedding"}}
+            for action in actions
+        ]
+        with open(self._file("meta.jsonl"), "a") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+        first = len(self.rows)
+        self.rows.extend(records)
+        self.lengths = np.concatenate([self.lengths, np.zeros(len(records), dtype=np.float32)])
+        self.live = np.concatenate([self.live, np.ones(len(records), dtype=bool)])
+        for row, record in enumerate(records, start=first):
+            self._index_row(row, record)
+        self._remap()
+
+    def _tombstone(self, rows: List[int]) -> Set[str]:
+        rows = [row for row in dict.fromkeys(rows) if self.live[row]]
+        if not rows:
+            return set()
+        with open(self._file("meta.jsonl"), "a") as f:
+            f.writelines(json.dumps({"tombstone": row}) + "\n" for row in rows)
+        deleted = {self.rows[row]["_id"] for row in rows}
+        for row in rows:
+            self._unindex_row(row)
+            self.deleted.add(row)
+        return deleted
+
+    def _update(self, actions: List[Dict[str, Any]]) -> Set[str]:
+        """Merge ``doc`` into the metadata of live rows; text fields used for BM25 cannot change this way."""
+        updates = [(self.ids[action["_id"]], action["doc"]) for action in actions if action["_id"] in self.ids]
+        with open(self._file("meta.jsonl"), "a") as f:
+            f.writelines(json.dumps({"update": row, "doc": doc}) + "\n" for row, doc in updates)
+        for row, doc in updates:
+            self.rows[row].update(doc)
+        return {self.rows[row]["_id"] for row, _ in updates}
+
+    def rows_without(self, field: str, limit: int, exclude: Collection[str] = ()) -> List[Dict[str, Any]]:
+        """Up to ``limit`` live rows missing ``field`` and not in ``exclude``, as ``_id``/``_source`` hits."""
+        with self._lock:
+            hits = []
+            for row in np.flatnonzero(self.live):
+                if field not in self.rows[row] and self.rows[row]["_id"] not in exclude:
+                    hits.append({"_id": self.rows[row]["_id"], "_source": self.rows[row]})
+                    if len(hits) >= limit:
+                        break
+            return hits
+
+    def delete_document(self, doc_id: str, indexed_at: Optional[int] = None) -> int:
+        """Tombstone every chunk of a document, or only those written at ``indexed_at``; returns how many."""
+        with self._lock:
+            rows = sorted(row for row in self.by_document.get(doc_id, ())
+                          if indexed_at is None or self.rows[row].get("indexed_at") == indexed_at)
+            return len(self._tombstone(rows))
+
+    def chunk_positions(self, doc_id: str) -> List[Tuple[Optional[int], str]]:
+        """``(chunk_index, _id)`` of every live chunk of a document, in chunk_index order."""
+        with self._lock:
+            chunks = [(self.rows[row].get("chunk_index"), self.rows[row]["_id"])
+                      for row in self.by_document.get(doc_id, ())]
+        return sorted(chunks, key=lambda chunk: (chunk[0] is None, chunk[0] or 0, chunk[1]))
+
+    def count(self) -> int:
+        return int(self.live.sum())
+
+    def compact(self) -> Dict[str, int]:
+        """Rewrite live rows into a new file generation, dropping tombstoned rows for good."""
+        with self._lock:
+            keep = np.flatnonzero(self.live)
+            removed = len(self.rows) - len(keep)
+            if not removed:
+                return {"rows": len(keep), "removed": 0}
+            old_generation = self.generation
+            self.generation += 1
+            with open(self._file("vectors.bin"), "wb") as f:
+                for start in range(0, len(keep), SCORE_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(self.vectors[keep[start:start + SCORE_BLOCK_ROWS]]).tobytes())
+            with open(self._file("meta.jsonl"), "w") as f:
+                f.writelines(json.dumps(self.rows[row]) + "\n" for row in keep)
+            # The manifest switch is the commit point; a crash before it leaves the old generation intact.
+            self._write_manifest()
+            self.vectors = None
+            for name in ("vectors.bin", "meta.jsonl"):
+                path = self._file(name, old_generation)
+                if os.path.exists(path):
+                    os.remove(path)
+            self.rows = [self.rows[row] for row in keep]
+            self.deleted = set()
+            self._remap()
+            self._build_indexes()
+        logger.info(f"Compacted local vector store: {len(keep)} rows kept, {removed} removed.")
+        return {"rows": len(keep), "removed": removed}
+
+    # -- search ------------------------------------------------------------
+
+    def knn(self, query_vector: np.ndarray, k: int, vectors: np.ndarray, live: np.ndarray) -> List[Tuple[int, float]]:
+        """Exact cosine top-k; the matrix is scored in blocks and ranked with ``argpartition``."""
+        if not len(vectors):
+            return []
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = vectors[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query_vector
+        scores[~live] = -np.inf
+        k = min(k, int(live.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), (1.0 + float(scores[row])) / 2.0) for row in top]
+
+    def bm25(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """BM25 over the inverted index, with synonym expansion weighted like the Elasticsearch query."""
+        with self._lock:
+            live_rows = int(self.live.sum())
+            if not live_rows:
+                return []
+            average_length = self.total_length / live_rows
+            weights: Dict[str, float] = Counter(tokenize(query))
+            for term in expand_query(query):
+                for token in tokenize(term):
+                    weights[token] = weights.get(token, 0.0) + SYNONYM_BOOST
+            scores: Dict[int, float] = defaultdict(float)
+            for token, weight in weights.items():
+                postings = self.postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (live_rows - len(postings) + 0.5) / (len(postings) + 0.5))
+                rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+                tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / average_length))
+                for row, score in zip(rows.tolist(), (weight * idf * norm).tolist()):
+                    scores[row] += score
+        if not scores:
+            return []
+        rows = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+        values = np.fromiter(scores.values(), dtype=np.float32, count=len(scores))
+        if len(rows) > k:
+            top = np.argpartition(-values, k - 1)[:k]
+            rows, values = rows[top], values[top]
+        order = np.argsort(-values)
+        return [(int(rows[i]), float(values[i])) for i in order]
+
+    @staticmethod
+    def _hits(ranked: List[Tuple[int, float]], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [{"_id": rows[row]["_id"], "_score": score, "_source": rows[row], "_row": row} for row, score in ranked]
+
+    def _search(self, query: str, query_vector: np.ndarray, k: int, offset: int,
+                fields: Sequence[str]) -> List[SearchHit]:
+        HybridRetriever.source_fields(fields)
+        window = offset + k
+        with self._lock:
+            vectors, live, rows = self.vectors, self.live.copy(), self.rows
+            bm25_hits = self._hits(self.bm25(query, max(BM25_WINDOW_SIZE, window)), rows)
+        knn_hits = self._hits(self.knn(query_vector, max(KNN_K, window), vectors, live), rows)
+        hits = reciprocal_rank_fusion([bm25_hits, knn_hits])[offset:offset + k]
+        if "embedding" in fields:
+            for hit in hits:
+                hit["_source"] = {**hit["_source"], "embedding": vectors[hit["_row"]].astype(np.float32).tolist()}
+        return [to_hit(hit, fields) for hit in hits]
+
+    def search(self, query: str, k: int = 5, offset: int = 0,
+               fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[SearchHit]:
+        """Same contract as ``HybridRetriever.search``."""
+        return self._search(query, self.embeddings.encode(query), k, offset, fields)
+
+    async def asearch(self, query: str, k: int = 5, offset: int = 0,
+                      fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[SearchHit]:
+        """Async variant of ``search``; encoding and scoring run in a worker thread."""
+        return await asyncio.to_thread(self.search, query, k, offset, fields)
+
+    def search_many(self, queries: List[str], k: int = 5,
+                    fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[List[SearchHit]]:
+        """Same contract as ``HybridRetriever.search_many``; all queries are encoded in one batch."""
+        query_vectors = self.embeddings.encode_many(queries)
+        return [self._search(query, query_vector, k, 0, fields) for query, query_vector in zip(queries, query_vectors)]
+
+    async def asearch_many(self, queries: List[str], k: int = 5,
+                           fields: Sequence[str] = DEFAULT_HIT_FIELDS) -> List[List[SearchHit]]:
+        """Async variant of ``search_many``."""
+        return await asyncio.to_thread(self.search_many, queries, k, fields)
+
+
+local_store = LocalVectorStore(LOCAL_STORE_PATH, query_embeddings) if RETRIEVAL_BACKEND == "local" else None
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["compact"]:
+        sys.exit("usage: python -m services.vector_store compact")
+    store = local_store or LocalVectorStore(LOCAL_STORE_PATH, query_embeddings)
+    print(store.compact())
@@ -0,0 +1,89 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class WriteGate:
+    """Shared/exclusive gate around writes to the serving index.
+
+    Ingestion runs and removals hold it shared and proceed concurrently. The
+    reindexer holds it exclusively for its final catch-up and the alias
+    switch, so no write lands on the old index after it was diffed. A
+    waiting exclusive holder blocks new shared holders, so it is not starved.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._tokens = itertools.count()
+        self._shared: Dict[int, int] = {}
+        self._exclusive = False
+        self._exclusive_waiting = 0
+
+    def _acquire_shared(self) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: not self._exclusive and not self._exclusive_waiting)
+            token = next(self._tokens)
+            self._shared[token] = int(time.time() * 1000)
+            return token
+
+    def _release_shared(self, token: int) -> None:
+        with self._cond:
+            del self._shared[token]
+            self._cond.notify_all()
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        token = self._acquire_shared()
+        try:
+            yield
+        finally:
+            self._release_shared(token)
+
+    @asynccontextmanager
+    async def ashared(self) -> AsyncIterator[None]:
+        # The exclusive holder only keeps the gate for a final catch-up round, so waiting in a thread is fine.
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._acquire_shared))
+        try:
+            token = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The thread cannot be interrupted; release the gate as soon as it gets it.
+            acquiring.add_done_callback(lambda done: done.cancelled() or done.exception() is not None
+                                        or self._release_shared(done.result()))
+            raise
+        try:
+            yield
+        finally:
+            self._release_shared(token)
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._cond:
+            self._exclusive_waiting += 1
+            if self._shared:
+                logger.info(f"Pausing index writes; waiting for {len(self._shared)} in flight.")
+            try:
+                self._cond.wait_for(lambda: not self._exclusive and not self._shared)
+            finally:
+                self._exclusive_waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+    def writes_since(self) -> int:
+        """Epoch ms from which writes may still become visible: now, or when the oldest shared holder entered."""
+        with self._cond:
+            return min(self._shared.values(), default=int(time.time() * 1000))
+
+
+index_writes = WriteGate()
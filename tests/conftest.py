@@ -0,0 +1,27 @@
+"""Run the tests against the in-process fakes from ``benchmarks.fakes``; no Elasticsearch, Ollama or model needed."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import install_fakes, parse_args  # noqa: E402
+
+fakes = install_fakes(parse_args([]))
+
+
+@pytest.fixture
+def es():
+    """The fake Elasticsearch client, emptied and with a fresh ``INDEX_NAME`` alias."""
+    from config import INDEX_NAME
+    from services.es_client import ensure_index
+
+    client = fakes["es"]
+    with client._lock:
+        client.indices_data.clear()
+        client.mappings.clear()
+        client.aliases.clear()
+        client._pits.clear()
+    ensure_index(client, INDEX_NAME)
+    return client
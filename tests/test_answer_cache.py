@@ -0,0 +1,55 @@
+import pytest
+
+from services.answer_cache import IndexGeneration, SemanticAnswerCache
+from services.embeddings import embeddings
+
+
+@pytest.fixture
+def generation():
+    return IndexGeneration()
+
+
+@pytest.fixture
+def cache(generation):
+    return SemanticAnswerCache(generation, embeddings=embeddings, threshold=0.95, max_size=10, ttl_seconds=60)
+
+
+def test_a_stored_answer_is_served_for_the_same_query(cache, generation):
+    cache.store("what is a kernel", "an answer", generation.value)
+
+    hit = cache.lookup("what is a kernel")
+
+    assert hit.response == "an answer" and hit.similarity == pytest.approx(1.0)
+    assert cache.lookup("how do cats purr") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_a_generation_bump_invalidates_cached_answers(cache, generation):
+    produced_under = generation.value
+    cache.store("what is a kernel", "an answer", produced_under)
+
+    generation.bump()
+
+    assert cache.lookup("what is a kernel") is None and cache.stats()["size"] == 0
+    # An answer computed before the bump but stored after it is dropped as well.
+    cache.store("what is a kernel", "an answer", produced_under)
+    assert cache.stats()["size"] == 0
+
+
+def test_answers_expire_after_the_ttl(cache, generation, monkeypatch):
+    monkeypatch.setattr("services.answer_cache.time.time", lambda: 1000.0)
+    cache.store("what is a kernel", "an answer", generation.value)
+
+    monkeypatch.setattr("services.answer_cache.time.time", lambda: 1059.0)
+    assert cache.lookup("what is a kernel").age_seconds == pytest.approx(59.0)
+    monkeypatch.setattr("services.answer_cache.time.time", lambda: 1061.0)
+    assert cache.lookup("what is a kernel") is None
+
+
+def test_each_variant_has_its_own_answers(cache, generation):
+    cache.store("what is a kernel", "short answer", generation.value, variant="answer_question")
+    cache.store("what is a kernel", "search results", generation.value, variant="search_document")
+
+    assert cache.lookup("what is a kernel", variant="answer_question").response == "short answer"
+    assert cache.lookup("what is a kernel", variant="search_document").response == "search results"
+    assert cache.lookup("what is a kernel") is None
@@ -0,0 +1,49 @@
+from config import INDEX_NAME
+from models import DocumentRequest
+from services.chunk_summaries import ChunkSummarizer
+from services.embedding_cache import query_embeddings
+from services.embeddings import embeddings
+from services.ingestion import ingest_documents
+from services.vector_store import LocalVectorStore
+
+
+class FailingFor:
+    """Stands in for the LLM: fails on prompts mentioning any of ``words``, summarizes the rest."""
+
+    def __init__(self, *words):
+        self.words = words
+
+    def invoke(self, prompt):
+        if any(word in prompt for word in self.words):
+            raise ConnectionError("model unavailable")
+        return "summary"
+
+
+def index(es):
+    ingest_documents([DocumentRequest(doc_id=doc_id, title=doc_id, content=f"{doc_id} text")
+                      for doc_id in ("good", "bad", "other")])
+
+
+def test_failed_chunks_are_excluded_and_retried_later(es, monkeypatch):
+    index(es)
+    summarizer = ChunkSummarizer(es, INDEX_NAME, FailingFor("bad"), batch_size=1, retry_after=60)
+
+    assert summarizer.summarize_pending() == 2
+    assert summarizer.pending(10) == [] and summarizer.stats()["failed"] == 1
+
+    monkeypatch.setattr("services.chunk_summaries.time.monotonic", lambda: float("inf"))
+    summarizer.llm = FailingFor()
+    assert [hit["_source"]["title"] for hit in summarizer.pending(10)] == ["bad"]
+    assert summarizer.summarize_pending() == 1 and summarizer.stats()["failed"] == 0
+
+
+def test_failed_rows_are_excluded_from_the_local_scan(tmp_path):
+    store = LocalVectorStore(str(tmp_path), query_embeddings)
+    list(store.bulk({"_op_type": "index", "_id": f"{doc_id}:0",
+                     "_source": {"document_id": doc_id, "content": f"{doc_id} text",
+                                 "embedding": embeddings.encode(doc_id).tolist()}}
+                    for doc_id in ("bad", "good")))
+    summarizer = ChunkSummarizer(None, INDEX_NAME, FailingFor("bad"), vector_store=store, batch_size=1)
+
+    assert summarizer.summarize_pending() == 1
+    assert summarizer.pending(1) == []
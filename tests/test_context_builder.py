@@ -0,0 +1,47 @@
+from services.context_builder import ContextBuilder, format_block
+
+
+def chunk(position, content, document_id="doc", score=1.0):
+    return {"document_id": document_id, "chunk_index": position, "title": "Title", "content": content, "score": score}
+
+
+def test_adjacent_chunks_are_merged_without_their_overlap():
+    context, stats = ContextBuilder().build([chunk(0, "the quick brown fox"), chunk(1, "brown fox jumps over")])
+
+    assert stats["blocks"] == 1
+    assert "the quick brown fox jumps over" in context
+
+
+def test_adjacent_chunks_without_overlap_are_joined_with_a_space():
+    context, _ = ContextBuilder().build([chunk(0, "first sentence."), chunk(1, "Next sentence.")])
+
+    assert "first sentence. Next sentence." in context
+
+
+def words(seed, count):
+    return " ".join(f"{seed}{i}" for i in range(count))
+
+
+def test_blocks_are_added_by_relevance_while_they_fit_the_budget():
+    docs = [chunk(0, words("low", 40), "a", score=0.1), chunk(0, words("high", 40), "b", score=0.9),
+            chunk(0, words("mid", 10), "c", score=0.5)]
+    budget = ContextBuilder().count_tokens("\n---\n".join(
+        format_block(doc["document_id"], doc["title"], doc["content"]) for doc in docs[1:]))
+
+    context, stats = ContextBuilder(token_budget=budget).build(docs)
+
+    assert stats["blocks"] == 2 and stats["packed_tokens"] <= budget
+    assert context.index("high0") < context.index("mid0") and "low0" not in context
+
+
+def test_the_most_relevant_block_is_trimmed_rather_than_returning_nothing():
+    context, stats = ContextBuilder(token_budget=20).build([chunk(0, words("long", 200))])
+
+    assert stats["blocks"] == 1 and 0 < stats["packed_tokens"] <= 20
+
+
+def test_near_duplicate_blocks_are_dropped():
+    text = words("same", 30)
+    context, stats = ContextBuilder().build([chunk(0, text, "a", score=0.9), chunk(0, text + " extra", "b", score=0.5)])
+
+    assert stats["blocks"] == 1 and "Document ID: a" in context
@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.embedding_batcher import MicroBatchingEncoder
+
+
+class GatedModel:
+    """Stands in for the sentence-transformer: records each batch and holds the first one until released."""
+
+    def __init__(self):
+        self.batches = []
+        self.first_started = threading.Event()
+        self.release = threading.Event()
+
+    def encode(self, sentences, **kwargs):
+        self.batches.append(list(sentences))
+        if len(self.batches) == 1:
+            self.first_started.set()
+            assert self.release.wait(5)
+        if any(text == "boom" for text in sentences):
+            raise RuntimeError("model crashed")
+        return np.asarray([[float(len(text))] for text in sentences], dtype=np.float32)
+
+
+def queued_behind_first(encoder, model, texts):
+    """Encode "first", then ``texts`` concurrently while the first batch holds the model."""
+    pool = ThreadPoolExecutor(max_workers=len(texts) + 1)
+    first = pool.submit(encoder.encode, "first")
+    assert model.first_started.wait(5)
+    futures = [pool.submit(encoder.encode, text) for text in texts]
+    deadline = time.monotonic() + 5
+    while encoder._queue.qsize() < len(texts) and time.monotonic() < deadline:
+        time.sleep(0.001)
+    model.release.set()
+    pool.shutdown(wait=False)
+    return first, futures
+
+
+def test_concurrent_encodes_share_a_batch_and_get_their_own_vectors():
+    model = GatedModel()
+    encoder = MicroBatchingEncoder(model, max_wait_ms=50, max_batch_size=3)
+
+    first, futures = queued_behind_first(encoder, model, ["a", "bb", "ccc"])
+
+    assert first.result(5)[0] == 5.0
+    assert [future.result(5)[0] for future in futures] == [1.0, 2.0, 3.0]
+    assert model.batches[0] == ["first"] and sorted(model.batches[1]) == ["a", "bb", "ccc"]
+
+
+def test_a_lone_encode_is_flushed_after_the_max_wait():
+    model = GatedModel()
+    model.release.set()
+    encoder = MicroBatchingEncoder(model, max_wait_ms=20, max_batch_size=32)
+
+    started = time.perf_counter()
+    vector = encoder.encode("alone")
+
+    assert vector[0] == 5.0 and model.batches == [["alone"]]
+    assert time.perf_counter() - started < 1
+
+
+def test_a_failed_batch_fails_every_waiter_and_the_next_batch_still_runs():
+    model = GatedModel()
+    encoder = MicroBatchingEncoder(model, max_wait_ms=50, max_batch_size=3)
+
+    first, futures = queued_behind_first(encoder, model, ["a", "boom", "c"])
+
+    assert first.result(5)[0] == 5.0
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(5)
+    assert encoder.encode("after")[0] == 5.0
+
+
+def test_lists_bypass_the_batcher():
+    model = GatedModel()
+    model.release.set()
+    encoder = MicroBatchingEncoder(model)
+
+    vectors = encoder.encode(["x", "yy"], batch_size=2)
+
+    assert vectors[:, 0].tolist() == [1.0, 2.0]
+    assert encoder._thread is None
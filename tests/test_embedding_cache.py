@@ -0,0 +1,25 @@
+import sqlite3
+
+from services.embedding_cache import ChunkEmbeddingStore
+from services.embeddings import embeddings
+
+
+def test_hits_and_misses_are_counted_per_requested_text(tmp_path):
+    store = ChunkEmbeddingStore(embeddings, path=str(tmp_path / "chunks.db"))
+
+    store.encode_many(["a", "b", "a"])
+    store.encode_many(["a", "c"])
+
+    assert store.stats()["misses"] == 4 and store.stats()["hits"] == 1
+
+
+def test_row_count_follows_inserts_and_evictions(tmp_path):
+    path = str(tmp_path / "chunks.db")
+    store = ChunkEmbeddingStore(embeddings, path=path, max_entries=3)
+
+    store.encode_many(["a", "b", "a"])
+    store.encode_many(["a", "c", "d", "e"])
+
+    (rows,) = sqlite3.connect(path).execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()
+    assert store.stats()["size"] == rows == 3 and store.stats()["evictions"] == 2
+    assert ChunkEmbeddingStore(embeddings, path=path, max_entries=3).stats()["size"] == 3
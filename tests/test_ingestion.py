@@ -0,0 +1,75 @@
+import services.ingestion as ingestion
+from config import INDEX_NAME
+from models import DocumentRequest
+from services.ingestion import StreamedDocument, existing_chunks, ingest_documents
+
+
+def text(seed, words=400):
+    return " ".join(f"{seed}{i} lorem ipsum" for i in range(words))
+
+
+def stored_contents(es, doc_id):
+    hits = es.search(index=INDEX_NAME, body={"size": 1000, "query": {"term": {"document_id": doc_id}}})["hits"]["hits"]
+    return {hit["_source"]["content"] for hit in hits}
+
+
+def test_reingesting_unchanged_content_writes_nothing(es):
+    document = DocumentRequest(doc_id="doc", title="Title", content=text("same"))
+    first = ingest_documents([document])["results"][0]
+
+    again = ingest_documents([document])["results"][0]
+
+    assert first["chunks_indexed"] > 1
+    assert again["chunks_indexed"] == 0 and again["chunks_unchanged"] == first["chunks_indexed"]
+
+
+def test_duplicate_doc_ids_in_one_run_keep_the_last_version(es):
+    old = DocumentRequest(doc_id="doc", title="Title", content=text("old"))
+    new = DocumentRequest(doc_id="doc", title="Title", content=text("new", words=100))
+
+    report = ingest_documents([old, new])
+
+    assert [result["doc_id"] for result in report["results"]] == ["doc"]
+    assert not any("old" in content for content in stored_contents(es, "doc"))
+    assert len(list(existing_chunks("doc"))) == report["chunks_indexed"]
+
+
+def test_existing_chunks_pages_past_tied_chunk_indexes(es, monkeypatch):
+    monkeypatch.setattr(ingestion, "EXISTING_CHUNKS_PAGE_SIZE", 3)
+    for position in range(5):
+        for version in ("a", "b"):
+            es.index(index=INDEX_NAME, id=f"doc:{position}:{version}",
+                     document={"document_id": "doc", "chunk_index": position, "content": version})
+
+    chunks = list(existing_chunks("doc"))
+
+    assert len(chunks) == 10 and len({chunk_id for _, chunk_id in chunks}) == 10
+    assert [position for position, _ in chunks] == sorted(position for position, _ in chunks)
+    assert not es._pits
+
+
+def test_streamed_chunks_match_the_whole_text(es):
+    content = text("stream")
+    ingest_documents([DocumentRequest(doc_id="doc", title="Title", content=content)])
+    pieces = [content[start:start + 777] for start in range(0, len(content), 777)]
+
+    result = ingest_documents([StreamedDocument(doc_id="doc", title="Title", pieces=pieces)])["results"][0]
+
+    assert result["chunks_indexed"] == 0 and result["chunks_deleted"] == 0
+
+
+def test_a_failed_upload_rolls_back_and_keeps_the_previous_version(es):
+    content = text("upload")
+    ingest_documents([DocumentRequest(doc_id="doc", title="Title", content=content)])
+    before = list(existing_chunks("doc"))
+
+    def broken_pieces():
+        edited = content.replace("upload1 ", "edited1 ")
+        yield from (edited[start:start + 1000] for start in range(0, 8000, 1000))
+        raise ConnectionResetError("client went away")
+
+    result = ingest_documents([StreamedDocument(doc_id="doc", title="Title", pieces=broken_pieces())])["results"][0]
+
+    assert result["status"] == "error" and "client went away" in result["message"]
+    assert result["chunks_indexed"] == 0
+    assert list(existing_chunks("doc")) == before
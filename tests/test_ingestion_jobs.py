@@ -0,0 +1,107 @@
+import queue
+import threading
+
+import pytest
+
+from models import DocumentRequest
+from services.ingestion_jobs import IngestionJobQueue
+
+
+def document(doc_id, content="text"):
+    return DocumentRequest(doc_id=doc_id, title=doc_id, content=content)
+
+
+class RecordingIngest:
+    """Stands in for ``ingest_documents``: records each run and blocks until released."""
+
+    def __init__(self):
+        self.runs = []
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def __call__(self, documents, progress=None):
+        self.runs.append([(doc.doc_id, doc.content) for doc in documents])
+        self.started.release()
+        assert self.release.wait(5)
+        for doc in documents:
+            progress(doc.doc_id)
+        return {"results": [{"doc_id": doc.doc_id, "status": "success", "chunks_indexed": 1} for doc in documents]}
+
+
+@pytest.fixture
+def ingest():
+    return RecordingIngest()
+
+
+@pytest.fixture
+def jobs(ingest):
+    jobs = IngestionJobQueue(ingest=ingest, workers=1, max_jobs=10, max_documents_per_run=3)
+    yield jobs
+    ingest.release.set()
+    jobs.stop()
+
+
+def wait_all(*submitted):
+    for job in submitted:
+        assert job.done.wait(5)
+
+
+def test_jobs_queued_behind_a_run_are_coalesced(jobs, ingest):
+    first = jobs.submit([document("a")])
+    assert ingest.started.acquire(timeout=5)
+    second, third = jobs.submit([document("b")]), jobs.submit([document("c"), document("d")])
+    ingest.release.set()
+    wait_all(first, second, third)
+
+    assert ingest.runs == [[("a", "text")], [("b", "text"), ("c", "text"), ("d", "text")]]
+    assert [result["doc_id"] for result in third.results] == ["c", "d"]
+    assert third.status == "completed" and third.chunks_indexed == 2
+
+
+def test_runs_respect_the_document_limit(jobs, ingest):
+    first = jobs.submit([document("a")])
+    assert ingest.started.acquire(timeout=5)
+    rest = [jobs.submit([document(doc_id)]) for doc_id in "bcde"]
+    ingest.release.set()
+    wait_all(first, *rest)
+
+    assert [len(run) for run in ingest.runs] == [1, 3, 1]
+
+
+def test_later_versions_of_a_document_never_overtake_earlier_ones(jobs, ingest):
+    first = jobs.submit([document("a", "v1")])
+    assert ingest.started.acquire(timeout=5)
+    second = jobs.submit([document("a", "v2")])
+    unrelated = jobs.submit([document("b")])
+    third = jobs.submit([document("a", "v3"), document("c")])
+    ingest.release.set()
+    wait_all(first, second, unrelated, third)
+
+    assert ingest.runs == [[("a", "v1")], [("a", "v2"), ("b", "text")], [("a", "v3"), ("c", "text")]]
+
+
+def test_a_failed_run_fails_every_job_in_it(ingest):
+    def failing(documents, progress=None):
+        raise RuntimeError("bulk rejected")
+
+    jobs = IngestionJobQueue(ingest=failing, workers=1)
+    try:
+        job = jobs.submit([document("a")])
+        wait_all(job)
+    finally:
+        jobs.stop()
+
+    assert job.status == "failed" and job.error == "bulk rejected"
+
+
+def test_submit_rejects_jobs_beyond_the_queue_limit(ingest):
+    jobs = IngestionJobQueue(ingest=ingest, workers=1, max_jobs=1)
+    try:
+        jobs.submit([document("a")])
+        assert ingest.started.acquire(timeout=5)
+        jobs.submit([document("b")])
+        with pytest.raises(queue.Full):
+            jobs.submit([document("c")])
+    finally:
+        ingest.release.set()
+        jobs.stop()
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from functools import partial
+
+from benchmarks.fakes import FakeLLM
+from services.llm_gateway import LLMGateway
+
+
+class RecordingLLM(FakeLLM):
+    """Records the order in which prompts reach the model."""
+
+    order = []
+
+    def invoke(self, prompt, **kwargs):
+        self.order.append(prompt)
+        return super().invoke(prompt, **kwargs)
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.order.append(prompt)
+        return await super().ainvoke(prompt, **kwargs)
+
+
+def gateway():
+    RecordingLLM.order = []
+    return LLMGateway(max_concurrency=1, llm_factory=partial(RecordingLLM, latency=0.01))
+
+
+async def queued(gateway, count):
+    """Wait until ``count`` callers are queued for a slot."""
+    for _ in range(5000):
+        if len(gateway._waiters) >= count:
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError(f"{len(gateway._waiters)} of {count} callers queued")
+
+
+def assert_idle(gateway):
+    stats = gateway.stats()
+    assert stats["in_flight"] == 0 and stats["waiting"] == 0
+    assert gateway._free == 1 and not gateway._waiters
+
+
+def test_slots_are_handed_over_in_arrival_order_across_sync_and_async_callers():
+    llm = gateway()
+
+    async def run():
+        held = llm._aslot()
+        await held.__aenter__()
+        first = asyncio.create_task(llm.ainvoke("a1"))
+        await queued(llm, 1)
+        thread = threading.Thread(target=llm.invoke, args=("s2",))
+        thread.start()
+        await queued(llm, 2)
+        third = asyncio.create_task(llm.ainvoke("a3"))
+        await queued(llm, 3)
+        await held.__aexit__(None, None, None)
+        await asyncio.wait_for(asyncio.gather(first, third), 5)
+        await asyncio.to_thread(thread.join)
+
+    asyncio.run(run())
+
+    assert RecordingLLM.order == ["a1", "s2", "a3"]
+    assert_idle(llm)
+
+
+def test_a_slot_granted_to_a_cancelled_waiter_is_passed_on():
+    llm = gateway()
+
+    async def run():
+        held = llm._aslot()
+        await held.__aenter__()
+        victim = asyncio.create_task(llm.ainvoke("victim"))
+        following = asyncio.create_task(llm.ainvoke("following"))
+        await queued(llm, 2)
+        await held.__aexit__(None, None, None)
+        # The slot went to the victim, but it is cancelled before it gets to run.
+        assert len(llm._waiters) == 1
+        victim.cancel()
+        return await asyncio.wait_for(asyncio.gather(victim, following, return_exceptions=True), 5)
+
+    victim, following = asyncio.run(run())
+
+    assert isinstance(victim, asyncio.CancelledError) and following
+    assert RecordingLLM.order == ["following"]
+    assert_idle(llm)
+
+
+def test_a_waiter_cancelled_in_the_queue_leaves_it():
+    llm = gateway()
+
+    async def run():
+        held = llm._aslot()
+        await held.__aenter__()
+        victim = asyncio.create_task(llm.ainvoke("victim"))
+        await queued(llm, 1)
+        victim.cancel()
+        await asyncio.gather(victim, return_exceptions=True)
+        assert not llm._waiters
+        await held.__aexit__(None, None, None)
+
+    asyncio.run(run())
+
+    assert RecordingLLM.order == []
+    assert_idle(llm)
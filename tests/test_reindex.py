@@ -0,0 +1,141 @@
+import pytest
+
+from config import INDEX_NAME
+from models import DocumentRequest
+from services.answer_cache import index_generation
+from services.ingestion import ingest_documents
+from services.reindex import Reindexer, reassemble
+from services.text_utils import chunk_text, normalize_text
+
+
+def text(seed, words=400):
+    return " ".join(f"{seed}{i} lorem ipsum" for i in range(words))
+
+
+DOCUMENTS = [DocumentRequest(doc_id=f"doc-{i}", title=f"Title {i}", content=text(f"w{i}x")) for i in range(5)]
+
+
+@pytest.fixture
+def reindexer(es, tmp_path):
+    ingest_documents(DOCUMENTS)
+    return Reindexer(es, page_size=2, checkpoint_path=str(tmp_path / "reindex.json"))
+
+
+def stored_documents(reindexer, index=INDEX_NAME):
+    doc_ids = [doc_id for page, _ in reindexer.document_ids(index) for doc_id in page]
+    return {doc_id: reindexer.read_document(index, doc_id).content for doc_id in doc_ids}
+
+
+def test_reassemble_drops_the_overlap_between_chunks():
+    content = normalize_text(text("overlap"))
+    chunks = chunk_text(content)
+
+    assert len(chunks) > 2
+    assert reassemble(chunks) == content
+
+
+def test_reassemble_joins_chunks_without_overlap_with_a_space():
+    assert reassemble(["first part", "second part"]) == "first part second part"
+    assert reassemble([]) == ""
+
+
+def test_read_document_round_trips_through_the_index(reindexer):
+    assert stored_documents(reindexer) == {doc.doc_id: doc.content for doc in DOCUMENTS}
+    assert reindexer.read_document(INDEX_NAME, "missing") is None
+
+
+def test_run_rebuilds_into_a_new_version_and_switches_the_alias(reindexer, es):
+    generation = index_generation.value
+
+    report = reindexer.run(resume=False)
+
+    assert report["status"] == "completed" and report["documents_done"] == len(DOCUMENTS)
+    assert reindexer.current_index() == f"{INDEX_NAME}-v2"
+    assert stored_documents(reindexer) == {doc.doc_id: doc.content for doc in DOCUMENTS}
+    # Rebuild pages do not touch the answer cache; only the switch does.
+    assert index_generation.value == generation + 1
+
+
+def test_an_interrupted_run_resumes_from_its_checkpoint(reindexer, monkeypatch):
+    rebuild, calls = reindexer._rebuild, []
+
+    def interrupted(*args, **kwargs):
+        calls.append(args[3])
+        if len(calls) == 2:
+            raise ConnectionError("node left the cluster")
+        return rebuild(*args, **kwargs)
+
+    monkeypatch.setattr(reindexer, "_rebuild", interrupted)
+    with pytest.raises(ConnectionError):
+        reindexer.run(resume=False)
+    assert reindexer.current_index() == f"{INDEX_NAME}-v1"
+
+    monkeypatch.setattr(reindexer, "_rebuild", rebuild)
+    report = reindexer.run(resume=True)
+
+    assert report["status"] == "completed" and report["resumed_from"] == 2
+    assert reindexer.current_index() == f"{INDEX_NAME}-v2"
+    assert stored_documents(reindexer) == {doc.doc_id: doc.content for doc in DOCUMENTS}
+
+
+def test_writes_during_the_rebuild_are_caught_up(reindexer, es, monkeypatch):
+    rebuild = reindexer._rebuild
+    added = DocumentRequest(doc_id="doc-new", title="New", content=text("fresh"))
+    changed = DocumentRequest(doc_id="doc-1", title="Title 1", content=text("edited"))
+
+    def with_live_writes(*args, **kwargs):
+        report = rebuild(*args, **kwargs)
+        if args[3] == ["doc-0", "doc-1"]:
+            ingest_documents([added, changed])
+            es.delete_by_query(index=INDEX_NAME, body={"query": {"term": {"document_id": "doc-0"}}}, refresh=True)
+        return report
+
+    monkeypatch.setattr(reindexer, "_rebuild", with_live_writes)
+    reindexer.run(resume=False)
+
+    expected = {doc.doc_id: doc.content for doc in DOCUMENTS[2:] + [added, changed]}
+    assert reindexer.current_index() == f"{INDEX_NAME}-v2"
+    assert stored_documents(reindexer) == expected
+
+
+def test_the_alias_is_not_switched_while_the_indices_differ(reindexer, monkeypatch):
+    read_document = reindexer.read_document
+    monkeypatch.setattr(reindexer, "read_document",
+                        lambda index, doc_id, pit_id=None, **kwargs: None if doc_id == "doc-3"
+                        else read_document(index, doc_id, pit_id, **kwargs))
+
+    with pytest.raises(RuntimeError, match="still differs"):
+        reindexer.run(resume=False)
+
+    assert reindexer.current_index() == f"{INDEX_NAME}-v1"
+    assert reindexer.report()["status"] == "failed"
+
+
+def test_a_reingest_that_only_deletes_chunks_is_caught_up(reindexer, monkeypatch):
+    rebuild = reindexer._rebuild
+    shortened = DocumentRequest(doc_id="doc-1", title="Title 1",
+                                content=reassemble(chunk_text(normalize_text(DOCUMENTS[1].content))[:2]))
+
+    def with_live_writes(*args, **kwargs):
+        report = rebuild(*args, **kwargs)
+        if args[3] == ["doc-0", "doc-1"]:
+            result = ingest_documents([shortened])["results"][0]
+            assert result["chunks_indexed"] == 0 and result["chunks_deleted"] > 0
+        return report
+
+    monkeypatch.setattr(reindexer, "_rebuild", with_live_writes)
+    reindexer.run(resume=False)
+
+    assert stored_documents(reindexer)["doc-1"] == shortened.content
+
+
+def test_summaries_of_unchanged_chunks_are_carried_into_the_new_index(reindexer, es):
+    hit = es.search(index=INDEX_NAME, body={"size": 1, "query": {"term": {"document_id": "doc-2"}}})["hits"]["hits"][0]
+    es.update(index=INDEX_NAME, id=hit["_id"],
+              doc={"summary": "a summary", "summary_hash": hit["_source"]["content_hash"]})
+
+    reindexer.run(resume=False)
+
+    body = {"query": {"exists": {"field": "summary_hash"}}}
+    summarized = es.search(index=f"{INDEX_NAME}-v2", body=body)["hits"]["hits"]
+    assert [(hit["_id"], hit["_source"]["summary"]) for hit in summarized] == [(hit["_id"], "a summary")]
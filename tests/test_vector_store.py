@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pytest
+
+from services.embedding_cache import query_embeddings
+from services.embeddings import embeddings
+from services.retriever import reciprocal_rank_fusion
+from services.vector_store import LocalVectorStore
+
+DOCUMENTS = {
+    "cats": "felines purr and sleep most of the day",
+    "dogs": "dogs bark at the mail carrier and fetch sticks",
+    "kernel": "the kernel maps virtual memory pages to physical frames",
+}
+
+
+def index_action(doc_id, content, position=0, indexed_at=1):
+    return {
+        "_op_type": "index",
+        "_id": f"{doc_id}:{position}",
+        "_source": {"document_id": doc_id, "chunk_index": position, "title": doc_id, "content": content,
+                    "indexed_at": indexed_at, "embedding": embeddings.encode(content).tolist()},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalVectorStore(str(tmp_path), query_embeddings)
+    assert all(ok for ok, _ in store.bulk(index_action(doc_id, content) for doc_id, content in DOCUMENTS.items()))
+    return store
+
+
+def reopen(store):
+    return LocalVectorStore(store.path, query_embeddings)
+
+
+def test_reciprocal_rank_fusion_prefers_hits_in_both_lists():
+    fused = reciprocal_rank_fusion([[{"_id": "a"}, {"_id": "b"}], [{"_id": "b"}, {"_id": "c"}]], rank_constant=60)
+
+    assert [hit["_id"] for hit in fused] == ["b", "a", "c"]
+    assert fused[0]["_score"] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_search_fuses_bm25_and_knn(store):
+    hits = store.search("felines sleep", k=2, fields=("document_id", "chunk_index", "content"))
+
+    assert hits[0]["document_id"] == "cats"
+    assert hits[0]["chunk_id"] == hits[0]["doc_id"] == "cats:0"
+    assert hits[0]["chunk_index"] == 0
+    assert hits[0]["score"] > hits[1]["score"]
+
+
+def test_search_pages_over_the_fused_ranking(store):
+    first, second = store.search("memory pages", k=1), store.search("memory pages", k=1, offset=1)
+
+    assert first[0]["document_id"] == "kernel"
+    assert second[0]["chunk_id"] != first[0]["chunk_id"]
+
+
+def test_reindexing_an_id_replaces_it(store):
+    list(store.bulk([index_action("cats", "cats chase laser pointers")]))
+
+    assert store.count() == 3
+    assert store.search("laser pointers", k=1)[0]["content"] == "cats chase laser pointers"
+
+
+def test_compaction_drops_deleted_rows_and_survives_reload(store):
+    assert store.delete_document("dogs") == 1
+    assert store.compact() == {"rows": 2, "removed": 1}
+
+    reloaded = reopen(store)
+    assert reloaded.count() == 2
+    assert reloaded.chunk_positions("dogs") == []
+    assert reloaded.search("dogs bark", k=3)[0]["document_id"] != "dogs"
+    assert sorted(os.listdir(store.path)) == ["meta.jsonl.1", "store.json", "vectors.bin.1"]
+
+
+def test_tombstones_survive_reload_without_compaction(store):
+    store.delete_document("kernel")
+
+    reloaded = reopen(store)
+    assert reloaded.count() == 2
+    assert "kernel" not in {hit["document_id"] for hit in reloaded.search("kernel memory", k=3)}
+
+
+def test_delete_document_by_indexed_at_keeps_other_chunks(store):
+    list(store.bulk([index_action("cats", "cats nap in boxes", position=1, indexed_at=2)]))
+
+    assert store.delete_document("cats", indexed_at=2) == 1
+    assert store.chunk_positions("cats") == [(0, "cats:0")]
+
+
+def test_torn_metadata_line_is_truncated_on_load(store):
+    meta_path = store._file("meta.jsonl")
+    with open(meta_path, "a") as f:
+        f.write('{"_id": "torn:0", "document_id": "to')
+
+    reloaded = reopen(store)
+    assert reloaded.count() == 3
+    assert open(meta_path).read().endswith("\n")
+
+    list(reloaded.bulk([index_action("birds", "birds sing at dawn")]))
+    assert reopen(reloaded).count() == 4
+
+
+def test_rows_without_vectors_are_dropped_on_load(store):
+    vectors_path = store._file("vectors.bin")
+    row_bytes = store.dims * store.dtype.itemsize
+    os.truncate(vectors_path, 2 * row_bytes)
+
+    reloaded = reopen(store)
+    assert reloaded.count() == 2
+    assert reloaded.chunk_positions("kernel") == []
+    assert os.path.getsize(vectors_path) == 3 * row_bytes
+    assert np.isfinite(reloaded.search("felines", k=1)[0]["score"])
+
+
+def test_interrupted_vector_append_is_cut_off_on_load(store):
+    with open(store._file("vectors.bin"), "ab") as f:
+        f.write(b"\0" * store.dims * store.dtype.itemsize)
+
+    reloaded = reopen(store)
+    assert reloaded.count() == 3
+    assert reloaded.vectors.shape == (3, store.dims)
+
+
+def test_vectors_of_a_first_append_without_metadata_are_cut_off_on_load(tmp_path):
+    store = LocalVectorStore(str(tmp_path), query_embeddings)
+    list(store.bulk([index_action("a", "apples grow on trees")]))
+    os.truncate(store._file("meta.jsonl"), 0)
+
+    reloaded = reopen(store)
+    assert reloaded.count() == 0
+    assert os.path.getsize(store._file("vectors.bin")) == 0
+
+    list(reloaded.bulk([index_action("b", "boats float on water")]))
+    again = reopen(reloaded)
+    expected = embeddings.encode("boats float on water")
+    assert np.allclose(again.vectors[again.ids["b:0"]], expected / np.linalg.norm(expected), atol=1e-3)